@@ -1,44 +1,89 @@
-import os, io, time, json, re
-from flask import Flask, request, render_template, jsonify, send_from_directory
-import requests
-
-from nutrition_rules import rank_items, score_item
-from parsers.html_menu import extract_items as extract_html_items
-from parsers.pdf_menu import extract_from_pdf_bytes
-from parsers.robots import is_allowed as robots_allowed
-from integrations.osm import geocode_zip, overpass_restaurants
+import os, io, time, json, re, hashlib, threading
+import urllib.parse as urlparse
+from flask import Flask, Response, request, render_template, jsonify, send_from_directory, stream_with_context
+
+import http_client
+
+from nutrition_rules import rank_top_k, rank_profiles, score_item, item_confidence
+from parsers.html_menu import extract_items as extract_html_items, PARSER_VERSION as HTML_PARSER_VERSION
+from parsers.pdf_menu import iter_page_items, PARSER_VERSION as PDF_PARSER_VERSION
+from parsers.parsed_cache import ParsedMenuCache
+from parsers.budget import Budget
+from parsers import ocr
+from parsers.robots import is_allowed as robots_allowed, robots_cache
+from integrations.osm import geocode_zip
+from restaurant_index import restaurant_index, MAX_RADIUS_MI
+from zip_centroids import zip_centroids
 from integrations.openfoodfacts import search_off
+from nutrient_store import NutrientStore, enrich_picks, row_from_off_item, NUTRIENTS_ENRICH
+from fanout import iter_fan_out
+from menu_discovery import discover_menu_url
+from cache import TTLCache, NullBackend, open_backend
+from playbook_store import playbooks
+from jobs import jobs, JobsFull
+import metrics
+from metrics import menu_log, span, count_error
+from scheduler import scheduler
+from warmer import Popularity, Warmer, WARM_INTERVAL_SEC
 
 APP_NAME = "FineDiningCoach"
 UA = "FineDiningCoach/1.0 (+https://example.com; contact demo@example.com)"
 
+NEARBY_DEADLINE_SEC = float(os.environ.get("NEARBY_DEADLINE_SEC", "25"))
+# Stop reading a PDF once this many high-confidence items were found (0 = read all pages).
+PDF_ENOUGH_HIGH_CONF = int(os.environ.get("PDF_ENOUGH_HIGH_CONF", "30"))
+SSE_KEEPALIVE_SEC = 15
+# Fetched menus are sniffed on the first chunk and capped per kind; uploads share the PDF cap.
+MENU_MAX_BYTES = {"html": int(os.environ.get("MENU_HTML_MAX_BYTES", str(2*1024*1024))),
+                  "pdf": int(os.environ.get("MENU_PDF_MAX_BYTES", str(15*1024*1024)))}
+HTML_PARSE_BUDGET_SEC = float(os.environ.get("HTML_PARSE_BUDGET_SEC", "2"))   # CPU seconds per page
+PDF_PARSE_BUDGET_SEC = float(os.environ.get("PDF_PARSE_BUDGET_SEC", "30"))    # wall seconds per PDF (OCR runs elsewhere)
+
 app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = MENU_MAX_BYTES["pdf"] + 64*1024  # room for the multipart envelope
 
-# ----------------- Simple TTL Cache -----------------
-class TTLCache:
-    def __init__(self, ttl_sec=3600, max_items=128):
-        self.ttl = ttl_sec
-        self.max = max_items
-        self.store = {}
-
-    def get(self, key):
-        v = self.store.get(key)
-        if not v: return None
-        if time.time() - v[1] > self.ttl:
-            self.store.pop(key, None); return None
-        return v[0]
-
-    def set(self, key, val):
-        if len(self.store) >= self.max:
-            # drop oldest
-            oldest = sorted(self.store.items(), key=lambda x: x[1][1])[0][0]
-            self.store.pop(oldest, None)
-        self.store[key] = (val, time.time())
-
-zip_cache = TTLCache(ttl_sec=3600, max_items=32)  # 60 min
-menu_cache = TTLCache(ttl_sec=24*3600, max_items=128)  # 24h
+# ----------------- Caches -----------------
+# In-process LRUs backed by a host-wide sqlite store (CACHE_DB_PATH) shared by
+# all workers and kept across restarts.
+store = open_backend()
+zip_cache = TTLCache(ttl_sec=3600, max_items=32, max_bytes=16*1024*1024, backend=store, namespace="zip")  # 60 min
+menu_cache = TTLCache(ttl_sec=24*3600, max_items=1024, stale_sec=24*3600, backend=store, namespace="menu_url")  # 24h, then served stale while re-resolved
+geo_cache = TTLCache(ttl_sec=30*24*3600, max_items=4096, backend=store, namespace="geocode")  # Nominatim answers for ZIPs not in data/zip_centroids.bin
+parsed_cache = ParsedMenuCache(backend=store)  # extracted items by content hash
+off_cache = TTLCache(ttl_sec=7*24*3600, max_items=512, backend=store, namespace="off_query")  # Open Food Facts searches
+nutrients = NutrientStore(backend=store)  # products from the OFF dump (if built) plus every product a lookup returned
+OFF_TIMEOUT_SEC = float(os.environ.get("OFF_TIMEOUT_SEC", "8"))
+MENU_NEGATIVE_TTL = 6*3600  # websites where no menu was found
+MENU_BODY_TTL = 7*24*3600  # stored menu bodies, revalidated with conditional GETs
+MENU_FRESH_SEC = float(os.environ.get("MENU_FRESH_SEC", str(12*3600)))  # stored bodies younger than this are used as-is
+
+playbooks.ensure_fresh()  # load + precompute common picks at startup
 
 # --------------- Helpers ---------------
+class AnalysisError(Exception):
+    """An analysis that ends in an error response: `payload` is sent with HTTP `status`."""
+    def __init__(self, status: int, payload: dict):
+        super().__init__(payload.get("message") or payload.get("error"))
+        self.status = status
+        self.payload = payload
+
+@app.errorhandler(413)
+def _too_large(e):
+    return jsonify({"error":"too_large","message":f"Upload exceeds {MENU_MAX_BYTES['pdf'] // (1024*1024)} MB"}), 413
+
+def _noop(**event):
+    pass
+
+def ctx_from(data, form: bool = False) -> dict:
+    """User context from a JSON body, or from form fields when `form`."""
+    if form:
+        return {"calorie_target": int(data.get("calorie_target", "600")),
+                "prioritize_protein": data.get("prioritize_protein","1") == "1",
+                "flags": data.getlist("flags")}
+    return {"calorie_target": int(data.get("calorie_target", 600)),
+            "prioritize_protein": bool(data.get("prioritize_protein", True)),
+            "flags": data.get("flags", []) or []}
+
 def sanitize_url(u: str) -> str:
     if not re.match(r"^https?://", u, re.I):
         raise ValueError("URL must start with http(s)://")
@@ -48,136 +93,249 @@ def sanitize_url(u: str) -> str:
     return u
 
 def build_pick_from_rules(items, ctx):
-    ranked = rank_items(items, ctx.get("calorie_target",600), ctx.get("prioritize_protein", True), ctx.get("flags",[]))
-    return ranked[:3]
+    with span("score"):
+        picks = rank_top_k(items, 3, ctx.get("calorie_target",600), ctx.get("prioritize_protein", True), ctx.get("flags",[]))
+    if NUTRIENTS_ENRICH:
+        with span("nutrients"):
+            enrich_picks(picks, nutrients)
+    return picks
 
 def build_pick_from_playbook(name, cuisines, ctx):
-    # Try chain match
-    import json, os
-    with open(os.path.join("data","chain_playbooks.json"), "r") as f:
-        chains = json.load(f)
-    with open(os.path.join("data","cuisine_playbooks.json"), "r") as f:
-        cuisines_db = json.load(f)
-    picks = []
-    if name in chains:
-        picks = chains[name]
-    else:
-        for c in cuisines or []:
-            c = c.lower()
-            if c in cuisines_db:
-                picks = cuisines_db[c]
-                break
-    if not picks:
-        picks = [{"section":"Playbook","item_name":"Grilled chicken + veg, starch half portion",
-                  "description":"Ask for sauce on side"}]
-    # Attach scores via rules (use their described text)
-    items = [{"section":p.get("section","Playbook"), "item_name":p["item_name"], "description":p.get("description","")} for p in picks]
-    return build_pick_from_rules(items, ctx)
+    with span("playbook"):
+        return playbooks.picks(name, cuisines, ctx)
 
 def menu_resolver(website: str) -> str:
-    # cached
-    v = menu_cache.get(website)
-    if v: return v
-    # simple heuristic: try common paths
-    tried = ["/menu","/menus","/food","/dinner","/lunch","/our-menu","/menu.pdf","/menus/dinner","/menus/lunch"]
-    base = website.rstrip("/")
-    session = requests.Session()
-    session.headers.update({"User-Agent": UA})
-    for path in tried:
-        url = base + path
-        try:
-            if not robots_allowed(url):
-                continue
-            r = session.get(url, timeout=15, allow_redirects=True)
-            if r.status_code == 200 and ("text/html" in r.headers.get("Content-Type","") or "application/pdf" in r.headers.get("Content-Type","")):
-                menu_cache.set(website, url)
-                return url
-        except Exception:
-            continue
-    # last resort: scan homepage anchors
+    # "" (searched everything, no menu) is cached too, for less time, so menu-less sites are not
+    # re-probed on every search; None (search cut short or requests failed) is not cached
+    with span("discovery"):
+        return menu_cache.get_or_load(website, lambda: discover_menu_url(website),
+                                      ttl=lambda url: None if url else MENU_NEGATIVE_TTL) or ""
+
+def fetch_menu(url: str, timeout, accept=("html", "pdf")):
+    """GET a menu URL, revalidating our stored copy with a conditional GET.
+
+    Bodies of a kind not in `accept` are refused after the first chunk
+    (http_client.UnsupportedContent); MENU_MAX_BYTES caps each kind.
+    """
+    t0 = time.perf_counter()
+    try:
+        with span("fetch"):
+            r = http_client.get_revalidated(url, store, ttl=MENU_BODY_TTL, fresh_sec=MENU_FRESH_SEC, headers={"User-Agent": UA},
+                                            timeout=timeout, max_bytes=MENU_MAX_BYTES, accept=accept)
+    except Exception as e:
+        menu_log.record(url=url, error=type(e).__name__, fetch_sec=round(time.perf_counter() - t0, 4))
+        raise
+    r.fetch_sec = time.perf_counter() - t0
+    return r
+
+def parse_menu(url: str, r) -> list:
+    """Items from a fetched menu by its sniffed kind, within the parse budgets; logged to menu_log."""
+    t0 = time.perf_counter()
+    if r.kind == "html":
+        budget = Budget(HTML_PARSE_BUDGET_SEC)
+        items = html_menu_items(url, r, budget)
+    else:
+        budget = Budget(PDF_PARSE_BUDGET_SEC, clock=time.monotonic)
+        items = pdf_menu_items(r.content, use_ocr=False, budget=budget)
+    menu_log.record(url=url, kind=r.kind, bytes=len(r.content), from_store=r.from_store,
+                    fetch_sec=round(r.fetch_sec, 4), parse_sec=round(time.perf_counter() - t0, 4),
+                    items=len(items), partial=budget.partial)
+    return items
+
+def html_menu_items(url: str, r, budget=None) -> list:
+    """Parsed items for an HTML menu response (cached by content hash)."""
+    budget = budget or Budget(HTML_PARSE_BUDGET_SEC)
+    with span("parse"):
+        return parsed_cache.get_or_parse("html", HTML_PARSER_VERSION, r.content,
+                                         lambda: extract_html_items(r.text, base_url=url, budget=budget), budget)
+
+def iter_pdf_pages(pdf_bytes: bytes, use_ocr: bool = False, budget=None):
+    """(page, items) from a PDF, stopping early once enough high-confidence items are in."""
+    strong = 0
+    for page, items in iter_page_items(pdf_bytes, use_ocr=use_ocr, budget=budget):
+        yield page, items
+        strong += sum(1 for it in items if item_confidence(it) == "high")
+        if PDF_ENOUGH_HIGH_CONF and strong >= PDF_ENOUGH_HIGH_CONF:
+            return
+
+def _pdf_cache_kind(use_ocr: bool) -> str:
+    # without a working OCR engine use_ocr changes nothing, so don't cache it as an OCR result
+    return ("pdf+ocr" if use_ocr and ocr.available() else "pdf") + f":enough{PDF_ENOUGH_HIGH_CONF}"
+
+def pdf_menu_items(pdf_bytes: bytes, use_ocr: bool = False, budget=None) -> list:
+    """Parsed items for a PDF menu (cached by content hash)."""
+    budget = budget or Budget(PDF_PARSE_BUDGET_SEC, clock=time.monotonic)
+    with span("parse"):
+        return parsed_cache.get_or_parse(_pdf_cache_kind(use_ocr), PDF_PARSER_VERSION, pdf_bytes,
+                                         lambda: [it for _, items in iter_pdf_pages(pdf_bytes, use_ocr, budget) for it in items],
+                                         budget)
+
+def menu_items_for(website: str) -> list:
+    """Resolve, fetch and parse a restaurant's menu; [] when nothing usable. Independent of the user's ctx."""
+    murl = menu_resolver(website)
+    if not murl or not robots_allowed(murl):
+        return []
+    try:
+        r = fetch_menu(murl, timeout=20, accept=("html",))
+    except http_client.UnsupportedContent:
+        # a PDF menu is only read when uploaded: remember the site as menu-less rather than refetch it
+        menu_cache.set(website, "", ttl=MENU_NEGATIVE_TTL)
+        return []
+    return parse_menu(murl, r) if r.ok and r.kind == "html" else []
+
+def menu_picks(website: str, ctx) -> list:
+    """Picks from a restaurant's menu; [] when nothing usable."""
     try:
-        if robots_allowed(base):
-            r = session.get(base, timeout=15)
-            if r.ok:
-                from bs4 import BeautifulSoup
-                soup = BeautifulSoup(r.text, "html.parser")
-                for a in soup.find_all("a", href=True):
-                    if re.search(r"menu", a.get_text(" ", strip=True), re.I) or re.search(r"/menu|/menus", a["href"], re.I):
-                        href = a["href"]
-                        if href.startswith("/"):
-                            url = base + href
-                        elif href.startswith("http"):
-                            url = href
-                        else:
-                            url = base + "/" + href
-                        menu_cache.set(website, url)
-                        return url
-    except Exception:
-        pass
-    return ""
+        items = menu_items_for(website)
+    except Exception as e:
+        count_error("menu", e)
+        return []
+    return build_pick_from_rules(items, ctx) if items else []
+
+def nearby_restaurants(zipc: str, radius: float, progress=_noop) -> list:
+    """Up to 25 restaurants within `radius` miles of a ZIP, nearest first; [] when lookups fail."""
+    progress(stage="geocode")
+    try:
+        # bundled centroid table first; Nominatim (rate-limited) only for ZIPs it lacks,
+        # with misses cached too ({}) so unknown ZIPs are not re-queried
+        with span("geocode"):
+            geo = zip_centroids.lookup(zipc) or geo_cache.get_or_load(zipc, lambda: geocode_zip(zipc))
+        if not geo: raise RuntimeError("ZIP not resolved")
+        progress(stage="restaurants")
+        with span("restaurants"):
+            return restaurant_index.nearby(geo["lat"], geo["lon"], radius_mi=radius, limit=25)[:25]
+    except Exception as e:
+        count_error("nearby_restaurants", e)
+        return []
+
+# Searches are counted so the warmer (warmer.py) can pre-build the busiest
+# ZIPs; it backs off while live requests keep the HTTP scheduler busy.
+popularity = Popularity(store)
+warmer = Warmer(store, restaurants=nearby_restaurants, menu_items=menu_items_for, popularity=popularity,
+                busy=lambda: scheduler.inflight >= scheduler.max_inflight // 2)
+
+_background_started = False
+_background_lock = threading.Lock()
+
+@app.before_request
+def _start_background():
+    # Threads do not survive fork(), so they start with the first request in each
+    # serving process rather than at import (which gunicorn's preload does in the master).
+    # The first requests arrive on many threads at once; only one of them starts the warmer.
+    global _background_started
+    if _background_started:
+        return
+    with _background_lock:
+        if not _background_started:
+            warmer.start_background(WARM_INTERVAL_SEC)
+            _background_started = True
 
 # ----------------- Routes -----------------
 @app.get("/")
 def home():
     return render_template("index.html")
 
+STARTED_AT = time.time()
+
 @app.get("/_ping")
 def _ping():
-    return ("ok", 200)
+    """Readiness: 200 once the bundled data is loaded (503 before), with how warm this process's caches are."""
+    checks = {"playbooks": playbooks.loads > 0, "zip_centroids": len(zip_centroids) > 0,
+              "cache_db": not isinstance(store, NullBackend)}
+    warm = {"zip_searches": len(zip_cache), "menu_urls": len(menu_cache), "parsed_menus": parsed_cache.snapshot()["cache"]["items"],
+            "restaurant_tiles": restaurant_index.snapshot()["tiles_in_memory"], "nutrient_products": nutrients.stats["products"],
+            "warmer_last_pass": warmer.stats["last_pass"]}
+    ready = checks["playbooks"] and checks["zip_centroids"]
+    return jsonify({"status": "ready" if ready else "starting", "checks": checks,
+                    "caches_warm": any(v for k, v in warm.items() if k != "nutrient_products"), "warm": warm,
+                    "pid": os.getpid(), "uptime_sec": round(time.time() - STARTED_AT)}), 200 if ready else 503
+
+def _collect():
+    """Scrape-time values for /metrics from the caches' and pools' own counters."""
+    caches = {"zip": zip_cache.snapshot(), "menu_url": menu_cache.snapshot(), "geocode": geo_cache.snapshot(),
+              "parsed": parsed_cache.snapshot()["cache"], "off_query": off_cache.snapshot()}
+    for key, kind, help in (("hits", "counter", "Cache hits."), ("misses", "counter", "Cache misses."),
+                            ("stale_hits", "counter", "Expired entries served while refreshing."),
+                            ("backend_hits", "counter", "Memory misses answered by the shared cache DB."),
+                            ("items", "gauge", "Entries in memory.")):
+        yield f"finedining_cache_{key}" + ("_total" if kind == "counter" else ""), kind, help, \
+            [({"cache": name}, snap.get(key, 0)) for name, snap in caches.items()]
+    rs = robots_cache.snapshot()
+    yield "finedining_robots_fetches_total", "counter", "robots.txt fetches.", [({}, rs.get("fetches", 0))]
+    sched = scheduler.snapshot()
+    yield "finedining_outbound_inflight", "gauge", "Outbound requests in flight.", [({}, sched["inflight"])]
+    yield "finedining_outbound_breakers_open", "gauge", "Hosts with an open circuit breaker.", [({}, len(sched["breakers_open"]))]
+    yield "finedining_outbound_slot_wait_seconds_total", "counter", "Time spent waiting for politeness slots.", [({}, sched["wait_sec"])]
+    js = jobs.snapshot()
+    yield "finedining_jobs_pending", "gauge", "Background jobs queued or running.", [({}, js["pending"])]
+    ri = restaurant_index.snapshot()
+    yield "finedining_restaurant_tiles_in_memory", "gauge", "Restaurant index tiles held in memory.", [({}, ri["tiles_in_memory"])]
+
+metrics.registry.collector(_collect)
+metrics.init_app(app)
+
+@app.get("/metrics")
+def _metrics():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.get("/_stats")
+def _stats():
+    return jsonify({"robots": robots_cache.snapshot(), "http": http_client.stats(),
+                    "zip_cache": zip_cache.snapshot(), "menu_cache": menu_cache.snapshot(),
+                    "geo_cache": geo_cache.snapshot(), "parsed_menus": parsed_cache.snapshot(),
+                    "restaurant_index": restaurant_index.snapshot(),
+                    "jobs": jobs.snapshot(), "warmer": warmer.snapshot(), "menu_fetches": menu_log.snapshot(),
+                    "off_cache": off_cache.snapshot(), "nutrients": nutrients.snapshot(), "store": type(store).__name__})
 
 @app.post("/nearby-by-zip")
 def nearby_by_zip_post():
     data = request.get_json(force=True, silent=True) or {}
+    zipc, radius, ctx = _nearby_args(data)
+    if data.get("stream") or request.args.get("stream") == "1":
+        return Response(stream_with_context(json.dumps(ev) + "\n" for ev in nearby_events(zipc, radius, ctx)),
+                        mimetype="application/x-ndjson", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return jsonify(nearby_payload(zipc, radius, ctx))
+
+def _nearby_args(data):
     zipc = str(data.get("zip","")).strip()
-    radius = float(data.get("radius_miles", 3.0))
-    ctx = {
-        "calorie_target": int(data.get("calorie_target", 600)),
-        "prioritize_protein": bool(data.get("prioritize_protein", True)),
-        "flags": data.get("flags", []) or []
-    }
     if not zipc or not zipc.isdigit() or len(zipc) != 5:
-        return jsonify({"error":"invalid zip"}), 400
-    cache_key = f"{zipc}:{radius}"
+        raise AnalysisError(400, {"error":"invalid zip"})
+    try:
+        radius = float(data.get("radius_miles", 3.0))
+    except (TypeError, ValueError):
+        radius = float("nan")
+    if radius != radius:  # NaN
+        raise AnalysisError(400, {"error":"invalid radius_miles"})
+    radius = min(max(radius, 0.1), MAX_RADIUS_MI)  # the UI allows 1-15 miles
+    return zipc, radius, ctx_from(data)
+
+def _restaurant_card(ent, ctx, picks=None) -> dict:
+    return {
+        "name": ent["name"],
+        "distance_mi": round(ent["distance_mi"],2),
+        "cuisine": ent.get("cuisine") or [],
+        "website": ent.get("website"),
+        "source": "menu" if picks else "playbook",
+        "picks": picks or build_pick_from_playbook(ent["name"], ent.get("cuisine"), ctx)
+    }
+
+def nearby_events(zipc: str, radius: float, ctx, progress=_noop):
+    """Search a ZIP, yielding results as they improve.
+
+    {"event":"restaurants"} with playbook picks as soon as the restaurant list
+    is known, a {"event":"menu","index":i,"restaurant":...} for each
+    restaurant whose menu gave picks (replacing restaurants[i]), then
+    {"event":"done"} with the full payload. A cached search yields only "done".
+    """
+    popularity.record(zipc, radius)
+    # picks depend on the user's context, so it is part of the key
+    cache_key = f"{zipc}:{radius}:{_ctx_key(ctx)}"
     cached = zip_cache.get(cache_key)
     if cached:
-        return jsonify(cached)
-    # Nominatim + Overpass
-    try:
-        geo = geocode_zip(zipc)
-        if not geo: raise RuntimeError("ZIP not resolved")
-        ents = overpass_restaurants(geo["lat"], geo["lon"], radius_mi=radius, limit=25)
-    except Exception as e:
-        # graceful fallback
-        ents = []
-    restaurants = []
-    for ent in ents[:25]:
-        picks = []
-        source = "playbook"
-        if ent.get("website"):
-            murl = menu_resolver(ent["website"])
-            if murl:
-                # fetch and parse
-                try:
-                    if robots_allowed(murl):
-                        r = requests.get(murl, headers={"User-Agent": UA}, timeout=20)
-                        if r.ok and "text/html" in r.headers.get("Content-Type",""):
-                            items = extract_html_items(r.text, base_url=murl)
-                            if items:
-                                picks = build_pick_from_rules(items, ctx)
-                                source = "menu"
-                except Exception:
-                    pass
-        if not picks:
-            picks = build_pick_from_playbook(ent["name"], ent.get("cuisine"), ctx)
-            source = source or "playbook"
-        restaurants.append({
-            "name": ent["name"],
-            "distance_mi": round(ent["distance_mi"],2),
-            "cuisine": ent.get("cuisine") or [],
-            "website": ent.get("website"),
-            "source": source,
-            "picks": picks
-        })
+        yield {"event":"done", **cached}
+        return
+    ents = nearby_restaurants(zipc, radius, progress)
+    restaurants = [_restaurant_card(ent, ctx) for ent in ents]
     # If OSM failed, produce minimal fake list so UI isn't empty
     if not restaurants:
         restaurants = [{
@@ -188,17 +346,41 @@ def nearby_by_zip_post():
             "source":"playbook",
             "picks": build_pick_from_playbook("Sample Grill", ["american"], ctx)
         }]
-    payload = {
-        "context": {"source":"zip","restaurant_name":None,"zip":zipc,"radius_miles":radius,"calorie_target":ctx["calorie_target"],"flags":ctx["flags"]},
-        "restaurants": restaurants,
-        "fallback_rules":[
-            "Pick grilled lean protein; ask for sauce on the side.",
-            "Choose one starch the size of your fist.",
-            "If portions are large, box half at the start."
-        ]
-    }
-    zip_cache.set(cache_key, payload)
-    return jsonify(payload)
+    context = {"source":"zip","restaurant_name":None,"zip":zipc,"radius_miles":radius,"calorie_target":ctx["calorie_target"],"flags":ctx["flags"]}
+    rules = [
+        "Pick grilled lean protein; ask for sauce on the side.",
+        "Choose one starch the size of your fist.",
+        "If portions are large, box half at the start."
+    ]
+    yield {"event":"restaurants", "context": context, "restaurants": list(restaurants), "fallback_rules": rules}
+    # Resolve, fetch and parse every restaurant website in parallel; whatever
+    # is not done by the deadline keeps its playbook picks.
+    with_site = [i for i, ent in enumerate(ents) if ent.get("website")]
+    done = answered = 0
+    progress(stage="menus", restaurants=len(ents), done=0, total=len(with_site))
+    for j, picks in iter_fan_out(lambda i: menu_picks(ents[i]["website"], ctx), with_site,
+                                 host=lambda i: urlparse.urlsplit(ents[i]["website"]).netloc.lower(),
+                                 deadline_sec=NEARBY_DEADLINE_SEC):
+        done += 1
+        answered += picks is not None  # None: fan-out error
+        progress(stage="menus", restaurants=len(ents), done=done, total=len(with_site))
+        if picks:
+            i = with_site[j]
+            restaurants[i] = _restaurant_card(ents[i], ctx, picks)
+            yield {"event":"menu", "index": i, "restaurant": restaurants[i]}
+    partial = answered < len(with_site)
+    payload = {"context": {**context, "partial": partial}, "restaurants": restaurants, "fallback_rules": rules}
+    # Partial results are served but not cached, so the next search picks up
+    # the menus that finished in the background.
+    if not partial:
+        zip_cache.set(cache_key, payload)
+    yield {"event":"done", **payload}
+
+def nearby_payload(zipc: str, radius: float, ctx, progress=_noop) -> dict:
+    """Restaurants near a ZIP with picks; progress(**event) is called as the search advances."""
+    for ev in nearby_events(zipc, radius, ctx, progress):
+        if ev["event"] == "done":
+            return {k: v for k, v in ev.items() if k != "event"}
 
 @app.get("/nearby-by-zip-test")
 def nearby_by_zip_test():
@@ -216,35 +398,39 @@ def nearby_by_zip_test():
 
 @app.post("/analyze-url")
 def analyze_url_post():
-    data = request.get_json(force=True, silent=True) or {}
-    url = sanitize_url(str(data.get("url","")).strip())
-    ctx = {
-        "calorie_target": int(data.get("calorie_target", 600)),
-        "prioritize_protein": bool(data.get("prioritize_protein", True)),
-        "flags": data.get("flags", []) or []
-    }
+    url, ctx = _analyze_url_args(request.get_json(force=True, silent=True) or {})
+    return jsonify(analyze_url_payload(url, ctx))
+
+def _analyze_url_args(data):
+    try:
+        url = sanitize_url(str(data.get("url","")).strip())
+    except ValueError as e:
+        raise AnalysisError(400, {"error":"invalid_url","message":str(e)})
+    return url, ctx_from(data)
+
+def analyze_url_payload(url: str, ctx, progress=_noop) -> dict:
+    """Picks for a menu URL (HTML or PDF); raises AnalysisError for robots/fetch/content-type failures."""
     if not robots_allowed(url):
-        return jsonify({"error":"robots_disallow","message":"Robots.txt disallows fetching this URL. Please upload a PDF instead.","context":{"source":"url"}}), 403
+        raise AnalysisError(403, {"error":"robots_disallow","message":"Robots.txt disallows fetching this URL. Please upload a PDF instead.","context":{"source":"url"}})
+    progress(stage="fetch")
     try:
-        r = requests.get(url, headers={"User-Agent": UA}, timeout=25)
+        r = fetch_menu(url, timeout=25)
+    except http_client.UnsupportedContent as e:
+        raise AnalysisError(415, {"error":"unsupported","message":str(e)})
+    except http_client.ResponseTooLarge as e:
+        raise AnalysisError(413, {"error":"too_large","message":str(e)})
     except Exception as e:
-        return jsonify({"error":"fetch_failed","message":str(e)}), 502
-    content_type = r.headers.get("Content-Type","")
-    restaurants = []
-    if "text/html" in content_type:
-        items = extract_html_items(r.text, base_url=url)
-        picks = build_pick_from_rules(items, ctx)[:3]
-        restaurants.append({"name":"Menu","distance_mi":None,"cuisine":[],"website":url,"source":"menu","picks":picks})
-    elif "application/pdf" in content_type or url.lower().endswith(".pdf"):
-        items = extract_from_pdf_bytes(r.content, use_ocr=False)
-        picks = build_pick_from_rules(items, ctx)[:3]
-        restaurants.append({"name":"Menu PDF","distance_mi":None,"cuisine":[],"website":url,"source":"menu","picks":picks})
-    else:
-        return jsonify({"error":"unsupported","message":f"Unsupported content-type: {content_type}"}), 415
-    payload = {"context":{"source":"url","restaurant_name":None,"zip":None,"radius_miles":None,
-                          "calorie_target":ctx["calorie_target"],"flags":ctx["flags"]},
-               "restaurants":restaurants}
-    return jsonify(payload)
+        count_error("analyze_fetch", e)
+        raise AnalysisError(502, {"error":"fetch_failed","message":str(e)})
+    if not r.ok:
+        raise AnalysisError(502, {"error":"fetch_failed","message":f"HTTP {r.status_code} from {url}"})
+    progress(stage="parse", content_type=r.headers.get("Content-Type",""), kind=r.kind)
+    picks = build_pick_from_rules(parse_menu(url, r), ctx)[:3]
+    name = "Menu PDF" if r.kind == "pdf" else "Menu"
+    restaurants = [{"name":name,"distance_mi":None,"cuisine":[],"website":url,"source":"menu","picks":picks}]
+    return {"context":{"source":"url","restaurant_name":None,"zip":None,"radius_miles":None,
+                       "calorie_target":ctx["calorie_target"],"flags":ctx["flags"]},
+            "restaurants":restaurants}
 
 @app.get("/analyze-url-test")
 def analyze_url_test():
@@ -262,32 +448,151 @@ def analyze_url_test():
 
 @app.post("/analyze-pdf")
 def analyze_pdf():
-    f = request.files.get("menu_pdf")
-    use_ocr = (request.form.get("use_ocr","0") == "1")
-    if not f: return jsonify({"error":"no_file"}), 400
-    pdf_bytes = f.read()
-    items = extract_from_pdf_bytes(pdf_bytes, use_ocr=use_ocr)
-    ctx = {
-        "calorie_target": int(request.form.get("calorie_target", "600")),
-        "prioritize_protein": request.form.get("prioritize_protein","1") == "1",
-        "flags": request.form.getlist("flags")
-    }
+    pdf_bytes, use_ocr, ctx = _analyze_pdf_args()
+    if request.form.get("stream") == "1" or request.args.get("stream") == "1":
+        return Response(stream_with_context(json.dumps(ev) + "\n" for ev in pdf_analysis_events(pdf_bytes, use_ocr, ctx)),
+                        mimetype="application/x-ndjson")
+    t0 = time.perf_counter()
+    budget = Budget(PDF_PARSE_BUDGET_SEC, clock=time.monotonic)
+    items = pdf_menu_items(pdf_bytes, use_ocr=use_ocr, budget=budget)
+    menu_log.record(url=None, kind="pdf", source="upload", bytes=len(pdf_bytes), parse_sec=round(time.perf_counter() - t0, 4),
+                    items=len(items), partial=budget.partial)
     picks = build_pick_from_rules(items, ctx)[:3]
+    return jsonify(_pdf_payload(picks, ctx, use_ocr))
+
+def _analyze_pdf_args():
+    f = request.files.get("menu_pdf")
+    if not f: raise AnalysisError(400, {"error":"no_file"})
+    return f.read(), request.form.get("use_ocr","0") == "1", ctx_from(request.form, form=True)
+
+def _pdf_payload(picks, ctx, use_ocr=False):
     payload = {"context":{"source":"pdf","restaurant_name":None,"zip":None,"radius_miles":None,
                           "calorie_target":ctx["calorie_target"],"flags":ctx["flags"]},
                "restaurants":[{"name":"Uploaded Menu","distance_mi":None,"cuisine":[],"website":None,"source":"menu","picks":picks}]}
-    return jsonify(payload)
+    if use_ocr and not ocr.available():
+        payload["ocr_unavailable"] = True  # scanned pages were not read: no tesseract/pypdfium2 on this host
+    return payload
+
+def pdf_analysis_events(pdf_bytes: bytes, use_ocr: bool, ctx):
+    """One {"event":"page"} dict with the picks so far per page read, then {"event":"done"} with the full payload."""
+    kind = _pdf_cache_kind(use_ocr)
+    items = parsed_cache.lookup(kind, PDF_PARSER_VERSION, pdf_bytes)
+    if items is None:
+        items = []
+        t0 = time.perf_counter()
+        budget = Budget(PDF_PARSE_BUDGET_SEC, clock=time.monotonic)
+        for page, page_items in iter_pdf_pages(pdf_bytes, use_ocr, budget):
+            items.extend(page_items)
+            picks = build_pick_from_rules(items, ctx)
+            yield {"event":"page","page":page + 1,"items_so_far":len(items),"picks":picks}
+        parse_sec = time.perf_counter() - t0
+        parsed_cache.store(kind, PDF_PARSER_VERSION, pdf_bytes, items, parse_sec, partial=budget.partial)
+        menu_log.record(url=None, kind="pdf", source="upload", bytes=len(pdf_bytes), parse_sec=round(parse_sec, 4),
+                        items=len(items), partial=budget.partial)
+    yield {"event":"done","items":len(items),**_pdf_payload(build_pick_from_rules(items, ctx), ctx, use_ocr)}
+
+# ----------------- Background jobs -----------------
+# POST /jobs/<kind> takes the same body as the synchronous endpoint and
+# answers 202 with a job id; identical requests in flight share one job.
+def _ctx_key(ctx) -> str:
+    return json.dumps(ctx, sort_keys=True)
+
+def _pdf_job(pdf_bytes, use_ocr, ctx):
+    def run(job):
+        for ev in pdf_analysis_events(pdf_bytes, use_ocr, ctx):
+            if ev["event"] == "done":
+                return {k: v for k, v in ev.items() if k != "event"}
+            job.progress(stage="pages", page=ev["page"], items_so_far=ev["items_so_far"], picks=ev["picks"])
+    return run
+
+def _nearby_job(zipc, radius, ctx):
+    def run(job):
+        for ev in nearby_events(zipc, radius, ctx, job.progress):
+            if ev["event"] == "done":
+                return {k: v for k, v in ev.items() if k != "event"}
+            if ev["event"] == "restaurants":
+                job.progress(stage="listed", restaurants=ev["restaurants"])
+            else:
+                job.progress(stage="menu", index=ev["index"], restaurant=ev["restaurant"])
+    return run
+
+@app.post("/jobs/<kind>")
+def submit_job(kind):
+    if kind == "nearby-by-zip":
+        zipc, radius, ctx = _nearby_args(request.get_json(force=True, silent=True) or {})
+        key, fn = (kind, zipc, radius, _ctx_key(ctx)), _nearby_job(zipc, radius, ctx)
+    elif kind == "analyze-url":
+        url, ctx = _analyze_url_args(request.get_json(force=True, silent=True) or {})
+        key, fn = (kind, url, _ctx_key(ctx)), lambda job: analyze_url_payload(url, ctx, job.progress)
+    elif kind == "analyze-pdf":
+        pdf_bytes, use_ocr, ctx = _analyze_pdf_args()
+        key, fn = (kind, hashlib.sha256(pdf_bytes).hexdigest(), use_ocr, _ctx_key(ctx)), _pdf_job(pdf_bytes, use_ocr, ctx)
+    else:
+        return jsonify({"error":"unknown_job_kind"}), 404
+    try:
+        job = jobs.submit(kind, key, fn)
+    except JobsFull:
+        return jsonify({"error":"busy","message":"Too many analyses in progress, retry shortly."}), 429, {"Retry-After": "5"}
+    return jsonify({"job_id": job.id, "status": job.status,
+                    "status_url": f"/jobs/{job.id}", "events_url": f"/jobs/{job.id}/events"}), 202
+
+@app.get("/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if not job: return jsonify({"error":"unknown_job"}), 404
+    return jsonify(job.to_dict())
+
+def _sse(event: str, data, eid=None) -> str:
+    return (f"id: {eid}\n" if eid is not None else "") + f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/jobs/<job_id>/events")
+def job_events(job_id):
+    """SSE: a "progress" event per step (id = its index, so reconnects resume), then "done" or "failed"."""
+    job = jobs.get(job_id)
+    if not job: return jsonify({"error":"unknown_job"}), 404
+    try:
+        since = int(request.headers.get("Last-Event-ID", "-1")) + 1
+    except ValueError:
+        since = 0
+    def stream():
+        i = since
+        while True:
+            events = job.wait_events(i, SSE_KEEPALIVE_SEC)
+            for ev in events:
+                yield _sse("progress", ev, i)
+                i += 1
+            if job.done and i >= len(job.events):
+                yield _sse(job.status, job.to_dict())
+                return
+            if not events:
+                yield ": keepalive\n\n"
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.errorhandler(AnalysisError)
+def _analysis_error(e):
+    return jsonify(e.payload), e.status
 
 @app.get("/openfoodfacts")
 def off_proxy():
     q = request.args.get("q","").strip()
     if not q: return jsonify({"items":[]})
     try:
-        data = search_off(q, page_size=10)
+        data = off_cache.get_or_load(" ".join(q.lower().split()), lambda: _off_search(q))
         return jsonify({"context":{"source":"openfoodfacts"}, **data})
     except Exception as e:
+        count_error("openfoodfacts", e)
+        # OFF down or slow: answer from products seen before, if any
+        local = nutrients.search(q, 10)
+        if local:
+            return jsonify({"context":{"source":"local"}, "count": len(local), "items": local})
         return jsonify({"items":[],"error":str(e)}), 502
 
+def _off_search(q: str) -> dict:
+    data = search_off(q, page_size=10, timeout=OFF_TIMEOUT_SEC)
+    nutrients.add(row_from_off_item(it) for it in data["items"])
+    return data
+
 @app.post("/rank")
 def rank_endpoint():
     data = request.get_json(force=True, silent=True) or {}
@@ -297,9 +602,45 @@ def rank_endpoint():
         "prioritize_protein": bool(data.get("prioritize_protein", True)),
         "flags": data.get("flags", []) or []
     }
-    picks = rank_items(items, ctx["calorie_target"], ctx["prioritize_protein"], ctx["flags"])[:5]
+    picks = rank_top_k(items, 5, ctx["calorie_target"], ctx["prioritize_protein"], ctx["flags"])
     return jsonify({"picks": picks})
 
+RANK_BATCH_MAX_PROFILES = 10000
+
+@app.post("/rank-batch")
+def rank_batch_endpoint():
+    """One menu, many user contexts: {items, profiles:[{id, calorie_target, prioritize_protein, flags}], k}."""
+    data = request.get_json(force=True, silent=True) or {}
+    items, profiles, k = _rank_batch_args(data)
+    ranked = rank_profiles(items, profiles, k)
+    results = [{"id": p.get("id"), "picks": picks} for p, picks in zip(profiles, ranked)]
+    return jsonify({"k": k, "results": results})
+
+def _rank_batch_args(data):
+    items, profiles = data.get("items", []) or [], data.get("profiles", []) or []
+    if not isinstance(items, list) or not all(
+            isinstance(it, dict) and all(isinstance(it.get(f) or "", str) for f in ("item_name", "description", "section"))
+            for it in items):
+        raise AnalysisError(400, {"error":"invalid_items","message":"items must be a list of {item_name, description, section} objects"})
+    if not isinstance(profiles, list) or not all(isinstance(p, dict) for p in profiles):
+        raise AnalysisError(400, {"error":"invalid_profiles","message":"profiles must be a list of objects"})
+    if len(profiles) > RANK_BATCH_MAX_PROFILES:
+        raise AnalysisError(400, {"error":"too_many_profiles","max":RANK_BATCH_MAX_PROFILES,
+                                  "message":f"at most {RANK_BATCH_MAX_PROFILES} profiles per request"})
+    try:
+        k = int(data.get("k", 3))
+    except (TypeError, ValueError, OverflowError):
+        raise AnalysisError(400, {"error":"invalid_k","message":"k must be an integer"})
+    for i, p in enumerate(profiles):
+        try:
+            int(p.get("calorie_target", 600))
+        except (TypeError, ValueError, OverflowError):
+            raise AnalysisError(400, {"error":"invalid_profiles","message":f"profiles[{i}].calorie_target must be a number"})
+        flags = p.get("flags") or []
+        if not isinstance(flags, list) or not all(isinstance(f, str) for f in flags):
+            raise AnalysisError(400, {"error":"invalid_profiles","message":f"profiles[{i}].flags must be a list of strings"})
+    return items, profiles, max(1, min(20, k))
+
 # Favicon (optional nice to have)
 @app.get("/favicon.ico")
 def favicon():
@@ -0,0 +1,87 @@
+"""
+Throughput of the HTML menu extractors: lxml engine vs BeautifulSoup/html.parser.
+
+    python bench/bench_html_menu.py [saved_page.html | dir ...] [--repeat N]
+
+Runs over samples/*.html, any saved pages/directories given on the command
+line, and generated card-, list- and paragraph-style menus of increasing size.
+Reports ms per page, MB/s and whether both engines extracted the same items.
+"""
+
+import os, sys, glob, time, random, argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from parsers.html_menu import extract_items_bs4, extract_items_lxml
+
+WORDS = ["grilled","chicken","salmon","rice","fries","creamy","garlic","herb","lemon","steak","tofu","salsa",
+         "roasted","vegetables","aioli","bun","seasonal","greens","crispy","spicy","house","tomato","basil"]
+SECTIONS = ["Starters","Salads","Bowls","Pasta","Steak","Seafood","Sandwich","Sides","Tacos"]
+
+def _words(rnd, n):
+    return " ".join(rnd.choice(WORDS) for _ in range(n))
+
+def generated_page(style: str, n_items: int, seed: int = 0) -> str:
+    """Synthetic menu page with n_items dishes, padded with typical site chrome."""
+    rnd = random.Random(seed)
+    out = ["<html><head><title>Menu</title><script>var x = 1;</script><style>.a{color:red}</style></head><body>",
+           "<nav><ul>" + "".join(f"<li><a href='/p{i}'>Link {i}</a></li>" for i in range(40)) + "</ul></nav>"]
+    per_section = max(1, n_items // len(SECTIONS))
+    for i in range(n_items):
+        if i % per_section == 0:
+            sec = SECTIONS[(i // per_section) % len(SECTIONS)]
+            out.append(f"<section class='menu-section'><h2>{sec}</h2>" if style == "cards" else f"<h3>{sec}</h3>")
+            if style == "list": out.append("<ul>")
+        name, desc = _words(rnd, 3).title() + f" {i}", _words(rnd, 8)
+        if style == "cards":
+            out.append(f"<div class='menu-item'><div class='item-title'>{name}</div>"
+                       f"<p class='item-description'>{desc}</p><span class='price'>$14</span></div>")
+        elif style == "list":
+            out.append(f"<li>{name} - {desc}</li>")
+        else:
+            out.append(f"<p><strong>{name}</strong> - {desc}</p>")
+        if (i + 1) % per_section == 0 or i == n_items - 1:
+            out.append("</section>" if style == "cards" else ("</ul>" if style == "list" else ""))
+    out.append("<footer>" + "<p>Fine print " * 50 + "</footer></body></html>")
+    return "".join(out)
+
+def corpus(paths):
+    pages = []
+    for p in [os.path.join(ROOT, "samples", "*.html")] + list(paths):
+        files = glob.glob(os.path.join(p, "*.htm*")) if os.path.isdir(p) else glob.glob(p)
+        for f in sorted(files):
+            with open(f, encoding="utf-8", errors="replace") as fh:
+                pages.append((os.path.relpath(f, ROOT), fh.read()))
+    for style in ("cards", "list", "paras"):
+        for n in (20, 200, 2000):
+            pages.append((f"generated:{style}:{n}", generated_page(style, n)))
+    return pages
+
+def _time(fn, html, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(html)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("paths", nargs="*")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+    print(f"{'page':28} {'KB':>7} {'items':>6} {'bs4 ms':>9} {'lxml ms':>9} {'speedup':>8} {'lxml MB/s':>10} same")
+    tot_b = tot_l = 0.0
+    for name, html in corpus(args.paths):
+        items = extract_items_lxml(html)
+        same = items == extract_items_bs4(html)
+        tb = _time(extract_items_bs4, html, args.repeat)
+        tl = _time(extract_items_lxml, html, args.repeat)
+        tot_b += tb; tot_l += tl
+        kb = len(html.encode("utf-8")) / 1024
+        print(f"{name[:28]:28} {kb:7.1f} {len(items):6} {tb*1000:9.2f} {tl*1000:9.2f} {tb/tl:7.1f}x {kb/1024/tl:10.1f} {'yes' if same else 'NO'}")
+    print(f"{'total':28} {'':7} {'':6} {tot_b*1000:9.1f} {tot_l*1000:9.1f} {tot_b/tot_l:7.1f}x")
+
+if __name__ == "__main__":
+    main()
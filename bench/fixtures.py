@@ -0,0 +1,149 @@
+"""
+Deterministic stand-ins for everything the app fetches, used by bench/replay.py
+when no recorded response matches a request.
+
+Restaurants live on a fixed 0.01° grid of cells, each cell seeded by its
+indices, so any Overpass bbox gets the same restaurants every run. Every
+restaurant with a website gets its own *.bench.test site: robots.txt, a
+homepage linking to its menu, and the menu itself, an HTML page in one of
+the styles of bench_html_menu.generated_page or a text-layer PDF. Some
+sites keep their menu under a less common path and some have none, so menu
+discovery does real work.
+"""
+
+import re, json, math, random, hashlib
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from bench.bench_html_menu import generated_page, WORDS, SECTIONS
+
+CELL_DEG = 0.01
+PER_CELL = 2            # restaurants per cell, ~5 per square mile
+SITE_DOMAIN = "bench.test"
+CUISINES = ["american", "italian", "mexican", "thai", "japanese", "indian", "burger", "seafood", "steak_house"]
+MENU_PATHS = ["/menu", "/menu", "/menu", "/menus/dinner", "/our-menu", "/menu.pdf", None]  # None: no menu
+
+def _rnd(*key) -> random.Random:
+    return random.Random(hashlib.sha1(repr(key).encode()).hexdigest())
+
+# ----------------- Overpass / Nominatim -----------------
+
+def _cell_places(i: int, j: int) -> List[Dict[str, Any]]:
+    rnd = _rnd("cell", i, j)
+    out = []
+    for k in range(PER_CELL):
+        lat = (i + rnd.random()) * CELL_DEG
+        lon = (j + rnd.random()) * CELL_DEG
+        slug = f"r{i & 0xffffff:x}{j & 0xffffff:x}{k}"
+        tags = {"amenity": "restaurant", "name": " ".join(rnd.choice(WORDS) for _ in range(2)).title() + f" {k}",
+                "cuisine": rnd.choice(CUISINES)}
+        if rnd.random() < 0.7:
+            tags["website"] = f"http://{slug}.{SITE_DOMAIN}"
+        out.append({"type": "node", "id": abs(hash((i, j, k))) % 10**10, "lat": round(lat, 6), "lon": round(lon, 6), "tags": tags})
+    return out
+
+def overpass_response(query: str) -> Dict[str, Any]:
+    """Elements for every bbox in an Overpass QL query (restaurant_index / osm.py shapes)."""
+    m = re.search(r"\(\s*([-\d.]+)\s*,\s*([-\d.]+)\s*,\s*([-\d.]+)\s*,\s*([-\d.]+)\s*\)", query)
+    elements = []
+    if m:
+        s, w, n, e = map(float, m.groups())
+        for i in range(math.floor(s / CELL_DEG), math.floor(n / CELL_DEG) + 1):
+            for j in range(math.floor(w / CELL_DEG), math.floor(e / CELL_DEG) + 1):
+                elements += [el for el in _cell_places(i, j) if s <= el["lat"] <= n and w <= el["lon"] <= e]
+    return {"version": 0.6, "generator": "bench", "elements": elements}
+
+def nominatim_response(q: str) -> List[Dict[str, Any]]:
+    from zip_centroids import zip_centroids
+    geo = zip_centroids.lookup(q.strip()[:5])
+    return [{"lat": str(geo["lat"]), "lon": str(geo["lon"]), "display_name": q}] if geo else []
+
+# ----------------- Restaurant sites -----------------
+
+def site_menu_path(host: str) -> Optional[str]:
+    return _rnd("site", host).choice(MENU_PATHS)
+
+@lru_cache(maxsize=512)
+def menu_html(host: str) -> str:
+    rnd = _rnd("menu", host)
+    return generated_page(rnd.choice(["cards", "list", "paras"]), rnd.randrange(20, 160), seed=rnd.randrange(10**6))
+
+@lru_cache(maxsize=64)
+def menu_pdf(host: str, pages: int = 0) -> bytes:
+    rnd = _rnd("pdf", host)
+    return make_menu_pdf(pages or rnd.randrange(1, 6), seed=rnd.randrange(10**6))
+
+def site_response(host: str, path: str) -> Tuple[int, str, bytes]:
+    """(status, content type, body) for a synthetic restaurant site."""
+    menu = site_menu_path(host)
+    if path == "/robots.txt":
+        return 200, "text/plain", b"User-agent: *\nAllow: /\n"
+    if path in ("", "/"):
+        link = f"<a href='{menu}'>Our Menu</a>" if menu else "<a href='/about'>About us</a>"
+        return 200, "text/html; charset=utf-8", f"<html><head><title>{host}</title></head><body><nav>{link}</nav><p>Welcome</p></body></html>".encode()
+    if menu and path == menu:
+        if menu.endswith(".pdf"):
+            return 200, "application/pdf", menu_pdf(host)
+        return 200, "text/html; charset=utf-8", menu_html(host).encode()
+    return 404, "text/html", b"<html><body>Not found</body></html>"
+
+# ----------------- Text-layer PDFs -----------------
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """Minimal PDF with one Helvetica text line per entry, one page per list."""
+    objs = []
+    def add(b):
+        objs.append(b)
+        return len(objs)
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(b"")
+    kids = []
+    for lines in pages:
+        ops = ["BT /F1 11 Tf 14 TL 50 780 Td"]
+        for ln in lines:
+            ops.append("(%s) Tj T*" % ln.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)"))
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        c = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                        b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, c, font)))
+    objs[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+    cat = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+    out, offs = bytearray(b"%PDF-1.4\n"), []
+    for i, o in enumerate(objs, 1):
+        offs.append(len(out))
+        out += b"%d 0 obj\n" % i + o + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1) + b"".join(b"%010d 00000 n \n" % o for o in offs)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, cat, xref)
+    return bytes(out)
+
+def make_menu_pdf(n_pages: int, per_page: int = 30, seed: int = 0) -> bytes:
+    rnd = random.Random(seed)
+    pages = []
+    for p in range(n_pages):
+        lines = [SECTIONS[p % len(SECTIONS)].upper()]
+        for i in range(per_page):
+            name = " ".join(rnd.choice(WORDS) for _ in range(3)).title()
+            lines.append(f"{name} {p}-{i} - {' '.join(rnd.choice(WORDS) for _ in range(6))}")
+        pages.append(lines)
+    return make_pdf(pages)
+
+def menu_items(n: int, seed: int = 0) -> List[Dict[str, str]]:
+    """Extracted-item dicts as the parsers produce them, for ranking benchmarks."""
+    rnd = random.Random(seed)
+    return [{"section": rnd.choice(SECTIONS), "item_name": " ".join(rnd.choice(WORDS) for _ in range(3)).title(),
+             "description": " ".join(rnd.choice(WORDS) for _ in range(8))} for _ in range(n)]
+
+def nutrient_rows(n: int, seed: int = 0) -> List[list]:
+    """Packaged-product rows (nutrient_store.product_row) named from the menu vocabulary."""
+    from nutrient_store import product_row
+    rnd = random.Random(seed)
+    return [product_row(str(i), " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(2, 5))).title(), f"Brand {i % 97}",
+                        rnd.randint(40, 500), rnd.randint(0, 30), None, None, f"{rnd.randint(30, 400)} g") for i in range(n)]
+
+def off_response() -> Dict[str, Any]:
+    return {"count": 0, "page": 1, "products": []}
+
+def dumps(obj) -> bytes:
+    return json.dumps(obj).encode()
@@ -0,0 +1,197 @@
+"""
+Load-test profile: how many concurrent clients the production setup
+(gunicorn.conf.py + wsgi.py) sustains.
+
+By default it starts gunicorn with the repo's settings on a free port, with
+every outside service replaced by bench/replay.py (installed in the master
+before fork, so workers inherit it), then ramps closed-loop clients through
+--levels, --seconds each. Each client loops over
+
+    ~88%  warm ZIP search   a handful of ZIPs, new calorie target each time (ranking only)
+    ~12%  /analyze-url      a synthetic HTML menu
+
+while a paced stream adds --cold-rate searches per second for ZIPs not
+searched before (tiles, menu discovery, fetch, parse). New areas are paced
+rather than given to the clients because Overpass allows 0.5 requests/s
+(scheduler.py): any cold share above that rate only measures the queue in
+front of Overpass, not this server. It reports p50/p95/p99 and throughput
+per level plus the highest level that kept p95 under --slo-ms with at most
+1% errors.
+
+    python bench/load.py
+    python bench/load.py --levels 8,16,32,64 --seconds 20 --slo-ms 1500 --cold-rate 0.2
+    python bench/load.py --url http://staging:10000    # an already running server (no replay)
+"""
+
+import os, sys, json, time, runpy, random, socket, argparse, tempfile, threading, subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+
+from bench.run import percentile, ZIPS
+
+WARM_ZIPS = ZIPS[:4]
+
+def serve(port: int, latency_ms: float) -> None:
+    """Run gunicorn with gunicorn.conf.py in this process, outbound HTTP answered by the replay server."""
+    from gunicorn.app.base import BaseApplication
+    from bench.replay import ReplayServer, install
+
+    class Server(BaseApplication):
+        def load_config(self):
+            conf = runpy.run_path(os.path.join(ROOT, "gunicorn.conf.py"))
+            for k, v in conf.items():
+                if k in self.cfg.settings: self.cfg.set(k, v)
+            self.cfg.set("bind", f"127.0.0.1:{port}")
+            self.cfg.set("accesslog", None)
+            self.cfg.set("loglevel", "warning")
+
+        def load(self):
+            replay = ReplayServer(latency_ms={"": latency_ms}).start()
+            install(replay)
+            import wsgi
+            return wsgi.app
+
+    os.chdir(ROOT)
+    Server().run()
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(latency_ms: float):
+    tmp = tempfile.mkdtemp(prefix="bench-load-")
+    port = _free_port()
+    env = {**os.environ, "CACHE_DB_PATH": os.path.join(tmp, "cache.sqlite3"), "WARM_INTERVAL_SEC": "0", "PYTHONPATH": ROOT}
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", "--port", str(port),
+                             "--latency-ms", str(latency_ms)], env=env)
+    return proc, f"http://127.0.0.1:{port}"
+
+def wait_ready(base: str, timeout: float = 60) -> dict:
+    import requests
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            r = requests.get(base + "/_ping", timeout=2)
+            if r.status_code == 200:
+                return r.json()
+        except requests.RequestException:
+            pass
+        time.sleep(0.3)
+    raise SystemExit(f"{base} not ready after {timeout:.0f}s")
+
+def cold_zips(n: int):
+    from zip_centroids import zip_centroids
+    zips = [f"{z:05d}" for z in zip_centroids.zips] if len(zip_centroids) else ZIPS
+    return iter(random.Random(7).sample(zips, min(n, len(zips))))
+
+def html_menu_urls():
+    from bench import fixtures
+    hosts = [f"r{i:x}0.{fixtures.SITE_DOMAIN}" for i in range(300)]
+    return [f"http://{h}{fixtures.site_menu_path(h)}" for h in hosts
+            if (fixtures.site_menu_path(h) or "").startswith("/menu") and not fixtures.site_menu_path(h).endswith(".pdf")][:30]
+
+def run_level(base: str, clients: int, seconds: float, cold, urls, cold_rate: float) -> dict:
+    import requests
+    lock = threading.Lock()
+    lat, errors, kinds = [], [0], {}  # kinds: kind -> latencies
+    stop = time.monotonic() + seconds
+
+    def call(s, kind, path, body):
+        t = time.perf_counter()
+        try:
+            ok = s.post(base + path, json=body, timeout=120).status_code == 200
+        except requests.RequestException:
+            ok = False
+        dt = time.perf_counter() - t
+        with lock:
+            lat.append(dt)
+            kinds.setdefault(kind, []).append(dt)
+            if not ok: errors[0] += 1
+
+    def session():
+        s = requests.Session()
+        s.trust_env = False
+        return s
+
+    def client(seed):
+        rnd, s = random.Random(seed), session()
+        while time.monotonic() < stop:
+            if rnd.random() < 0.88:
+                call(s, "warm", "/nearby-by-zip",
+                     {"zip": rnd.choice(WARM_ZIPS), "radius_miles": 2, "calorie_target": rnd.randrange(400, 900)})
+            else:
+                call(s, "url", "/analyze-url", {"url": rnd.choice(urls)})
+
+    inflight = []
+
+    def new_areas():
+        t = time.monotonic()
+        while cold_rate > 0 and t < stop:
+            z = next(cold, None)
+            if z is None: return
+            th = threading.Thread(target=call, args=(session(), "cold", "/nearby-by-zip", {"zip": z, "radius_miles": 2}))
+            th.start()
+            inflight.append(th)
+            t += 1.0 / cold_rate
+            time.sleep(max(0.0, t - time.monotonic()))
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)] + [threading.Thread(target=new_areas)]
+    for th in threads: th.start()
+    for th in threads + inflight: th.join()  # new_areas has finished, so inflight is complete
+    wall = time.perf_counter() - t0
+    lat.sort()
+    mix = {k: {"n": len(v), "p95_ms": round(percentile(sorted(v), 95) * 1000, 1)} for k, v in sorted(kinds.items())}
+    return {"clients": clients, "n": len(lat), "errors": errors[0], "mix": mix,
+            "p50_ms": round(percentile(lat, 50) * 1000, 1), "p95_ms": round(percentile(lat, 95) * 1000, 1),
+            "p99_ms": round(percentile(lat, 99) * 1000, 1), "per_sec": round(len(lat) / wall, 1) if wall else 0.0}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python bench/load.py")
+    ap.add_argument("cmd", nargs="?", default="run", choices=["run", "serve"])
+    ap.add_argument("--url", help="load an already running server instead of starting one")
+    ap.add_argument("--levels", default="1,4,8,16,32,64", help="concurrent clients per step")
+    ap.add_argument("--seconds", type=float, default=10, help="duration of each step")
+    ap.add_argument("--cold-rate", type=float, default=0.4, help="searches per second for areas not searched before")
+    ap.add_argument("--slo-ms", type=float, default=2000, help="p95 latency a level must stay under")
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="replayed latency of restaurant sites")
+    ap.add_argument("--port", type=int, default=0)
+    ap.add_argument("--save", help="write the results as JSON")
+    args = ap.parse_args(argv)
+    if args.cmd == "serve":
+        serve(args.port or _free_port(), args.latency_ms)
+        return 0
+
+    proc, base = (None, args.url) if args.url else start_server(args.latency_ms)
+    try:
+        ping = wait_ready(base)
+        print(f"server {base} ready (pid {ping.get('pid')}); clients ~88% warm ZIP / ~12% analyze-url, "
+              f"plus {args.cold_rate:g} new-area searches/s", flush=True)
+        import requests
+        for z in WARM_ZIPS:  # the warm searches should only rank
+            requests.post(base + "/nearby-by-zip", json={"zip": z, "radius_miles": 2}, timeout=120)
+        cold, urls = cold_zips(100000), html_menu_urls()
+        print(f"{'clients':>7} {'n':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per s':>8}", flush=True)
+        results, sustained = [], 0
+        for c in (int(x) for x in args.levels.split(",")):
+            r = run_level(base, c, args.seconds, cold, urls, args.cold_rate)
+            results.append(r)
+            ok = r["n"] and r["p95_ms"] <= args.slo_ms and r["errors"] <= 0.01 * r["n"]
+            if ok: sustained = c
+            by_kind = "  ".join(f"{k} {m['p95_ms']:.0f}" for k, m in r["mix"].items())
+            print(f"{c:7} {r['n']:6} {r['errors']:4} {r['p50_ms']:9.1f} {r['p95_ms']:9.1f} {r['p99_ms']:9.1f} {r['per_sec']:8.1f}"
+                  f"  p95 by kind: {by_kind}" + ("" if ok else "  over SLO"), flush=True)
+        print(f"sustained: {sustained} concurrent clients with p95 <= {args.slo_ms:.0f} ms and <= 1% errors")
+        if args.save:
+            with open(args.save, "w") as f:
+                json.dump({"url": args.url, "slo_ms": args.slo_ms, "cold_rate": args.cold_rate, "sustained_clients": sustained, "levels": results}, f, indent=1)
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=120)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
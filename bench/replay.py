@@ -0,0 +1,184 @@
+"""
+Local stand-in for every outside service the app talks to.
+
+ReplayServer answers from recorded responses first (a fixtures directory
+written by `record`), then from the deterministic generators in
+bench/fixtures.py: Nominatim, Overpass, Open Food Facts and the
+*.bench.test restaurant sites. Each response is delayed by the configured
+latency for its host. install() mounts an adapter on http_client.session
+that sends every outbound request to the server with the original Host
+header, so connection pooling, retries, the politeness scheduler and size
+caps all run as in production; only TLS is skipped.
+
+Record real responses for later replay:
+
+    python bench/replay.py record fixtures/ https://example.com/menu [...]
+    python bench/replay.py record fixtures/ --post https://overpass-api.de/api/interpreter query.txt
+"""
+
+import os, sys, json, time, hashlib, threading
+import urllib.parse as urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+
+from requests.adapters import HTTPAdapter
+
+from bench import fixtures
+
+def fixture_key(method: str, host: str, path_qs: str, body: bytes = b"") -> str:
+    key = f"{method} {host.lower()}{path_qs}"
+    return key + (" " + hashlib.sha1(body).hexdigest()[:16] if body else "")
+
+class Fixtures:
+    """Recorded responses: index.json maps fixture_key -> {status, headers, file}."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.index = {}
+        if path and os.path.exists(os.path.join(path, "index.json")):
+            with open(os.path.join(path, "index.json")) as f:
+                self.index = json.load(f)
+
+    def get(self, key: str):
+        ent = self.index.get(key)
+        if not ent:
+            return None
+        with open(os.path.join(self.path, ent["file"]), "rb") as f:
+            return ent["status"], ent["headers"], f.read()
+
+    def add(self, key: str, status: int, headers: Dict[str, str], body: bytes) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        name = hashlib.sha1(key.encode()).hexdigest()[:20] + ".bin"
+        with open(os.path.join(self.path, name), "wb") as f:
+            f.write(body)
+        self.index[key] = {"status": status, "headers": headers, "file": name}
+        with open(os.path.join(self.path, "index.json"), "w") as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+
+class ReplayServer:
+    """Threaded HTTP server on 127.0.0.1; latency_ms per host suffix ("" = default)."""
+
+    def __init__(self, fixtures_dir: Optional[str] = None, latency_ms: Optional[Dict[str, float]] = None):
+        self.recorded = Fixtures(fixtures_dir)
+        self.latency_ms = {"": 20.0, "overpass-api.de": 150.0, "nominatim.openstreetmap.org": 80.0, **(latency_ms or {})}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    def _delay(self, host: str) -> float:
+        for suffix, ms in self.latency_ms.items():
+            if suffix and host.endswith(suffix):
+                return ms / 1000
+        return self.latency_ms[""] / 1000
+
+    def respond(self, method: str, host: str, path_qs: str, body: bytes):
+        """(status, headers, body) for one request."""
+        rec = self.recorded.get(fixture_key(method if method != "HEAD" else "GET", host, path_qs, body))
+        if rec:
+            return rec
+        u = urlparse.urlsplit(path_qs)
+        if host.startswith("nominatim."):
+            q = urlparse.parse_qs(u.query).get("q", [""])[0]
+            return 200, {"Content-Type": "application/json"}, fixtures.dumps(fixtures.nominatim_response(q))
+        if host.startswith("overpass-api."):
+            query = urlparse.parse_qs(body.decode("utf-8", "replace")).get("data", [body.decode("utf-8", "replace")])[0]
+            return 200, {"Content-Type": "application/json"}, fixtures.dumps(fixtures.overpass_response(query))
+        if "openfoodfacts." in host:
+            return 200, {"Content-Type": "application/json"}, fixtures.dumps(fixtures.off_response())
+        if host.endswith(fixtures.SITE_DOMAIN):
+            status, ctype, payload = fixtures.site_response(host, u.path)
+            return status, {"Content-Type": ctype}, payload
+        return 404, {"Content-Type": "text/plain"}, b"no fixture"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def _serve(self, send_body: bool):
+                host = (self.headers.get("Host") or "").split(":")[0]
+                n = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(n) if n else b""
+                with server._lock:
+                    server.requests += 1
+                time.sleep(server._delay(host))
+                status, headers, payload = server.respond(self.command, host, self.path, body)
+                self.send_response(status)
+                for k, v in headers.items():
+                    if k.lower() not in ("content-length", "transfer-encoding", "content-encoding", "connection"):
+                        self.send_header(k, v)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(payload)
+
+            def do_GET(self):
+                self._serve(True)
+
+            def do_POST(self):
+                self._serve(True)
+
+            def do_HEAD(self):
+                self._serve(False)
+
+        return Handler
+
+    def start(self) -> "ReplayServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="replay", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class ReplayAdapter(HTTPAdapter):
+    """Sends every request to the replay server, keeping the original host in the Host header."""
+
+    def __init__(self, base: str, **kw):
+        self.base = base
+        super().__init__(**kw)
+
+    def send(self, request, **kw):
+        u = urlparse.urlsplit(request.url)
+        request.headers["Host"] = u.hostname or ""
+        request.url = self.base + (u.path or "/") + (f"?{u.query}" if u.query else "")
+        return super().send(request, **kw)
+
+def install(server: ReplayServer) -> None:
+    """Route http_client's outbound requests to `server`."""
+    import http_client
+    adapter = ReplayAdapter(server.base, pool_connections=4, pool_maxsize=64, max_retries=0)
+    http_client.session.mount("http://", adapter)
+    http_client.session.mount("https://", adapter)
+
+def record(dest: str, urls, post: Optional[str] = None) -> None:
+    import requests
+    fx = Fixtures(dest)
+    for url in urls:
+        body = open(post, "rb").read() if post else b""
+        r = requests.request("POST" if post else "GET", url, data=body or None, timeout=60,
+                             headers={"User-Agent": "FineDiningCoach-bench/1.0"})
+        u = urlparse.urlsplit(url)
+        key = fixture_key("POST" if post else "GET", u.hostname or "", (u.path or "/") + (f"?{u.query}" if u.query else ""), body)
+        fx.add(key, r.status_code, {"Content-Type": r.headers.get("Content-Type", "")}, r.content)
+        print(f"{r.status_code} {len(r.content):>9} {key}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) >= 3 and args[0] == "record" and args[2] == "--post" and len(args) == 5:
+        record(args[1], [args[3]], post=args[4])
+    elif len(args) >= 3 and args[0] == "record":
+        record(args[1], args[2:])
+    else:
+        sys.exit("usage: python bench/replay.py record <dir> <url>... | record <dir> --post <url> <body file>")
@@ -0,0 +1,291 @@
+"""
+Offline benchmark suite: micro-benchmarks of the hot paths and end-to-end
+load scenarios against the Flask app, with every outside service replaced
+by bench/replay.py.
+
+    python bench/run.py                          # everything
+    python bench/run.py --only micro             # or: e2e, or a scenario name
+    python bench/run.py --save bench/baseline.json
+    python bench/run.py --compare bench/baseline.json [--tolerance 0.25]
+
+Reports p50/p95/p99 latency, throughput and peak RSS per benchmark. With
+--compare, a benchmark whose p50 or p95 grew (or throughput fell) by more
+than the tolerance is flagged and the exit status is 1. Baselines are only
+comparable on the same machine.
+"""
+
+import os, sys, json, time, shutil, random, platform, tempfile, threading, argparse
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+
+# ----------------- Measurement -----------------
+
+def percentile(sorted_vals, p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+class RssSampler:
+    """Peak resident set size while the block runs (sampled every 20 ms)."""
+
+    def __enter__(self):
+        self.peak = _rss_bytes()
+        self._stop = threading.Event()
+        def loop():
+            while not self._stop.wait(0.02):
+                self.peak = max(self.peak, _rss_bytes())
+        self._t = threading.Thread(target=loop, daemon=True)
+        self._t.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._t.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+def summarize(latencies, wall: float, rss: int, errors: int = 0) -> dict:
+    s = sorted(latencies)
+    return {"n": len(s), "errors": errors, "p50_ms": round(percentile(s, 50) * 1000, 3),
+            "p95_ms": round(percentile(s, 95) * 1000, 3), "p99_ms": round(percentile(s, 99) * 1000, 3),
+            "per_sec": round(len(s) / wall, 2) if wall else 0.0, "peak_rss_mb": round(rss / 2**20, 1)}
+
+def time_calls(fn, n: int, warmup: int = 3) -> dict:
+    for _ in range(warmup):
+        fn()
+    lat = []
+    with RssSampler() as rss:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            t = time.perf_counter()
+            fn()
+            lat.append(time.perf_counter() - t)
+        wall = time.perf_counter() - t0
+    return summarize(lat, wall, rss.peak)
+
+# ----------------- Micro-benchmarks -----------------
+
+def micro_benchmarks(scale: float):
+    from bench import fixtures
+    from bench.bench_html_menu import generated_page
+    from nutrition_rules import rank_items, rank_top_k, estimate
+    from parsers.html_menu import extract_items
+    from parsers.pdf_menu import extract_from_pdf_bytes
+    from zip_centroids import zip_centroids
+    from nutrient_store import NutrientStore
+
+    items = fixtures.menu_items(200, seed=1)
+    texts = [(f"{it['item_name']} {it['description']}", it["section"]) for it in items]
+    page = generated_page("cards", 200, seed=2)
+    page_list = generated_page("list", 200, seed=3)
+    pdf = fixtures.make_menu_pdf(4, seed=4)
+    zips = [f"{z:05d}" for z in random.Random(5).sample(range(1000, 99950), 1000)]
+    n = lambda k: max(3, int(k * scale))
+    nutrients = NutrientStore(path="")
+
+    def est():
+        for text, sec in texts:
+            estimate(text, sec)
+
+    def match_cold():
+        if not nutrients.stats["products"]:  # built on first use: micro_benchmarks(0) only lists names
+            nutrients.add(fixtures.nutrient_rows(50000, seed=6))
+        nutrients._memo.clear()
+        for it in items:
+            nutrients.match(it["item_name"])
+
+    return [
+        ("estimate x200", est, n(200)),
+        ("rank_items 200", lambda: rank_items(items, 600, True, []), n(100)),
+        ("rank_top_k 200", lambda: rank_top_k(items, 3, 600, True, []), n(300)),
+        ("extract_items cards 200", lambda: extract_items(page), n(100)),
+        ("extract_items list 200", lambda: extract_items(page_list), n(100)),
+        ("extract_from_pdf_bytes 4p", lambda: extract_from_pdf_bytes(pdf), n(20)),
+        ("zip lookup x1000", lambda: [zip_centroids.lookup(z) for z in zips], n(200)),
+        ("nutrient match x200 (50k products)", match_cold, n(50)),
+    ]
+
+def run_micro(scale: float, only=None) -> dict:
+    out = {}
+    for name, fn, count in micro_benchmarks(scale):
+        if only and only not in ("micro", name):
+            continue
+        out[name] = time_calls(fn, count)
+        _print_row(name, out[name])
+    return out
+
+# ----------------- End-to-end scenarios -----------------
+
+# ZIPs spread over several metros so cold searches hit different tiles
+ZIPS = ["94103", "94110", "10001", "10011", "60601", "60614", "78704", "78701", "98101", "98109",
+        "02108", "02139", "30303", "33101", "80202", "85004", "19103", "97205", "55401", "48226"]
+
+STREAM_ZIPS = ["20001", "63101", "70112", "84101", "37203", "46204", "64105", "73102", "87102", "92101"]
+
+def _load(client_fn, jobs, concurrency: int) -> dict:
+    lat, errors = [], [0]
+    lock = threading.Lock()
+    def one(job):
+        t = time.perf_counter()
+        res = client_fn(job)
+        # client_fn may time a part of the request itself and return (ok, seconds)
+        ok, dt = res if isinstance(res, tuple) else (res, time.perf_counter() - t)
+        with lock:
+            lat.append(dt)
+            if not ok: errors[0] += 1
+    with RssSampler() as rss:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, jobs))
+        wall = time.perf_counter() - t0
+    return summarize(lat, wall, rss.peak, errors[0])
+
+def run_e2e(scale: float, concurrency: int, latency_ms: float, fixtures_dir=None, only=None) -> dict:
+    # fresh caches: nothing from earlier runs or the developer's own cache DB
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    os.environ["CACHE_DB_PATH"] = os.path.join(tmp, "cache.sqlite3")
+    os.environ.setdefault("WARM_INTERVAL_SEC", "0")
+    import requests
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from bench import fixtures
+    from bench.replay import ReplayServer, install
+
+    replay = ReplayServer(fixtures_dir, latency_ms={"": latency_ms}).start()
+    install(replay)
+    import app as app_module
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *a): pass
+    srv = make_server("127.0.0.1", 0, app_module.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_port}"
+    client = requests.Session()
+    client.trust_env = False
+    client.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=max(8, concurrency)))
+
+    def post_json(path, body):
+        r = client.post(base + path, json=body, timeout=120)
+        return r.status_code == 200
+
+    def first_result(body):
+        """(ok, seconds to the first streamed result); the rest of the stream is still read."""
+        t = time.perf_counter()
+        with client.post(base + "/nearby-by-zip?stream=1", json=body, timeout=120, stream=True) as r:
+            lines = r.iter_lines()
+            first = next(lines, b"")
+            dt = time.perf_counter() - t
+            events = [json.loads(first)] + [json.loads(ln) for ln in lines if ln] if first else []
+        return r.status_code == 200 and bool(events) and events[-1]["event"] == "done", dt
+
+    def upload(pdf):
+        r = client.post(base + "/analyze-pdf", files={"menu_pdf": ("menu.pdf", pdf, "application/pdf")},
+                        data={"calorie_target": "600"}, timeout=120)
+        return r.status_code == 200
+
+    n = lambda k: max(2, int(k * scale))
+    html_sites = [h for h in (f"r{i:x}0.{fixtures.SITE_DOMAIN}" for i in range(200))
+                  if (fixtures.site_menu_path(h) or "").startswith("/menu") and not fixtures.site_menu_path(h).endswith(".pdf")][:20]
+    pdfs = [fixtures.make_menu_pdf(p, seed=p) for p in (2, 6, 12)]
+    warm_zip = ZIPS[0]
+    scenarios = [
+        ("nearby-test-stub", lambda i: client.get(base + f"/nearby-by-zip-test?zip={ZIPS[i % len(ZIPS)]}", timeout=30).ok,
+         range(n(200))),
+        ("nearby-cold", lambda z: post_json("/nearby-by-zip", {"zip": z, "radius_miles": 2}), ZIPS[:n(len(ZIPS))]),
+        # same ZIP, a new calorie target each time: all fetch/parse layers warm, only ranking left
+        ("nearby-warm", lambda i: post_json("/nearby-by-zip", {"zip": warm_zip, "radius_miles": 2, "calorie_target": 400 + i}),
+         range(n(100))),
+        ("analyze-url-html", lambda i: post_json("/analyze-url", {"url": f"http://{html_sites[i % len(html_sites)]}{fixtures.site_menu_path(html_sites[i % len(html_sites)])}"}),
+         range(n(100))),
+        ("analyze-pdf-upload", lambda i: upload(pdfs[i % len(pdfs)]), range(n(30))),
+        # time to the first streamed event (restaurants with playbook picks) for ZIPs not searched before
+        ("nearby-stream-first", lambda z: first_result({"zip": z, "radius_miles": 2}), STREAM_ZIPS[:n(len(STREAM_ZIPS))]),
+    ]
+    out = {}
+    try:
+        post_json("/nearby-by-zip", {"zip": warm_zip, "radius_miles": 2})  # prime the warm scenario
+        for name, fn, jobs in scenarios:
+            if only and only not in ("e2e", name):
+                continue
+            out[name] = _load(fn, list(jobs), concurrency)
+            _print_row(name, out[name])
+        out["_replay_requests"] = replay.requests
+    finally:
+        srv.shutdown()
+        replay.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return out
+
+# ----------------- Reporting -----------------
+
+COLS = f"{'benchmark':30} {'n':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per s':>9} {'rss MB':>7}"
+
+def _print_row(name, r):
+    print(f"{name[:30]:30} {r['n']:6} {r['errors']:4} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f} "
+          f"{r['per_sec']:9.1f} {r['peak_rss_mb']:7.1f}", flush=True)
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions as (section, benchmark, metric, baseline, now)."""
+    bad = []
+    for section in ("micro", "e2e"):
+        for name, now in results.get(section, {}).items():
+            base = baseline.get(section, {}).get(name)
+            if not isinstance(now, dict) or not base:
+                continue
+            for metric in ("p50_ms", "p95_ms"):
+                if base[metric] > 0 and now[metric] > base[metric] * (1 + tolerance):
+                    bad.append((section, name, metric, base[metric], now[metric]))
+            if base["per_sec"] > 0 and now["per_sec"] < base["per_sec"] / (1 + tolerance):
+                bad.append((section, name, "per_sec", base["per_sec"], now["per_sec"]))
+            if now["errors"] > base.get("errors", 0):
+                bad.append((section, name, "errors", base.get("errors", 0), now["errors"]))
+    return bad
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python bench/run.py")
+    ap.add_argument("--only", help="micro, e2e, or one benchmark / scenario name")
+    ap.add_argument("--scale", type=float, default=1.0, help="multiply iteration / request counts")
+    ap.add_argument("--concurrency", type=int, default=8, help="concurrent clients in e2e scenarios")
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="replayed response latency for restaurant sites")
+    ap.add_argument("--fixtures", help="directory of recorded responses (bench/replay.py record)")
+    ap.add_argument("--save", help="write results as a baseline JSON file")
+    ap.add_argument("--compare", help="baseline JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging (default 0.25 = 25%%)")
+    args = ap.parse_args(argv)
+
+    results = {"meta": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+                        "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "scale": args.scale,
+                        "concurrency": args.concurrency, "latency_ms": args.latency_ms}}
+    print(COLS)
+    micro_names = {"micro"} | {name for name, _, _ in micro_benchmarks(0)}
+    if not args.only or args.only in micro_names:
+        results["micro"] = run_micro(args.scale, args.only)
+    if not args.only or args.only not in micro_names:
+        results["e2e"] = run_e2e(args.scale, args.concurrency, args.latency_ms, args.fixtures, args.only)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1)
+        print(f"baseline saved to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        bad = compare(results, baseline, args.tolerance)
+        for section, name, metric, was, now in bad:
+            print(f"REGRESSION {section}/{name} {metric}: {was} -> {now}")
+        print(f"{len(bad)} regressions vs {args.compare} (tolerance {args.tolerance:.0%})")
+        return 1 if bad else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Thread-safe LRU + TTL cache with item and byte budgets.
+
+Entries live in an OrderedDict in recency order, so get/set/evict are O(1).
+Each entry has its own TTL; with `stale_sec` an expired entry can still be
+served for that long by get_or_load() while one background refresh runs.
+
+A TTLCache can sit in front of a CacheBackend (e.g. SQLiteBackend) so that
+entries are shared by every worker process on the host and survive restarts.
+"""
+
+import os, json, time, sqlite3, tempfile, threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import count_error
+
+def _sizeof(val: Any) -> int:
+    if isinstance(val, (bytes, bytearray, str)):
+        return len(val)
+    try:
+        return len(json.dumps(val, separators=(",", ":"), default=str))
+    except Exception:
+        return 256
+
+class CacheBackend:
+    """Shared key/value store; values must be JSON-serializable."""
+
+    def get(self, ns: str, key: str) -> Optional[Any]:
+        return None
+
+    def get_with_expiry(self, ns: str, key: str):
+        """(value, expires_at) or None."""
+        return None
+
+    def set(self, ns: str, key: str, val: Any, ttl: float) -> None:
+        pass
+
+    def delete(self, ns: str, key: str) -> None:
+        pass
+
+    def items(self, ns: str, limit: Optional[int] = None) -> List[Tuple[str, Any]]:
+        """(key, value) of the live entries in `ns`, latest expiry first."""
+        return []
+
+    def trim(self, ns: str, keep: int) -> None:
+        """Drop all but the `keep` entries of `ns` with the latest expiry."""
+        pass
+
+class NullBackend(CacheBackend):
+    pass
+
+class SQLiteBackend(CacheBackend):
+    """One sqlite file (WAL mode) shared by all worker processes on a host."""
+
+    PURGE_EVERY = 500  # sets between sweeps of expired rows
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._sets = 0
+        with self._conn() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS kv (ns TEXT, key TEXT, value TEXT, expires REAL, PRIMARY KEY (ns, key))")
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        # a connection must not cross fork() (e.g. gunicorn preload); the child opens its own
+        if db is None or self._local.pid != os.getpid():
+            db = self._local.db = sqlite3.connect(self.path, timeout=5)
+            self._local.pid = os.getpid()
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def get_with_expiry(self, ns, key):
+        try:
+            row = self._conn().execute("SELECT value, expires FROM kv WHERE ns=? AND key=?", (ns, key)).fetchone()
+        except sqlite3.Error:
+            return None
+        if not row or row[1] <= time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def get(self, ns, key):
+        hit = self.get_with_expiry(ns, key)
+        return hit[0] if hit else None
+
+    def set(self, ns, key, val, ttl):
+        try:
+            with self._conn() as db:
+                db.execute("INSERT OR REPLACE INTO kv VALUES (?,?,?,?)", (ns, key, json.dumps(val), time.time() + ttl))
+                self._sets += 1
+                if self._sets % self.PURGE_EVERY == 0:
+                    db.execute("DELETE FROM kv WHERE expires <= ?", (time.time(),))
+        except (sqlite3.Error, TypeError, ValueError):
+            pass
+
+    def delete(self, ns, key):
+        try:
+            with self._conn() as db:
+                db.execute("DELETE FROM kv WHERE ns=? AND key=?", (ns, key))
+        except sqlite3.Error:
+            pass
+
+    def items(self, ns, limit=None):
+        try:
+            rows = self._conn().execute("SELECT key, value FROM kv WHERE ns=? AND expires>? ORDER BY expires DESC LIMIT ?",
+                                        (ns, time.time(), -1 if limit is None else limit)).fetchall()
+        except sqlite3.Error:
+            return []
+        return [(k, json.loads(v)) for k, v in rows]
+
+    def trim(self, ns, keep):
+        try:
+            with self._conn() as db:
+                db.execute("DELETE FROM kv WHERE ns=? AND key NOT IN "
+                           "(SELECT key FROM kv WHERE ns=? ORDER BY expires DESC LIMIT ?)", (ns, ns, keep))
+        except sqlite3.Error:
+            pass
+
+CACHE_DB_PATH = os.environ.get("CACHE_DB_PATH", os.path.join(tempfile.gettempdir(), "finedining_cache.sqlite3"))
+
+def open_backend(path: str = CACHE_DB_PATH) -> CacheBackend:
+    """SQLiteBackend at `path`, or NullBackend when path is empty or unusable."""
+    if not path:
+        return NullBackend()
+    try:
+        return SQLiteBackend(path)
+    except sqlite3.Error:
+        return NullBackend()
+
+class TTLCache:
+    def __init__(self, ttl_sec=3600, max_items=128, max_bytes: Optional[int] = None, stale_sec=0,
+                 backend: Optional[CacheBackend] = None, namespace: str = ""):
+        self.ttl = ttl_sec
+        self.max = max_items
+        self.max_bytes = max_bytes
+        self.stale = stale_sec
+        self.backend = backend or NullBackend()
+        self.ns = namespace
+        self._store = OrderedDict()  # key -> (value, fresh_until, stale_until, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.metrics = {"hits": 0, "misses": 0, "stale_hits": 0, "evictions": 0, "expirations": 0, "refreshes": 0,
+                        "backend_hits": 0}
+
+    def _drop(self, key):
+        ent = self._store.pop(key, None)
+        if ent: self._bytes -= ent[3]
+
+    def _lookup(self, key, now):
+        """(value, is_fresh) or None; caller holds the lock."""
+        ent = self._store.get(key)
+        if ent is None:
+            return None
+        if now > ent[2]:
+            self._drop(key)
+            self.metrics["expirations"] += 1
+            return None
+        self._store.move_to_end(key)
+        return ent[0], now <= ent[1]
+
+    def get(self, key):
+        with self._lock:
+            hit = self._lookup(key, time.time())
+        if hit is None:
+            hit = self._from_backend(key)
+        with self._lock:
+            if hit and hit[1]:
+                self.metrics["hits"] += 1
+                return hit[0]
+            self.metrics["misses"] += 1
+            return None
+
+    def _from_backend(self, key):
+        """(value, is_fresh) from the shared backend, copied into memory; or None."""
+        hit = self.backend.get_with_expiry(self.ns, str(key))
+        if not hit:
+            return None
+        val, stale_until = hit
+        fresh_ttl = stale_until - self.stale - time.time()
+        self._store_local(key, val, fresh_ttl)
+        with self._lock:
+            self.metrics["backend_hits"] += 1
+        return val, fresh_ttl > 0
+
+    def set(self, key, val, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self._store_local(key, val, ttl)
+        self.backend.set(self.ns, str(key), val, ttl + self.stale)
+
+    def _store_local(self, key, val, ttl: float):
+        size = _sizeof(val) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        now = time.time()
+        fresh_until = now + ttl
+        with self._lock:
+            self._drop(key)
+            self._store[key] = (val, fresh_until, fresh_until + self.stale, size)
+            self._bytes += size
+            while self._store and (len(self._store) > self.max or (self.max_bytes and self._bytes > self.max_bytes)):
+                oldest = next(iter(self._store))
+                self._drop(oldest)
+                self.metrics["evictions"] += 1
+
+    def pop(self, key):
+        with self._lock:
+            self._drop(key)
+        self.backend.delete(self.ns, str(key))
+
+    def get_or_load(self, key, loader: Callable[[], Any], ttl=None):
+        """Cached value, else loader() (cached unless None).
+
+        A stale-but-servable value is returned immediately and refreshed by a
+        single background call to loader(). `ttl` may be a function of the
+        loaded value, e.g. to keep negative results for less time.
+        """
+        with self._lock:
+            hit = self._lookup(key, time.time())
+        if hit is None:
+            hit = self._from_backend(key)
+        with self._lock:
+            if hit and hit[1]:
+                self.metrics["hits"] += 1
+                return hit[0]
+            if hit:
+                self.metrics["stale_hits"] += 1
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+                    threading.Thread(target=self._refresh, args=(key, loader, ttl), daemon=True).start()
+                return hit[0]
+            self.metrics["misses"] += 1
+        val = loader()
+        if val is not None:
+            self.set(key, val, ttl(val) if callable(ttl) else ttl)
+        return val
+
+    def _refresh(self, key, loader, ttl):
+        try:
+            val = loader()
+            if val is not None:
+                self.set(key, val, ttl(val) if callable(ttl) else ttl)
+        except Exception as e:
+            count_error("cache_refresh", e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+                self.metrics["refreshes"] += 1
+
+    def __len__(self):
+        return len(self._store)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.metrics, "items": len(self._store), "bytes": self._bytes}
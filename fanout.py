@@ -0,0 +1,109 @@
+"""
+Bounded-concurrency fan-out for per-restaurant work (resolve, fetch, parse).
+
+One shared thread pool serves every request so a burst of searches cannot
+spawn unbounded threads. Each job may name a host; at most `per_host` jobs
+for the same host run at once. A job only reaches the pool once its host has
+a free slot, so a slow host cannot tie up pool threads that merely wait for
+it. Callers get results aligned with their jobs, with None for anything that
+failed or did not finish before the deadline, or (iter_fan_out) each result
+as soon as it is ready.
+"""
+
+import os, time, weakref, threading, contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from metrics import count_error
+
+FANOUT_WORKERS = int(os.environ.get("FANOUT_WORKERS", "16"))
+FANOUT_PER_HOST = int(os.environ.get("FANOUT_PER_HOST", "2"))
+HOST_POLL_SEC = 0.05  # how often jobs waiting on another request's host slots look again
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+_host_lock = threading.Lock()
+_host_sems = weakref.WeakValueDictionary()  # a host's semaphore lives as long as some job holds it
+
+def _host_sem(host: str, limit: int) -> threading.BoundedSemaphore:
+    with _host_lock:
+        sem = _host_sems.get(host)
+        if sem is None:
+            sem = _host_sems[host] = threading.BoundedSemaphore(limit)
+        return sem
+
+def iter_fan_out(fn: Callable[[Any], Any], jobs: List[Any], host: Callable[[Any], Optional[str]] = None,
+                 deadline_sec: float = 25.0, per_host: int = FANOUT_PER_HOST) -> Iterator[Tuple[int, Any]]:
+    """Run fn(job) for every job in parallel and yield (job index, result) as each finishes.
+
+    Results are None on error. Jobs start in order as their host's slots
+    allow. Stops at the deadline (or when the caller closes the generator):
+    jobs not yet started are dropped, jobs already running are left to finish
+    in the background (their side effects, e.g. cache fills, still help the
+    next request) and are not yielded.
+    """
+    deadline = time.monotonic() + deadline_sec
+    hosts = [host(job) if host else None for job in jobs]
+    waiting = deque(range(len(jobs)))
+    futs, pending = {}, set()
+
+    def start_ready():
+        blocked, still = set(), deque()
+        while waiting:
+            i = waiting.popleft()
+            h, sem = hosts[i], None
+            if h:
+                sem = None if h in blocked else _host_sem(h, per_host)
+                if sem is None or not sem.acquire(blocking=False):
+                    blocked.add(h)
+                    still.append(i)
+                    continue
+            # copy the caller's context so the job's metrics spans count towards its request
+            f = _executor.submit(contextvars.copy_context().run, fn, jobs[i])
+            if sem is not None:
+                f.add_done_callback(lambda _, sem=sem: sem.release())  # also runs when cancelled
+            futs[f] = i
+            pending.add(f)
+        waiting.extend(still)
+
+    try:
+        start_ready()
+        while pending or waiting:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not pending:
+                time.sleep(min(remaining, HOST_POLL_SEC))
+                start_ready()
+                continue
+            done, _ = wait(pending, timeout=min(remaining, HOST_POLL_SEC) if waiting else remaining,
+                           return_when=FIRST_COMPLETED)
+            for f in done:
+                pending.discard(f)
+                try:
+                    res = f.result()
+                except Exception as e:
+                    count_error("fan_out", e)
+                    res = None
+                yield futs[f], res
+            start_ready()
+    finally:
+        for f in pending:
+            f.cancel()
+
+def fan_out(fn: Callable[[Any], Any], jobs: Iterable[Any], host: Callable[[Any], Optional[str]] = None,
+            deadline_sec: float = 25.0, per_host: int = FANOUT_PER_HOST,
+            on_result: Callable[[Any, Any], None] = None) -> List[Any]:
+    """Run fn(job) for every job in parallel and return results in job order.
+
+    on_result(job, result), if given, is called from the caller's thread as
+    each job finishes (result None on error), e.g. to report progress.
+    Anything that failed or missed the deadline is None (see iter_fan_out).
+    """
+    jobs = list(jobs)
+    results = [None] * len(jobs)
+    for i, res in iter_fan_out(fn, jobs, host, deadline_sec, per_host):
+        results[i] = res
+        if on_result:
+            on_result(jobs[i], res)
+    return results
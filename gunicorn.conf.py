@@ -0,0 +1,34 @@
+"""
+gunicorn settings for `gunicorn -c gunicorn.conf.py wsgi:app`.
+
+Requests spend nearly all their time waiting on Overpass, Nominatim and
+restaurant sites; CPU work is bounded (HTML parse budget, PDFs parsed in a
+process pool), so one process with many threads serves this well. Background
+jobs, their SSE streams, the per-host politeness scheduler and the in-memory
+caches are per process, so run one worker unless the load balancer keeps
+sessions sticky. gevent workers are not used: parsing and scoring are
+CPU-bound and would stall every greenlet in the process.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get("WEB_WORKERS", "1"))
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", "32"))  # concurrent requests per worker
+preload_app = True
+max_requests = 0  # restarting a worker would drop its jobs
+
+# The slowest synchronous request is an Overpass query for missing tiles
+# (http_client.TIMEOUTS, 55 s) followed by the menu fan-out deadline; let it
+# finish on shutdown. (This file is read before the app is importable.)
+OVERPASS_TIMEOUT_SEC = 55
+_slowest = OVERPASS_TIMEOUT_SEC + float(os.environ.get("NEARBY_DEADLINE_SEC", "25"))
+graceful_timeout = int(_slowest) + 10
+timeout = graceful_timeout + 30  # silent-worker watchdog; gthread requests do not block the heartbeat
+keepalive = 5
+
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+accesslog = os.environ.get("ACCESS_LOG") or None  # "-" for stdout
+errorlog = "-"
+loglevel = os.environ.get("LOG_LEVEL", "info")
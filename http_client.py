@@ -0,0 +1,239 @@
+"""
+Shared HTTP client for all outbound requests.
+
+One requests.Session with keep-alive connection pools per host, retry with
+backoff on 5xx, compressed transfer (gzip/deflate, plus br when brotli
+is installed), per-destination default timeouts and a response size cap.
+The first body chunk is sniffed ("html", "pdf" or "other"), so callers can
+cap each kind separately and refuse unwanted content before downloading it.
+Every request first takes a per-host slot from scheduler.py (rate limits,
+Crawl-delay, concurrency caps, circuit breakers).
+"""
+
+import os, time, base64, threading, email.utils
+import urllib.parse as urlparse
+from typing import Any, Dict, Iterable, Optional, Union
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+
+import metrics
+from scheduler import scheduler
+
+UA = "FineDiningCoach/1.0 (contact: demo@example.com)"
+
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "64"))  # hosts kept pooled
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "8"))           # connections per host
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "2"))
+HTTP_MAX_BYTES = int(os.environ.get("HTTP_MAX_BYTES", str(8*1024*1024)))
+HTTP_DEFAULT_TIMEOUT = 15
+
+# Default timeouts by destination host; an explicit timeout= always wins.
+TIMEOUTS = {
+    "overpass-api.de": 55,
+    "nominatim.openstreetmap.org": 15,
+    "world.openfoodfacts.org": 20,
+}
+
+class ResponseTooLarge(Exception):
+    pass
+
+class UnsupportedContent(Exception):
+    """The body's sniffed kind is not one the caller accepts."""
+
+def _make_session() -> requests.Session:
+    # Retry-After is not slept on here: that would hold the host's scheduler slot and a fan-out
+    # worker for as long as the server asks. The scheduler pauses the host instead (capped at
+    # RETRY_AFTER_MAX_SEC), and 429 is not retried in-request for the same reason.
+    retry = Retry(total=HTTP_RETRIES, connect=HTTP_RETRIES, read=0, backoff_factor=0.5,
+                  status_forcelist=(500, 502, 503, 504),
+                  allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+                  respect_retry_after_header=False, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+    s = requests.Session()
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    s.headers.update({"User-Agent": UA, **make_headers(accept_encoding=True)})
+    return s
+
+session = _make_session()
+_lock = threading.Lock()
+_counts = {"requests": 0, "errors": 0, "too_large": 0, "unsupported": 0, "bytes_read": 0}
+
+_BINARY_MAGIC = (b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"PK\x03\x04", b"\x1f\x8b", b"RIFF")
+_HTML_START = (b"<!doctype html", b"<html", b"<head", b"<body", b"<meta", b"<title", b"<div", b"<!--")
+
+def sniff(first: bytes, content_type: str = "") -> str:
+    """"pdf", "html" or "other" from the first bytes of a body, header as tie-breaker."""
+    raw = first[:1024].lstrip(b"\xef\xbb\xbf \t\r\n")
+    if raw.startswith(b"%PDF-"):
+        return "pdf"
+    if raw.startswith(_BINARY_MAGIC):
+        return "other"
+    head = raw.lower()
+    if head.startswith(_HTML_START) or b"<html" in head:
+        return "html"
+    ct = (content_type or "").lower()
+    if "text/html" in ct or "application/xhtml" in ct:
+        return "html"
+    if "application/pdf" in ct and not head:
+        return "pdf"  # bodiless (HEAD) response
+    return "other"
+
+def _read_capped(r: requests.Response, max_bytes: Union[int, Dict[str, int]],
+                 accept: Optional[Iterable[str]] = None) -> None:
+    ctype = r.headers.get("Content-Type", "")
+    cl = r.headers.get("Content-Length")
+    cap = max_bytes if isinstance(max_bytes, int) else None
+    buf = bytearray()
+    r.kind = None
+    try:
+        if cap is not None and cl and cl.isdigit() and int(cl) > cap:
+            raise ResponseTooLarge(f"{r.url}: {cl} bytes exceeds cap of {cap}")
+        for chunk in r.iter_content(64*1024):
+            if r.kind is None:
+                r.kind = sniff(chunk, ctype)
+                # error pages are returned whatever they are; only 2xx bodies must be wanted
+                if accept is not None and r.kind not in accept and 200 <= r.status_code < 300:
+                    raise UnsupportedContent(f"{r.url}: {r.kind} content ({ctype or 'no content-type'})")
+                if cap is None:
+                    cap = max_bytes.get(r.kind, HTTP_MAX_BYTES)
+                    if cl and cl.isdigit() and int(cl) > cap:
+                        raise ResponseTooLarge(f"{r.url}: {cl} bytes exceeds {r.kind} cap of {cap}")
+            buf += chunk
+            if len(buf) > cap:
+                raise ResponseTooLarge(f"{r.url}: body exceeds cap of {cap} bytes")
+    except (ResponseTooLarge, UnsupportedContent) as e:
+        e.response = r  # status and headers are still there; the body is not
+        r.close()
+        raise
+    finally:
+        with _lock:
+            _counts["bytes_read"] += len(buf)
+        metrics.outbound_bytes.inc(r.kind or "other", n=len(buf))
+    if r.kind is None:
+        r.kind = sniff(b"", ctype)
+    r._content = bytes(buf)
+    r._content_consumed = True
+
+def _retry_after(r: requests.Response):
+    """Seconds asked for by a 429/503 Retry-After header, or None."""
+    if r.status_code not in (429, 503): return None
+    v = (r.headers.get("Retry-After") or "").strip()
+    if v.isdigit(): return float(v)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(v).timestamp() - time.time())
+    except Exception:
+        return 30.0 if r.status_code == 429 else None
+
+def request(method: str, url: str, timeout=None, max_bytes: Union[int, Dict[str, int]] = HTTP_MAX_BYTES,
+            accept: Optional[Iterable[str]] = None, **kw) -> requests.Response:
+    """session.request with pooled connections, default timeouts and a body cap.
+
+    The body is read eagerly (up to max_bytes) so callers can use .text,
+    .content and .json() as usual; ResponseTooLarge is raised past the cap
+    (its `response` still has the status and headers).
+    `max_bytes` may map sniffed kinds to caps ({"html": ..., "pdf": ...}).
+    With `accept`, a 2xx body of any other kind raises UnsupportedContent
+    after the first chunk. `r.kind` holds the sniffed kind.
+    Raises scheduler.HostUnavailable / SlotTimeout when the host is not
+    taking requests from us right now.
+    """
+    host = urlparse.urlsplit(url).hostname or ""
+    if timeout is None:
+        timeout = TIMEOUTS.get(host, HTTP_DEFAULT_TIMEOUT)
+    with _lock:
+        _counts["requests"] += 1
+    dest = host if host in TIMEOUTS else "sites"  # restaurant sites share one label
+    t0 = time.perf_counter()
+    try:
+        with scheduler.slot(host) as outcome:
+            try:
+                r = session.request(method, url, timeout=timeout, stream=True, **kw)
+                outcome["retry_after"] = _retry_after(r)
+                _read_capped(r, max_bytes, accept)
+            except (requests.Timeout, requests.ConnectionError):
+                outcome["failed"] = True
+                raise
+        metrics.outbound_requests.inc(dest, r.status_code)
+        metrics.outbound_seconds.observe(time.perf_counter() - t0, dest)
+        return r
+    except Exception as e:
+        metrics.outbound_requests.inc(dest, type(e).__name__)
+        key = "too_large" if isinstance(e, ResponseTooLarge) else "unsupported" if isinstance(e, UnsupportedContent) else "errors"
+        with _lock:
+            _counts[key] += 1
+        raise
+
+def get(url: str, **kw) -> requests.Response:
+    return request("GET", url, **kw)
+
+def head(url: str, **kw) -> requests.Response:
+    kw.setdefault("allow_redirects", True)
+    return request("HEAD", url, **kw)
+
+def post(url: str, **kw) -> requests.Response:
+    return request("POST", url, **kw)
+
+def _from_store(url: str, stored: dict, r: requests.Response = None) -> requests.Response:
+    if r is None:
+        r = requests.Response()
+        r.url = url
+    r.status_code = 200
+    r.reason = "OK (stored)"
+    r._content = base64.b64decode(stored["body"])
+    r._content_consumed = True
+    r.headers["Content-Type"] = stored.get("content_type", "")
+    r.encoding = stored.get("encoding")
+    r.kind = sniff(r._content[:1024], r.headers["Content-Type"])
+    r.from_store = True
+    return r
+
+def get_revalidated(url: str, backend, ns: str = "menu_body", ttl: float = 7*24*3600, fresh_sec: float = 0,
+                    **kw) -> requests.Response:
+    """GET that keeps a copy of the body in `backend` and revalidates it.
+
+    A copy fetched or revalidated less than `fresh_sec` ago is returned
+    without a request. Otherwise, when the copy has an ETag/Last-Modified we
+    send a conditional GET; on 304 the stored body is returned as a 200
+    response. `r.from_store` tells callers whether the body came from the store.
+    """
+    stored = backend.get(ns, url)
+    accept = kw.get("accept")
+    if stored and time.time() - stored.get("fetched_at", 0) < fresh_sec:
+        r = _from_store(url, stored)
+        if accept is None or r.kind in accept:
+            return r
+    headers = dict(kw.pop("headers", None) or {})
+    if stored:
+        if stored.get("etag"): headers["If-None-Match"] = stored["etag"]
+        if stored.get("last_modified"): headers["If-Modified-Since"] = stored["last_modified"]
+    r = get(url, headers=headers, **kw)
+    r.from_store = False
+    if r.status_code == 304 and stored:
+        _from_store(url, stored, r)
+        if accept is not None and r.kind not in accept:
+            raise UnsupportedContent(f"{url}: {r.kind} content (stored copy)")
+        backend.set(ns, url, {**stored, "fetched_at": time.time()}, ttl)
+    elif r.status_code == 200 and (fresh_sec or r.headers.get("ETag") or r.headers.get("Last-Modified")):
+        backend.set(ns, url, {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified"),
+                              "content_type": r.headers.get("Content-Type", ""), "encoding": r.encoding,
+                              "body": base64.b64encode(r.content).decode("ascii"), "fetched_at": time.time()}, ttl)
+    return r
+
+def stats() -> Dict[str, Any]:
+    """Request counters plus per-host connection reuse from the urllib3 pools."""
+    hosts = {}
+    pools = session.get_adapter("https://").poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None: continue
+        h = hosts.setdefault(pool.host, {"requests": 0, "connections": 0})
+        h["requests"] += pool.num_requests
+        h["connections"] += pool.num_connections
+    total_req = sum(h["requests"] for h in hosts.values())
+    total_conn = sum(h["connections"] for h in hosts.values())
+    with _lock:
+        counts = dict(_counts)
+    return {**counts, "scheduler": scheduler.snapshot(), "pooled_hosts": len(hosts), "connections_opened": total_conn,
+            "connections_reused": max(0, total_req - total_conn), "hosts": hosts}
@@ -1,12 +1,13 @@
-import requests
 from typing import List, Dict, Any
 
+import http_client
+
 UA = "FineDiningCoach/1.0 (contact: demo@example.com)"
 
-def search_off(query: str, page_size:int=10) -> Dict[str,Any]:
+def search_off(query: str, page_size:int=10, timeout=None) -> Dict[str,Any]:
     url = "https://world.openfoodfacts.org/cgi/search.pl"
     params = {"search_terms": query, "search_simple": 1, "json": 1, "page_size": page_size}
-    r = requests.get(url, params=params, headers={"User-Agent": UA}, timeout=20)
+    r = http_client.get(url, params=params, headers={"User-Agent": UA}, timeout=timeout)
     r.raise_for_status()
     data = r.json()
     items = []
@@ -18,6 +19,7 @@ def search_off(query: str, page_size:int=10) -> Dict[str,Any]:
         per_serv = {"energy_kcal_serving": nutr.get("energy-kcal_serving"),
                     "proteins_serving": nutr.get("proteins_serving")}
         items.append({
+            "code": p.get("code"),
             "name": name, "brand": brand,
             "energy_kcal_100g": per100["energy_kcal_100g"],
             "protein_100g": nutr.get("proteins_100g"),
@@ -1,55 +1,64 @@
-import requests, math, time
 from typing import List, Dict, Any
 
+import http_client
+
 UA = "FineDiningCoach/1.0 (contact: demo@example.com)"
 
 def geocode_zip(zipcode: str) -> Dict[str,float]:
+    # Nominatim's 1 req/s policy is enforced by scheduler.HOST_POLICIES
     url = "https://nominatim.openstreetmap.org/search"
     params = {"q": zipcode, "countrycodes":"us", "format":"jsonv2", "limit":1}
-    r = requests.get(url, params=params, headers={"User-Agent": UA}, timeout=15)
+    r = http_client.get(url, params=params, headers={"User-Agent": UA})
     r.raise_for_status()
     data = r.json()
     if not data:
         return {}
     return {"lat": float(data[0]["lat"]), "lon": float(data[0]["lon"])}
 
-def haversine(lat1, lon1, lat2, lon2):
-    R=3958.8 # miles
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2-lat1)
-    dl = math.radians(lon2-lon1)
-    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dl/2)**2
-    return 2*R*math.asin(math.sqrt(a))
+def place_from_element(el) -> Dict[str,Any]:
+    """Restaurant record from an Overpass element, or None if unnamed / unplaced."""
+    tags = el.get("tags", {})
+    name = tags.get("name")
+    if not name: return None
+    web = tags.get("website") or tags.get("contact:website")
+    cuisine_raw = tags.get("cuisine","")
+    cuisine = [c.strip() for c in cuisine_raw.split(";") if c.strip()] if cuisine_raw else []
+    lat2 = el.get("lat") or (el.get("center") or {}).get("lat")
+    lon2 = el.get("lon") or (el.get("center") or {}).get("lon")
+    if lat2 is None or lon2 is None: return None
+    return {"id": f"{el.get('type','node')[0]}{el.get('id','')}", "name": name, "website": web, "cuisine": cuisine,
+            "lat": float(lat2), "lon": float(lon2)}
+
+BBOX_LIMIT = 5000                 # elements per bbox query; a dense 0.3 x 0.3 degree downtown has ~3000
+BBOX_MAX_BYTES = 16*1024*1024     # ~300 bytes per element with tags and center
+
+class BboxTruncated(Exception):
+    """The query hit its element limit; `places` is what came back (not all of the box)."""
+
+    def __init__(self, places):
+        super().__init__("bbox query returned its element limit")
+        self.places = places
 
-def overpass_restaurants(lat: float, lon: float, radius_mi: float=3.0, limit:int=25) -> List[Dict[str,Any]]:
-    radius_m = max(100, int(radius_mi * 1609.34))
+def overpass_bbox(south: float, west: float, north: float, east: float, limit: int = BBOX_LIMIT) -> List[Dict[str,Any]]:
+    """Named restaurants in a bounding box (used to fill restaurant_index tiles).
+
+    Raises BboxTruncated when Overpass returned `limit` elements, i.e. the box may hold more.
+    """
+    bbox = f"{south:.5f},{west:.5f},{north:.5f},{east:.5f}"
     q = f"""
-    [out:json][timeout:25];
+    [out:json][timeout:50];
     (
-      node["amenity"="restaurant"](around:{radius_m},{lat},{lon});
-      way["amenity"="restaurant"](around:{radius_m},{lat},{lon});
-      relation["amenity"="restaurant"](around:{radius_m},{lat},{lon});
+      node["amenity"="restaurant"]({bbox});
+      way["amenity"="restaurant"]({bbox});
+      relation["amenity"="restaurant"]({bbox});
     );
-    out center 60;
+    out center {limit};
     """
-    r = requests.post("https://overpass-api.de/api/interpreter", data=q.encode("utf-8"), headers={"User-Agent": UA}, timeout=55)
+    r = http_client.post("https://overpass-api.de/api/interpreter", data=q.encode("utf-8"), headers={"User-Agent": UA},
+                         max_bytes=BBOX_MAX_BYTES)
     r.raise_for_status()
-    data = r.json()
-    ents = []
-    for el in data.get("elements", []):
-        tags = el.get("tags", {})
-        name = tags.get("name")
-        if not name: continue
-        web = tags.get("website") or tags.get("contact:website")
-        cuisine_raw = tags.get("cuisine","")
-        cuisine = [c.strip() for c in cuisine_raw.split(";") if c.strip()] if cuisine_raw else []
-        lat2 = el.get("lat") or (el.get("center") or {}).get("lat")
-        lon2 = el.get("lon") or (el.get("center") or {}).get("lon")
-        if lat2 is None or lon2 is None: continue
-        dist = haversine(lat, lon, float(lat2), float(lon2))
-        ents.append({
-            "name": name, "website": web, "cuisine": cuisine,
-            "lat": float(lat2), "lon": float(lon2), "distance_mi": dist
-        })
-    ents.sort(key=lambda x: x["distance_mi"])
-    return ents[:limit]
+    elements = r.json().get("elements", [])
+    places = [p for p in map(place_from_element, elements) if p]
+    if len(elements) >= limit:
+        raise BboxTruncated(places)
+    return places
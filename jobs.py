@@ -0,0 +1,132 @@
+"""
+Background jobs for slow analyses (ZIP search, menu URL, PDF upload).
+
+Jobs run on a small in-process thread pool: the client gets a job id right
+away and then polls GET /jobs/<id> or follows GET /jobs/<id>/events (SSE).
+An identical job that is already queued or running is shared instead of run
+twice, the number of unfinished jobs is capped (JobsFull, sent as HTTP 429),
+and finished jobs are kept for JOB_RETAIN_SEC so late pollers still get the
+result. Jobs live in the worker process that accepted them.
+"""
+
+import os, time, uuid, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", "32"))  # queued + running
+JOB_RETAIN_SEC = float(os.environ.get("JOB_RETAIN_SEC", "600"))
+JOB_MAX_RETAINED = 1000
+
+class JobsFull(Exception):
+    pass
+
+class Job:
+    def __init__(self, kind: str, key):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = "queued"  # queued | running | done | failed
+        self.events = []        # progress events, in order
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._cond = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def progress(self, **event) -> None:
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def _finish(self, status: str, result=None, error=None) -> None:
+        with self._cond:
+            self.status, self.result, self.error = status, result, error
+            self.finished = time.time()
+            self._cond.notify_all()
+
+    def wait_events(self, since: int, timeout: float) -> List[Dict[str, Any]]:
+        """Events after index `since`; waits up to `timeout` for one, or for the job to finish."""
+        with self._cond:
+            if len(self.events) <= since and not self.done:
+                self._cond.wait(timeout)
+            return self.events[since:]
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {"job_id": self.id, "kind": self.kind, "status": self.status,
+             "progress": self.events[-1] if self.events else None}
+        if self.status == "done": d["result"] = self.result
+        if self.status == "failed": d["error"] = self.error
+        return d
+
+class JobManager:
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING,
+                 retain_sec: float = JOB_RETAIN_SEC, max_retained: int = JOB_MAX_RETAINED):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.max_pending = max_pending
+        self.retain_sec = retain_sec
+        self.max_retained = max_retained
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # id -> Job, oldest first
+        self._inflight = {}         # key -> queued/running Job
+        self.metrics = {"submitted": 0, "deduped": 0, "rejected": 0, "done": 0, "failed": 0}
+
+    def submit(self, kind: str, key, fn: Callable[[Job], Any]) -> Job:
+        """Run fn(job) in the background, or return the identical job already in flight.
+
+        Raises JobsFull when max_pending jobs are queued or running. If fn
+        raises, the job fails with the exception's `payload` dict when it has
+        one, else {"error": "job_failed", "message": ...}.
+        """
+        with self._lock:
+            self._prune()
+            job = self._inflight.get(key)
+            if job is not None:
+                self.metrics["deduped"] += 1
+                return job
+            if len(self._inflight) >= self.max_pending:
+                self.metrics["rejected"] += 1
+                raise JobsFull(f"{len(self._inflight)} jobs pending")
+            job = Job(kind, key)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+            self.metrics["submitted"] += 1
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn) -> None:
+        job.status = "running"
+        try:
+            job._finish("done", result=fn(job))
+        except Exception as e:
+            job._finish("failed", error=getattr(e, "payload", None) or {"error": "job_failed", "message": str(e)})
+        finally:
+            with self._lock:
+                if self._inflight.get(job.key) is job:
+                    del self._inflight[job.key]
+                self.metrics[job.status] += 1
+
+    def _prune(self) -> None:
+        # caller holds the lock
+        now = time.time()
+        excess = len(self._jobs) - self.max_retained
+        for job in [j for j in self._jobs.values() if j.done]:
+            if excess > 0 or now - job.finished > self.retain_sec:
+                del self._jobs[job.id]
+                excess -= 1
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.metrics, "pending": len(self._inflight), "retained": len(self._jobs)}
+
+jobs = JobManager()
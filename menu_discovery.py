@@ -0,0 +1,135 @@
+"""
+Find a restaurant's menu page from its website.
+
+The usual menu paths are probed with HEAD requests while the homepage
+(<a> and rel=alternate/menu <link> hints) and the sitemap are read at the same time. At most
+DISCOVERY_PER_SITE requests run against one site at once. Candidates keep
+their old priority (paths in order, then homepage hints, then sitemap): the
+best hit is returned as soon as every better candidate has failed, and the
+probes not yet started are dropped. The whole search is bounded by
+DISCOVERY_DEADLINE_SEC instead of one timeout per path; a search cut short
+by the deadline or by failed requests reports None rather than "no menu".
+"""
+
+import os, re, time, contextvars
+import urllib.parse as urlparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from typing import Optional
+
+import http_client
+from metrics import count_error
+from parsers.robots import is_allowed as robots_allowed, site_maps
+
+MENU_PATHS = ["/menu","/menus","/food","/dinner","/lunch","/our-menu","/menu.pdf","/menus/dinner","/menus/lunch"]
+
+DISCOVERY_WORKERS = int(os.environ.get("DISCOVERY_WORKERS", "32"))
+DISCOVERY_PER_SITE = int(os.environ.get("DISCOVERY_PER_SITE", "4"))
+DISCOVERY_DEADLINE_SEC = float(os.environ.get("DISCOVERY_DEADLINE_SEC", "20"))
+PROBE_TIMEOUT = 8
+SITEMAP_MAX_BYTES = 2*1024*1024
+PROBE_MAX_BYTES = 64*1024        # a GET probe only needs the status and Content-Type
+
+_executor = ThreadPoolExecutor(max_workers=DISCOVERY_WORKERS, thread_name_prefix="discover")
+
+def _is_menu_type(content_type: str) -> bool:
+    return "text/html" in content_type or "application/pdf" in content_type
+
+def _probe(url: str) -> Optional[str]:
+    """url if it answers 200 with HTML or PDF; HEAD first, GET when HEAD is refused."""
+    if not robots_allowed(url):
+        return None
+    r = http_client.head(url, timeout=PROBE_TIMEOUT)
+    if r.status_code in (403, 405, 501) or (r.status_code == 200 and not r.headers.get("Content-Type")):
+        try:
+            r = http_client.get(url, timeout=PROBE_TIMEOUT, allow_redirects=True, max_bytes=PROBE_MAX_BYTES)
+        except http_client.ResponseTooLarge as e:
+            r = e.response
+    return url if r.status_code == 200 and _is_menu_type(r.headers.get("Content-Type","")) else None
+
+def _homepage_hint(base: str) -> Optional[str]:
+    """First <a> (or rel=alternate/menu <link>) on the homepage that looks like a menu link.
+
+    Other <link>s (stylesheets, icons, preloads) are skipped: their hrefs often
+    contain "menu" (e.g. menu.css) without being one.
+    """
+    if not robots_allowed(base):
+        return None
+    r = http_client.get(base, timeout=PROBE_TIMEOUT)
+    if not r.ok:
+        return None
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(r.text, "html.parser")
+    for a in soup.find_all(["a", "link"], href=True):
+        if a.name == "link" and not {r.lower() for r in a.get("rel") or []} & {"alternate", "menu"}:
+            continue
+        href = a["href"].strip()
+        if re.match(r"(?i)(mailto|tel|javascript):|#", href):
+            continue
+        label = a.get_text(" ", strip=True) if a.name == "a" else (a.get("title") or "")
+        if re.search(r"menu", label, re.I) or re.search(r"/menu|/menus", href, re.I):
+            return urlparse.urljoin(base + "/", href)
+    return None
+
+def _sitemap_hint(base: str) -> Optional[str]:
+    """Shortest same-site sitemap <loc> whose path mentions a menu."""
+    host = urlparse.urlsplit(base).netloc.lower()
+    for sm in site_maps(base) or [base + "/sitemap.xml"]:
+        if urlparse.urlsplit(sm).netloc.lower() != host or not robots_allowed(sm):
+            continue
+        try:
+            r = http_client.get(sm, timeout=PROBE_TIMEOUT, max_bytes=SITEMAP_MAX_BYTES)
+        except Exception as e:
+            count_error("sitemap", e)
+            continue
+        if not r.ok:
+            continue
+        locs = [u.strip() for u in re.findall(r"<loc>\s*([^<]+?)\s*</loc>", r.text, re.I)]
+        menus = [u for u in locs if urlparse.urlsplit(u).netloc.lower() == host
+                 and re.search(r"/menus?\b", urlparse.urlsplit(u).path, re.I)]
+        if menus:
+            return min(menus, key=lambda u: (urlparse.urlsplit(u).path.count("/"), len(u)))
+    return None
+
+def _settled(results: dict, n: int):
+    """Best hit once every better candidate has finished; "" if all missed; None if still open."""
+    for prio in range(n):
+        if prio not in results:
+            return None
+        if results[prio]:
+            return results[prio]
+    return ""
+
+def discover_menu_url(website: str, deadline_sec: float = DISCOVERY_DEADLINE_SEC) -> Optional[str]:
+    """Menu URL for a website, "" when every candidate was checked and none is a menu,
+    None when that is not known (deadline passed or a request failed before any hit)."""
+    base = website.rstrip("/")
+    cands = [partial(_probe, base + p) for p in MENU_PATHS] + [partial(_homepage_hint, base), partial(_sitemap_hint, base)]
+    # homepage and sitemap go first so they run alongside the path probes
+    queue = [len(cands) - 2, len(cands) - 1] + list(range(len(cands) - 2))
+    results, running, failed = {}, {}, False
+    deadline = time.monotonic() + deadline_sec
+    try:
+        while queue or running:
+            while queue and len(running) < DISCOVERY_PER_SITE:
+                prio = queue.pop(0)
+                running[_executor.submit(contextvars.copy_context().run, cands[prio])] = prio
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+            for f in done:
+                prio = running.pop(f)
+                try:
+                    results[prio] = f.result()
+                except Exception as e:
+                    count_error("discovery_probe", e)
+                    results[prio], failed = None, True
+            best = _settled(results, len(cands))
+            if best is not None:
+                return None if best == "" and failed else best
+    finally:
+        for f in running:
+            f.cancel()
+    hits = [prio for prio, url in results.items() if url]
+    return results[min(hits)] if hits else None
@@ -0,0 +1,315 @@
+"""
+In-process metrics, request tracing and slow-request profiling.
+
+- Counters and histograms render as Prometheus text on GET /metrics;
+  collectors add values read at scrape time (cache hit counts, scheduler
+  and job state) so those cost nothing per request.
+- span("stage") times a stage of the current request. Durations go into
+  stage_seconds{stage=...} and, with SERVER_TIMING=1, the response's
+  Server-Timing header. Spans from fan-out threads count towards the request
+  that started them (fanout.py copies the context), so a stage's time is
+  summed over threads rather than wall time.
+- count_error(where, exc) replaces silent `except Exception: pass`.
+- With PROFILE_SLOW_MS set, PROFILE_SAMPLE of requests run under cProfile
+  (one at a time) and those slower than the threshold are dumped to
+  PROFILE_DIR as .prof files.
+
+METRICS=0 turns counters, histograms and spans into no-ops. RequestLog keeps
+the most recent menu fetches for /_stats. Numbers are per process.
+"""
+
+import os, time, random, tempfile, threading, contextvars
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+METRICS_ENABLED = os.environ.get("METRICS", "1") != "0"
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "0"))  # 0 = off
+PROFILE_SAMPLE = float(os.environ.get("PROFILE_SAMPLE", "0.05"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "finedining-profiles"))
+PROFILE_KEEP = 50
+MAX_SERIES = 500  # label combinations per metric; the rest are folded into "_other"
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra: parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, values) -> tuple:
+        key = tuple(values)
+        if key not in self._series and len(self._series) >= MAX_SERIES:
+            key = ("_other",) * len(self.labels)
+        return key
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *values, n: float = 1) -> None:
+        with self._lock:
+            key = self._key(values)
+            self._series[key] = self._series.get(key, 0) + n
+
+    def render(self):
+        with self._lock:
+            items = list(self._series.items())
+        return self.header() + [f"{self.name}{_labels(self.labels, k)} {v:g}" for k, v in items]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *values) -> None:
+        with self._lock:
+            key = self._key(values)
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[0][i] += 1
+                    break
+            s[1] += 1
+            s[2] += value
+
+    def render(self):
+        with self._lock:
+            items = [(k, (list(s[0]), s[1], s[2])) for k, s in self._series.items()]
+        out = self.header()
+        for k, (counts, total, sum_) in items:
+            cum = 0
+            for b, c in zip(self.buckets, counts):
+                cum += c
+                le = 'le="%g"' % b
+                out.append(f"{self.name}_bucket{_labels(self.labels, k, le)} {cum}")
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_labels(self.labels, k, le)} {total}")
+            out.append(f"{self.name}_sum{_labels(self.labels, k)} {sum_:.6f}")
+            out.append(f"{self.name}_count{_labels(self.labels, k)} {total}")
+        return out
+
+class _Noop:
+    def inc(self, *a, **kw): pass
+    def observe(self, *a, **kw): pass
+    def render(self): return []
+
+# collector() -> iterable of (name, type, help, [(labels dict, value)])
+Collector = Callable[[], Iterable[Tuple[str, str, str, list]]]
+
+class Registry:
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def _add(self, m):
+        if not self.enabled:
+            return _Noop()
+        self._metrics.append(m)
+        return m
+
+    def collector(self, fn: Collector) -> None:
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines += m.render()
+        for fn in self._collectors:
+            try:
+                families = list(fn())
+            except Exception as e:
+                count_error("metrics_collector", e)
+                continue
+            for name, kind, help, samples in families:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_labels(list(lbl), list(lbl.values()))} {v:g}" for lbl, v in samples]
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+stage_seconds = registry.histogram("finedining_stage_seconds", "Time spent per pipeline stage (summed over threads).", ("stage",))
+errors_total = registry.counter("finedining_errors_total", "Exceptions caught and handled, by place and type.", ("where", "type"))
+outbound_requests = registry.counter("finedining_outbound_requests_total", "Outbound HTTP requests by destination and outcome.", ("dest", "outcome"))
+outbound_seconds = registry.histogram("finedining_outbound_request_seconds", "Outbound HTTP request time.", ("dest",))
+outbound_bytes = registry.counter("finedining_outbound_bytes_total", "Response body bytes read, by sniffed kind.", ("kind",))
+requests_total = registry.counter("finedining_http_requests_total", "Requests served.", ("endpoint", "method", "status"))
+request_seconds = registry.histogram("finedining_http_request_seconds", "Time to response headers.", ("endpoint",))
+profiles_dumped = registry.counter("finedining_profiles_dumped_total", "Slow requests written to PROFILE_DIR.")
+
+# ----------------- Tracing -----------------
+
+class Trace:
+    """Stage durations of one request, summed per stage."""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, dt: float) -> None:
+        with self._lock:
+            tot, n = self.stages.get(stage, (0.0, 0))
+            self.stages[stage] = (tot + dt, n + 1)
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        with self._lock:
+            stages = list(self.stages.items())
+        parts = [f'{s};dur={tot*1000:.1f};desc="x{n}"' for s, (tot, n) in stages]
+        if total is not None: parts.append(f"total;dur={total*1000:.1f}")
+        return ", ".join(parts)
+
+_trace = contextvars.ContextVar("finedining_trace", default=None)
+
+class _Span:
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dt = time.perf_counter() - self.t0
+        stage_seconds.observe(dt, self.stage)
+        tr = _trace.get()
+        if tr is not None: tr.add(self.stage, dt)
+        return False
+
+class _NullSpan:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL_SPAN = _NullSpan()
+
+def span(stage: str):
+    """Context manager timing one stage of the current request."""
+    return _Span(stage) if METRICS_ENABLED else _NULL_SPAN
+
+def count_error(where: str, exc: BaseException) -> None:
+    errors_total.inc(where, type(exc).__name__)
+
+# ----------------- Flask hooks -----------------
+
+_profile_lock = threading.Lock()
+
+def _dump_profile(prof, endpoint: str, dur: float) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint.strip('/').replace('/', '_') or 'root'}-{dur*1000:.0f}ms.prof"
+    prof.dump_stats(os.path.join(PROFILE_DIR, name))
+    profiles_dumped.inc()
+    old = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".prof"))
+    for f in old[:-PROFILE_KEEP]:
+        try: os.remove(os.path.join(PROFILE_DIR, f))
+        except OSError: pass
+
+def init_app(app) -> None:
+    """Per-request trace, request metrics, Server-Timing and sampled profiling for a Flask app."""
+    from flask import g, request
+    if not METRICS_ENABLED and not PROFILE_SLOW_MS:
+        return
+
+    @app.before_request
+    def _start():
+        g._t0 = time.perf_counter()
+        g._trace_token = _trace.set(Trace()) if METRICS_ENABLED else None
+        g._prof = None
+        if PROFILE_SLOW_MS and random.random() < PROFILE_SAMPLE and _profile_lock.acquire(blocking=False):
+            import cProfile
+            g._prof = cProfile.Profile()
+            g._prof.enable()
+
+    @app.after_request
+    def _finish(resp):
+        t0 = g.get("_t0")
+        if t0 is None:
+            return resp
+        dur = time.perf_counter() - t0
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        requests_total.inc(endpoint, request.method, resp.status_code)
+        request_seconds.observe(dur, endpoint)
+        tr = _trace.get()
+        if SERVER_TIMING and tr is not None:
+            resp.headers["Server-Timing"] = tr.server_timing(dur)
+        prof = g.pop("_prof", None)
+        if prof is not None:
+            prof.disable()
+            try:
+                if dur * 1000 >= PROFILE_SLOW_MS:
+                    _dump_profile(prof, endpoint, dur)
+            except OSError as e:
+                count_error("profile_dump", e)
+            finally:
+                _profile_lock.release()
+        return resp
+
+    @app.teardown_request
+    def _teardown(exc):
+        prof = g.pop("_prof", None)
+        if prof is not None:  # after_request did not run
+            prof.disable()
+            _profile_lock.release()
+        token = g.pop("_trace_token", None)
+        if token is not None:
+            _trace.reset(token)
+
+# ----------------- Recent request log -----------------
+
+class RequestLog:
+    """Running totals and maxima of numeric fields plus the last few records verbatim."""
+
+    def __init__(self, keep: int = 100):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=keep)
+        self.count = 0
+        self.totals = {}
+        self.maxima = {}
+
+    def record(self, **fields) -> None:
+        """Add one record; numbers are summed (and their max kept), True flags are counted."""
+        fields["ts"] = round(time.time(), 3)
+        with self._lock:
+            self.count += 1
+            self._recent.append(fields)
+            for k, v in fields.items():
+                if k == "ts" or v is None or isinstance(v, str):
+                    continue
+                if isinstance(v, bool):
+                    if v: self.totals[k] = self.totals.get(k, 0) + 1
+                    continue
+                self.totals[k] = self.totals.get(k, 0) + v
+                if v > self.maxima.get(k, v - 1): self.maxima[k] = v
+
+    def snapshot(self, recent: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            rnd = lambda d: {k: round(v, 4) if isinstance(v, float) else v for k, v in d.items()}
+            return {"count": self.count, "totals": rnd(self.totals), "max": rnd(self.maxima),
+                    "recent": list(self._recent)[-recent:]}
+
+# one record per menu fetched and parsed (bytes, fetch/parse time, partial parses)
+menu_log = RequestLog()
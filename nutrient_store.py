@@ -0,0 +1,341 @@
+"""
+Local nutrient store: packaged-food products with calories and protein,
+searchable by name through an inverted token index.
+
+Products come from two places: a file built offline from an Open Food Facts
+dump (NUTRIENTS_PATH, gzipped JSON lines, loaded on first use) and the
+products returned by live /openfoodfacts lookups, which are kept in the
+shared cache DB so every worker learns them.
+
+A name is reduced to normalized tokens (lowercase, accents and plurals
+stripped, filler words dropped) and products are scored by IDF-weighted
+Dice overlap, so "Grilled Chicken Caesar Salads" finds "grilled chicken
+caesar salad" while "chicken" alone matches nothing with confidence.
+match() only reads the postings of the query's rarest tokens that any
+product above the threshold must contain, and memoizes results per name.
+
+enrich_picks() uses a match at or above NUTRIENTS_MIN_SCORE to replace the
+rule-based est_kcal / est_protein_g of menu picks with the product's
+per-serving values (NUTRIENTS_ENRICH=1; off by default because packaged
+foods are only a proxy for restaurant dishes).
+
+    python -m nutrient_store import en.openfoodfacts.org.products.csv.gz
+    python -m nutrient_store import openfoodfacts-products.jsonl.gz --max 300000
+    python -m nutrient_store match "grilled chicken caesar salad"
+"""
+
+import os, re, csv, sys, gzip, json, math, time, threading, unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+NUTRIENTS_PATH = os.environ.get("NUTRIENTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "nutrients.jsonl.gz"))
+NUTRIENTS_ENRICH = os.environ.get("NUTRIENTS_ENRICH", "0") == "1"
+NUTRIENTS_MIN_SCORE = float(os.environ.get("NUTRIENTS_MIN_SCORE", "0.8"))
+LEARNED_MAX = 20000        # products kept from live lookups
+LEARNED_KEEP_SEC = 365*24*3600
+MAX_POSTINGS = 1000        # products read per seed word (bounds lookups made of very common words)
+MEMO_MAX = 20000
+IDF_REBUILD_GROWTH = 1.05  # rebuild the idf table once the catalogue grew by 5% since it was built
+
+STOPWORDS = {"a", "an", "and", "the", "of", "with", "w", "in", "on", "or", "de", "la", "le", "en", "et", "con", "y", "style"}
+_WORD = re.compile(r"[a-z0-9]+")
+_GRAMS = re.compile(r"([\d.]+)\s*(g|gr|grams?|ml)\b", re.I)
+
+def tokens(name: str) -> Tuple[str, ...]:
+    """Normalized, de-duplicated tokens of a product or dish name."""
+    s = unicodedata.normalize("NFKD", (name or "").lower()).encode("ascii", "ignore").decode()
+    out = []
+    for w in _WORD.findall(s):
+        if w in STOPWORDS or w.isdigit():
+            continue
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-3] + "y" if w.endswith("ies") else w[:-1]
+        if w not in out:
+            out.append(w)
+    return tuple(out)
+
+def serving_grams(serving_size) -> Optional[float]:
+    m = _GRAMS.search(str(serving_size or ""))
+    try:
+        return float(m.group(1)) if m else None
+    except ValueError:
+        return None
+
+def _num(v) -> Optional[float]:
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return None
+    return v if v >= 0 and math.isfinite(v) else None
+
+def product_row(code, name, brand, kcal_100g, protein_100g, kcal_serving, protein_serving, serving_size) -> Optional[list]:
+    """Compact stored form, or None when the product is useless for matching:
+    [code, name, brand, kcal per serving, protein g per serving, kcal/100g, protein/100g, serving g]."""
+    name = (name or "").strip()
+    if not name or not tokens(name):
+        return None
+    grams = serving_grams(serving_size)
+    kcal_s, prot_s = _num(kcal_serving), _num(protein_serving)
+    kcal_h, prot_h = _num(kcal_100g), _num(protein_100g)
+    if kcal_s is None and kcal_h is not None and grams: kcal_s = kcal_h * grams / 100
+    if prot_s is None and prot_h is not None and grams: prot_s = prot_h * grams / 100
+    if kcal_s is None and kcal_h is None:
+        return None
+    rnd = lambda v: None if v is None else round(v, 1)
+    return [str(code or f"{name}|{brand or ''}".lower()), name, (brand or "").strip(),
+            rnd(kcal_s), rnd(prot_s), rnd(kcal_h), rnd(prot_h), grams]
+
+def row_from_off_item(it: Dict[str, Any]) -> Optional[list]:
+    """product_row for an item as returned by integrations.openfoodfacts.search_off."""
+    return product_row(it.get("code"), it.get("name"), it.get("brand"), it.get("energy_kcal_100g"), it.get("protein_100g"),
+                       it.get("energy_kcal_serving"), it.get("protein_serving"), it.get("serving_size"))
+
+_MISS = object()
+
+class NutrientStore:
+    NS = "nutrients_learned"  # one cache entry per learned product, keyed by its code
+
+    def __init__(self, path: str = NUTRIENTS_PATH, backend=None):
+        self.path = path
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._rows = []       # product rows, append-only
+        self._toks = []       # tokens per row
+        self._by_code = {}    # code -> row index
+        self._postings = {}   # token -> [row index]
+        self._memo = {}
+        self._idfs = {}       # token -> idf; new words are added in place, rebuilt once the catalogue grows
+        self._idf_n = 0       # product count the idf table was built for
+        self.stats = {"products": 0, "from_file": 0, "learned": 0, "lookups": 0, "memo_hits": 0, "matches": 0}
+
+    def load(self) -> None:
+        """Read the dump file and learned products (once; later calls return at once)."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            t0 = time.perf_counter()
+            if self.path and os.path.exists(self.path):
+                with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            self._index(json.loads(line))
+                self.stats["from_file"] = len(self._rows)
+            learned = self.backend.items(self.NS, LEARNED_MAX) if self.backend else []
+            for _, row in reversed(learned):
+                self._index(row)
+            if self.backend: self.backend.trim(self.NS, LEARNED_MAX)
+            self.stats["learned"] = len(learned)
+            self.stats["load_sec"] = round(time.perf_counter() - t0, 3)
+            self._loaded = True
+
+    def _index(self, row) -> None:
+        # caller holds the lock (or is loading); the row goes in before its postings so readers never see a dangling index
+        i = self._by_code.get(row[0])
+        if i is not None:
+            self._rows[i] = row
+            return
+        toks = tokens(row[1])
+        i = len(self._rows)
+        self._rows.append(row)
+        self._toks.append(frozenset(toks))
+        self._by_code[row[0]] = i
+        for t in toks:
+            self._postings.setdefault(t, []).append(i)
+        self.stats["products"] = len(self._rows)
+
+    def add(self, rows: Iterable[list]) -> int:
+        """Index products learned from a live lookup and keep them in the shared cache DB (one entry each)."""
+        rows = [r for r in rows if r]
+        if not rows:
+            return 0
+        self.load()
+        with self._lock:
+            new = [r for r in rows if r[0] not in self._by_code]
+            touched = {t for r in new for t in tokens(r[1])}
+            idfs = self._idfs
+            if idfs and len(self._rows) + len(new) <= self._idf_n * IDF_REBUILD_GROWTH:
+                # keep the table, scaled to the product count it was built for; unseen words get a
+                # weight before the rows are indexed, so readers never meet a word without one
+                for t in touched - idfs.keys():
+                    idfs[t] = math.log(1 + self._idf_n / 2)
+                for row in rows:
+                    self._index(row)
+                for t in touched:
+                    idfs[t] = math.log(1 + self._idf_n / (1 + len(self._postings[t])))
+            else:
+                self._idfs = {}
+                for row in rows:
+                    self._index(row)
+            if not self._idfs:
+                self._memo.clear()
+            elif touched:
+                for key in [k for k in list(self._memo) if touched.intersection(k[0])]:  # match() writes without the lock
+                    self._memo.pop(key, None)
+            self.stats["learned"] += len(new)
+        if self.backend:
+            for row in rows:
+                self.backend.set(self.NS, row[0], row, LEARNED_KEEP_SEC)
+        return len(rows)
+
+    def _idf_table(self) -> Dict[str, float]:
+        idfs = self._idfs
+        if not idfs:
+            with self._lock:
+                n = self._idf_n = len(self._rows)
+                idfs = self._idfs = {t: math.log(1 + n / (1 + len(p))) for t, p in self._postings.items()}
+        return idfs
+
+    def _ranked(self, q: Tuple[str, ...], limit: int, min_score: float = 0.0, min_shared: int = 1) -> List[Tuple[float, int]]:
+        """(score, row index) of the best products for query tokens q, best first."""
+        idfs = self._idf_table()
+        unseen = math.log(1 + len(self._rows))  # idf of a word no product has
+        qset, toks = frozenset(q), self._toks
+        known = sorted((t for t in qset if t in idfs), key=idfs.__getitem__, reverse=True)
+        if len(known) < min_shared:
+            return []
+        q_w = sum(idfs.get(t, unseen) for t in qset)
+        min_shared_w = min_score * q_w / (2 - min_score)
+        if min_score > 0:
+            # Prefix filter: Dice >= m needs a shared weight of at least m*Q/(2-m), so a match
+            # contains one of the rarest words whose weight (with the unknown words') exceeds
+            # what it may miss. Only those words' postings are read.
+            may_miss = q_w - min_shared_w
+            missed = q_w - sum(idfs[t] for t in known)
+            seeds = []
+            for t in known:
+                if missed > may_miss:
+                    break
+                seeds.append(t)
+                missed += idfs[t]
+            if missed <= may_miss:
+                return []
+        else:
+            seeds = known[:2]
+        seen, scored = set(), []
+        for t in seeds:
+            for i in self._postings[t][:MAX_POSTINGS]:
+                if i in seen:
+                    continue
+                seen.add(i)
+                shared = qset & toks[i]
+                if len(shared) < min_shared:
+                    continue
+                s_w = sum(map(idfs.__getitem__, shared))
+                if s_w < min_shared_w:
+                    continue
+                score = 2 * s_w / (q_w + sum(map(idfs.__getitem__, toks[i])))
+                if score >= min_score:
+                    scored.append((score, i))
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        return scored[:limit]
+
+    def match(self, name: str, min_score: float = NUTRIENTS_MIN_SCORE) -> Optional[Tuple[list, float]]:
+        """(product row, score) of the best match for a dish name, or None below min_score."""
+        self.load()
+        q = tokens(name)
+        self.stats["lookups"] += 1
+        key = (q, min_score)
+        hit = self._memo.get(key, _MISS)  # one lookup: add() may drop the entry at any time
+        if hit is not _MISS:
+            self.stats["memo_hits"] += 1
+            return hit
+        res = None
+        best = self._ranked(q, 1, min_score, min_shared=2)  # one shared word is never enough, however rare
+        if best:
+            res = (self._rows[best[0][1]], round(best[0][0], 3))
+            self.stats["matches"] += 1
+        if len(self._memo) >= MEMO_MAX:
+            self._memo.clear()
+        self._memo[key] = res
+        return res
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Best local products for a free-text query, in search_off's item shape."""
+        self.load()
+        return [dict(_as_off_item(self._rows[i]), match_score=round(s, 3)) for s, i in self._ranked(tokens(query), limit)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "tokens": len(self._postings), "memo": len(self._memo)}
+
+def _as_off_item(row) -> Dict[str, Any]:
+    code, name, brand, kcal_s, prot_s, kcal_h, prot_h, grams = row
+    return {"code": code, "name": name, "brand": brand, "energy_kcal_100g": kcal_h, "protein_100g": prot_h,
+            "energy_kcal_serving": kcal_s, "protein_serving": prot_s,
+            "serving_size": f"{grams:g} g" if grams else None}
+
+def enrich_picks(picks: List[Dict[str, Any]], store: NutrientStore, min_score: float = NUTRIENTS_MIN_SCORE) -> List[Dict[str, Any]]:
+    """Replace rule estimates of ranked picks (in place) with per-serving values of a confident product match."""
+    for p in picks:
+        m = store.match(p.get("item_name") or "", min_score)
+        if not m or m[0][3] is None:
+            continue
+        row, score = m
+        p["est_kcal"] = int(round(row[3]))
+        if row[4] is not None: p["est_protein_g"] = int(round(row[4]))
+        ev = p.setdefault("evidence", {})
+        ev["signals"] = list(ev.get("signals", [])) + ["nutrients:openfoodfacts"]
+        ev["nutrient_match"] = {"name": row[1], "brand": row[2], "score": score}
+    return picks
+
+# ----------------- Import from an Open Food Facts dump -----------------
+
+def _open(path: str):
+    return gzip.open(path, "rt", encoding="utf-8", errors="replace") if path.endswith(".gz") else open(path, encoding="utf-8", errors="replace")
+
+def iter_dump(path: str) -> Iterable[list]:
+    """Product rows from the OFF CSV export (tab-separated) or JSONL export, optionally gzipped."""
+    with _open(path) as f:
+        if ".jsonl" in path or ".json" in path:
+            for line in f:
+                try:
+                    p = json.loads(line)
+                except ValueError:
+                    continue
+                n = p.get("nutriments") or {}
+                row = product_row(p.get("code"), p.get("product_name_en") or p.get("product_name"), p.get("brands"),
+                                  n.get("energy-kcal_100g"), n.get("proteins_100g"),
+                                  n.get("energy-kcal_serving"), n.get("proteins_serving"), p.get("serving_size"))
+                if row: yield row
+            return
+        csv.field_size_limit(1 << 24)
+        for rec in csv.DictReader(f, delimiter="\t"):
+            row = product_row(rec.get("code"), rec.get("product_name"), rec.get("brands"),
+                              rec.get("energy-kcal_100g"), rec.get("proteins_100g"),
+                              rec.get("energy-kcal_serving"), rec.get("proteins_serving"), rec.get("serving_size"))
+            if row: yield row
+
+def build(src: str, dest: str = NUTRIENTS_PATH, max_products: int = 0, per_serving_only: bool = False) -> int:
+    n = 0
+    seen = set()
+    with gzip.open(dest + ".tmp", "wt", encoding="utf-8") as out:
+        for row in iter_dump(src):
+            if row[0] in seen or (per_serving_only and row[3] is None):
+                continue
+            seen.add(row[0])
+            out.write(json.dumps(row, separators=(",", ":")) + "\n")
+            n += 1
+            if max_products and n >= max_products:
+                break
+    os.replace(dest + ".tmp", dest)
+    return n
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(prog="python -m nutrient_store")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="build NUTRIENTS_PATH from an Open Food Facts CSV or JSONL dump")
+    imp.add_argument("dump")
+    imp.add_argument("--out", default=NUTRIENTS_PATH)
+    imp.add_argument("--max", type=int, default=0, help="stop after this many products")
+    imp.add_argument("--per-serving-only", action="store_true", help="skip products without per-serving values")
+    mt = sub.add_parser("match", help="show the best local matches for a dish name")
+    mt.add_argument("name")
+    opts = ap.parse_args()
+    if opts.cmd == "import":
+        print(f"wrote {build(opts.dump, opts.out, opts.max, opts.per_serving_only)} products to {opts.out}", file=sys.stderr)
+    else:
+        from cache import open_backend
+        store = NutrientStore(backend=open_backend())
+        print(json.dumps({"match": store.match(opts.name), "candidates": store.search(opts.name, 5)}, indent=1))
@@ -7,8 +7,11 @@ We keep functions small and testable.
 
 import re
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import List, Dict, Any, Tuple
 
+import numpy as np
+
 PROTEIN_CUES = [
     "chicken","turkey","steak","beef","salmon","tuna","shrimp","prawn","tofu","tempeh","egg","eggs","yogurt","greek yogurt","pork loin"
 ]
@@ -21,6 +24,23 @@ STARCHES = ["rice","pasta","bun","tortilla","fries","chips","potato","potatoes",
 HIGH_CAL_SAUCES = ["mayo","aioli","ranch","queso","alfredo","cream","butter","cheese sauce"]
 LOW_CAL_SAUCES  = ["salsa","tomato sauce","marinara","chimichurri","vinaigrette","salsa verde"]
 
+FRIED_CUES = ["fried","tempura","battered"]
+DAIRY_CUES = ["cheese","cream","alfredo","yogurt"]
+
+# Every cue list the rules look at, matched together in one pass per item.
+CUE_CATEGORIES = {
+    "protein": PROTEIN_CUES,
+    "lean": LEAN_COOKING,
+    "rich": RICH_COOKING,
+    "starch": STARCHES,
+    "high_cal_sauce": HIGH_CAL_SAUCES,
+    "low_cal_sauce": LOW_CAL_SAUCES,
+    "fried_cooking": FRIED_CUES,
+    "dairy": DAIRY_CUES,
+    "pasta": ["pasta"],
+    "fried": ["fried"],
+}
+
 SECTION_PRIORS = [
     ("salad", (350,650), (22,45)),
     ("bowl",  (550,800), (25,45)),
@@ -43,9 +63,40 @@ class ScoreResult:
     why: str
 
 def _count_hits(text: str, tokens: List[str]) -> int:
+    # Reference semantics for CueMatcher (checked against it in tests/test_nutrition_rules.py):
+    # each listed token counts once if it occurs anywhere (as a substring) in the lowercased text.
     t = text.lower()
     return sum(1 for w in tokens if w in t)
 
+class CueMatcher:
+    """Counts hits for several cue lists with one scan of the shared vocabulary.
+
+    Each distinct token is looked up once per text (the text is lowercased
+    once), and every category that lists it gets credited, so results match
+    calling _count_hits per list.
+    """
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        self._tokens = sorted({w for ws in categories.values() for w in ws})
+        self._token_cats = {w: [c for c, ws in categories.items() for x in ws if x == w] for w in self._tokens}
+        self._empty = dict.fromkeys(categories, 0)
+
+    def counts(self, text: str) -> Dict[str, int]:
+        t = text.lower()
+        counts = dict(self._empty)
+        for w in self._tokens:
+            if w in t:
+                for c in self._token_cats[w]:
+                    counts[c] += 1
+        return counts
+
+_matcher = CueMatcher(CUE_CATEGORIES)
+
+@lru_cache(maxsize=8192)
+def cue_counts(text: str) -> Dict[str, int]:
+    """Hit count per CUE_CATEGORIES entry for `text` (memoized; do not mutate)."""
+    return _matcher.counts(text)
+
 def _estimate_from_section(section: str) -> Tuple[Tuple[int,int], Tuple[int,int]]:
     s = (section or "").lower()
     for key, cal_rng, prot_rng in SECTION_PRIORS:
@@ -54,14 +105,19 @@ def _estimate_from_section(section: str) -> Tuple[Tuple[int,int], Tuple[int,int]
     # default broad prior
     return (500,900), (20,40)
 
-def estimate(text: str, section: str) -> Tuple[int,int, Dict[str,Any]]:
-    """Return (kcal, protein_g, evidence) using cues and priors."""
+def estimate(text: str, section: str, counts: Dict[str,int] = None) -> Tuple[int,int, Dict[str,Any]]:
+    """Return (kcal, protein_g, evidence) using cues and priors.
+
+    `counts` (from cue_counts) may be passed in when the caller already has them.
+    """
     cal_rng, prot_rng = _estimate_from_section(section)
+    if counts is None:
+        counts = cue_counts(text)
 
-    protein_hits = _count_hits(text, PROTEIN_CUES)
-    lean_hits    = _count_hits(text, LEAN_COOKING)
-    rich_hits    = _count_hits(text, RICH_COOKING)
-    starch_hits  = _count_hits(text, STARCHES)
+    protein_hits = counts["protein"]
+    lean_hits    = counts["lean"]
+    rich_hits    = counts["rich"]
+    starch_hits  = counts["starch"]
 
     # start with mid-point
     kcal = int((cal_rng[0] + cal_rng[1]) / 2)
@@ -93,11 +149,22 @@ def estimate(text: str, section: str) -> Tuple[int,int, Dict[str,Any]]:
     if section:      evidence["signals"].append(f"section:{section.lower()}")
     return kcal, protein, evidence
 
+def _confidence(counts: Dict[str,int]) -> str:
+    hits = counts["protein"] + counts["lean"] + counts["starch"] + counts["rich"]
+    if hits >= 4: return "high"
+    if hits >= 2: return "medium"
+    return "low"
+
+def item_confidence(item: Dict[str,Any]) -> str:
+    """The confidence score_item would report for a parsed menu item."""
+    return _confidence(cue_counts(" ".join([item.get("item_name","") or "", item.get("description","") or ""])))
+
 def score_item(name: str, description: str, section: str, calorie_target: int = 600,
                prioritize_protein: bool = True, flags: List[str] = None) -> ScoreResult:
     flags = flags or []
     text = " ".join([name or "", description or ""])
-    kcal, protein, ev = estimate(text, section)
+    counts = cue_counts(text)
+    kcal, protein, ev = estimate(text, section, counts)
 
     # normalize features
     prot_norm = min(1.0, max(0.0, (protein - 10) / 60.0))
@@ -105,15 +172,14 @@ def score_item(name: str, description: str, section: str, calorie_target: int =
     rich_pen = 0.15 * ev.get("rich_hits", 0)
 
     conflict_pen = 0.0
-    t = text.lower()
-    if "low_carb" in flags and _count_hits(t, STARCHES) > 0:
+    if "low_carb" in flags and counts["starch"] > 0:
         conflict_pen += 0.15
-    if "no_fried" in flags and _count_hits(t, ["fried","tempura","battered"]) > 0:
+    if "no_fried" in flags and counts["fried_cooking"] > 0:
         conflict_pen += 0.2
     # gluten/dairy are heuristic words only
-    if "gluten_mindful" in flags and "pasta" in t:
+    if "gluten_mindful" in flags and counts["pasta"]:
         conflict_pen += 0.1
-    if "dairy_mindful" in flags and _count_hits(t, ["cheese","cream","alfredo","yogurt"]) > 0:
+    if "dairy_mindful" in flags and counts["dairy"] > 0:
         conflict_pen += 0.1
 
     protein_w = 0.6 if prioritize_protein else 0.35
@@ -122,17 +188,14 @@ def score_item(name: str, description: str, section: str, calorie_target: int =
     score = (protein_w * prot_norm) + (target_w * closeness) - rich_pen - conflict_pen
     score = max(0.0, min(1.0, score))
 
-    conf = "low"
-    hits = ev.get("protein_hits",0) + ev.get("lean_hits",0) + ev.get("starch_hits",0) + ev.get("rich_hits",0)
-    if hits >= 4: conf = "high"
-    elif hits >= 2: conf = "medium"
+    conf = _confidence(counts)
 
     # Simple modifiers
     modifiers = []
-    if _count_hits(t, HIGH_CAL_SAUCES) > 0: modifiers.append("sauce on side")
-    if _count_hits(t, STARCHES) > 0: modifiers.append("half starch")
-    if _count_hits(t, LEAN_COOKING) > 0: modifiers.append("extra vegetables")
-    if "fried" in t: modifiers.append("ask grilled if possible")
+    if counts["high_cal_sauce"] > 0: modifiers.append("sauce on side")
+    if counts["starch"] > 0: modifiers.append("half starch")
+    if counts["lean"] > 0: modifiers.append("extra vegetables")
+    if counts["fried"]: modifiers.append("ask grilled if possible")
 
     why = "High protein emphasis, closer to your target."
 
@@ -144,24 +207,149 @@ def score_item(name: str, description: str, section: str, calorie_target: int =
         confidence=conf, score=score, modifiers=modifiers, why=why
     )
 
+def _ranked_entry(it: Dict[str,Any], sres: ScoreResult) -> Dict[str,Any]:
+    return {
+        "section": it.get("section"),
+        "item_name": it.get("item_name"),
+        "description": it.get("description",""),
+        "est_kcal": sres.est_kcal,
+        "est_protein_g": sres.est_protein_g,
+        "confidence": sres.confidence,
+        "modifiers": sres.modifiers[:3],
+        "server_script": f"Could I get the {it.get('item_name')} with " + (", ".join(sres.modifiers) if sres.modifiers else "those default options, please?"),
+        "why_it_works": sres.why,
+        "evidence": sres.evidence,
+        "score": sres.score,
+    }
+
 def rank_items(items: List[Dict[str,Any]], calorie_target: int = 600,
                prioritize_protein: bool = True, flags: List[str] = None) -> List[Dict[str,Any]]:
     ranked = []
     for it in items:
         sres = score_item(it.get("item_name",""), it.get("description",""), it.get("section",""),
                           calorie_target, prioritize_protein, flags or [])
-        ranked.append({
-            "section": it.get("section"),
-            "item_name": it.get("item_name"),
-            "description": it.get("description",""),
-            "est_kcal": sres.est_kcal,
-            "est_protein_g": sres.est_protein_g,
-            "confidence": sres.confidence,
-            "modifiers": sres.modifiers[:3],
-            "server_script": f"Could I get the {it.get('item_name')} with " + (", ".join(sres.modifiers) if sres.modifiers else "those default options, please?"),
-            "why_it_works": sres.why,
-            "evidence": sres.evidence,
-            "score": sres.score,
-        })
+        ranked.append(_ranked_entry(it, sres))
     ranked.sort(key=lambda x: x["score"], reverse=True)
     return ranked
+
+# ----------------- Batch scoring -----------------
+# Same rules as score_item, evaluated over NumPy arrays for a whole menu.
+# Only the top-k winners are turned into full result dicts.
+
+class MenuFeatures:
+    """Context-independent per-item features of a menu (cue counts, estimates)."""
+
+    def __init__(self, items: List[Dict[str,Any]]):
+        self.items = items
+        rows = []
+        for it in items:
+            text = " ".join([it.get("item_name","") or "", it.get("description","") or ""])
+            c = cue_counts(text)
+            cal_rng, prot_rng = _estimate_from_section(it.get("section",""))
+            rows.append((int((cal_rng[0] + cal_rng[1]) / 2), int((prot_rng[0] + prot_rng[1]) / 2),
+                         c["protein"], c["lean"], c["rich"], c["starch"],
+                         c["fried_cooking"], c["pasta"], c["dairy"]))
+        a = np.array(rows, dtype=np.int64).reshape(len(rows), 9)
+        cal_mid, prot_mid, protein_h, lean_h, rich_h, starch_h = (a[:, i] for i in range(6))
+        self.kcal = np.clip(cal_mid + 60 * rich_h - 35 * lean_h + 40 * starch_h, 250, 1200)
+        self.protein = np.clip(prot_mid + 6 * protein_h + 2 * lean_h - 2 * rich_h, 8, 80)
+        self.prot_norm = np.clip((self.protein - 10) / 60.0, 0.0, 1.0)
+        self.rich_pen = 0.15 * rich_h
+        self.has_starch = starch_h > 0
+        self.has_fried = a[:, 6] > 0
+        self.has_pasta = a[:, 7] > 0
+        self.has_dairy = a[:, 8] > 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def scores(self, calorie_target: int = 600, prioritize_protein: bool = True,
+               flags: List[str] = None) -> np.ndarray:
+        flags = flags or []
+        closeness = np.maximum(0.0, 1.0 - np.abs(self.kcal - calorie_target) / max(250, calorie_target))
+        conflict_pen = np.zeros(len(self.items))
+        if "low_carb" in flags: conflict_pen += 0.15 * self.has_starch
+        if "no_fried" in flags: conflict_pen += 0.2 * self.has_fried
+        if "gluten_mindful" in flags: conflict_pen += 0.1 * self.has_pasta
+        if "dairy_mindful" in flags: conflict_pen += 0.1 * self.has_dairy
+        protein_w = 0.6 if prioritize_protein else 0.35
+        target_w  = 0.4 if prioritize_protein else 0.55
+        score = (protein_w * self.prot_norm) + (target_w * closeness) - self.rich_pen - conflict_pen
+        return np.clip(score, 0.0, 1.0)
+
+    def score_matrix(self, contexts: List[Tuple[int, bool, Tuple[str, ...]]]) -> np.ndarray:
+        """scores() for many (calorie_target, prioritize_protein, flags) contexts at once; shape (P, N)."""
+        targets = np.array([c[0] for c in contexts], dtype=np.int64)[:, None]
+        pp = np.array([c[1] for c in contexts], dtype=bool)[:, None]
+        closeness = np.maximum(0.0, 1.0 - np.abs(self.kcal[None, :] - targets) / np.maximum(250, targets))
+        conflict_pen = np.zeros((len(contexts), len(self.items)))
+        for flag, pen in (("low_carb", 0.15 * self.has_starch), ("no_fried", 0.2 * self.has_fried),
+                          ("gluten_mindful", 0.1 * self.has_pasta), ("dairy_mindful", 0.1 * self.has_dairy)):
+            on = np.array([flag in c[2] for c in contexts], dtype=np.float64)[:, None]
+            conflict_pen += on * pen[None, :]
+        protein_w = np.where(pp, 0.6, 0.35)
+        target_w = np.where(pp, 0.4, 0.55)
+        score = (protein_w * self.prot_norm[None, :]) + (target_w * closeness) - self.rich_pen[None, :] - conflict_pen
+        return np.clip(score, 0.0, 1.0)
+
+def top_k_indices(scores: np.ndarray, k: int) -> List[int]:
+    """Indices of the k best scores, best first, ties in input order (like a stable sort)."""
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    if k < n:
+        kth = np.partition(scores, n - k)[n - k]
+        cand = np.flatnonzero(scores >= kth)
+    else:
+        cand = np.arange(n)
+    order = cand[np.lexsort((cand, -scores[cand]))]
+    return order[:k].tolist()
+
+def rank_features(feats: MenuFeatures, k: int, calorie_target: int = 600,
+                  prioritize_protein: bool = True, flags: List[str] = None) -> List[Dict[str,Any]]:
+    flags = flags or []
+    picks = []
+    for i in top_k_indices(feats.scores(calorie_target, prioritize_protein, flags), k):
+        it = feats.items[i]
+        sres = score_item(it.get("item_name",""), it.get("description",""), it.get("section",""),
+                          calorie_target, prioritize_protein, flags)
+        picks.append(_ranked_entry(it, sres))
+    return picks
+
+def _profile_key(p: Dict[str,Any]) -> Tuple[int, bool, Tuple[str, ...]]:
+    return (int(p.get("calorie_target", 600)), bool(p.get("prioritize_protein", True)),
+            tuple(sorted(set(p.get("flags") or []))))
+
+PROFILE_CHUNK = 256  # contexts scored per matrix, bounds memory at CHUNK x len(menu)
+
+def rank_profiles(items: List[Dict[str,Any]], profiles: List[Dict[str,Any]], k: int = 3) -> List[List[Dict[str,Any]]]:
+    """Top-k picks of one menu for each profile ({calorie_target, prioritize_protein, flags}).
+
+    Item features are computed once; distinct contexts are scored together as
+    a matrix and profiles sharing a context share the result.
+    """
+    keys = [_profile_key(p) for p in profiles]
+    if not items:
+        return [[] for _ in keys]
+    feats = MenuFeatures(items)
+    distinct = list(dict.fromkeys(keys))
+    ranked = {}
+    for start in range(0, len(distinct), PROFILE_CHUNK):
+        chunk = distinct[start:start + PROFILE_CHUNK]
+        for ctx, row in zip(chunk, feats.score_matrix(chunk)):
+            picks = []
+            for i in top_k_indices(row, k):
+                it = items[i]
+                sres = score_item(it.get("item_name",""), it.get("description",""), it.get("section",""),
+                                  ctx[0], ctx[1], list(ctx[2]))
+                picks.append(_ranked_entry(it, sres))
+            ranked[ctx] = picks
+    return [[dict(p) for p in ranked[key]] for key in keys]
+
+def rank_top_k(items: List[Dict[str,Any]], k: int, calorie_target: int = 600,
+               prioritize_protein: bool = True, flags: List[str] = None) -> List[Dict[str,Any]]:
+    """rank_items(...)[:k] without scoring dicts for the losers."""
+    if not items:
+        return []
+    return rank_features(MenuFeatures(items), k, calorie_target, prioritize_protein, flags)
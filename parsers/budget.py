@@ -0,0 +1,27 @@
+import time
+from typing import Callable, Optional
+
+class Budget:
+    """Time budget for a parse; extractors poll over() and stop early, keeping what they have.
+
+    Defaults to this thread's CPU time, so a busy server does not cut parses
+    short; pass clock=time.monotonic when the work happens in other processes.
+    Extractors that skip content for another reason (e.g. OCR refused or
+    failed) set `incomplete`; `partial` covers both, for callers deciding
+    how long to cache the result.
+    """
+
+    def __init__(self, seconds: Optional[float], clock: Callable[[], float] = time.thread_time):
+        self.clock = clock
+        self.deadline = clock() + seconds if seconds else None
+        self.exhausted = False
+        self.incomplete = False
+
+    def over(self) -> bool:
+        if not self.exhausted and self.deadline is not None and self.clock() > self.deadline:
+            self.exhausted = True
+        return self.exhausted
+
+    @property
+    def partial(self) -> bool:
+        return self.exhausted or self.incomplete
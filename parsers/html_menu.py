@@ -1,16 +1,178 @@
 from bs4 import BeautifulSoup
 from typing import List, Dict, Any
 import re
+import threading
+
+try:
+    from lxml import etree
+except ImportError:  # fall back to BeautifulSoup + html.parser
+    etree = None
+
+PARSER_VERSION = "2"  # bump when extract_items output changes (invalidates parsed-menu cache)
 
 SECTION_HINTS = ["starters","appetizer","mains","entrees","salads","pasta","pizza","sandwich","bowls","tacos","seafood","steak","sides"]
 
-def extract_items(html: str, base_url: str = "") -> List[Dict[str,Any]]:
+ITEM_CLASSES = ["menu-item", "dish", "item", "menu__item", "c-menu-item"]
+HEADINGS = ("h2","h3","h4")
+NAME_CLASS = re.compile("title|name")
+DESC_CLASS = re.compile("desc|description|body")
+SECTION_TAG = re.compile("section|div")
+
+def extract_items(html: str, base_url: str = "", budget=None) -> List[Dict[str,Any]]:
+    """Menu items found in a page. With a parsers.budget.Budget, extraction
+    stops once it is spent and the items found so far are returned."""
+    if etree is None:
+        return extract_items_bs4(html, base_url, budget)
+    return extract_items_lxml(html, base_url, budget)
+
+BUDGET_CHECK_EVERY = 256  # elements walked between budget checks
+
+def _over(budget) -> bool:
+    return budget is not None and budget.over()
+
+# ----------------- lxml engine -----------------
+# Same heuristics as extract_items_bs4, but the document is parsed once by
+# libxml2 (comments/PIs dropped, script/style/template removed) and walked
+# once: item containers, headings and the heading preceding every
+# div/section are all collected in that single document-order pass, so
+# there are no per-item find_previous walks.
+
+_local = threading.local()
+
+def _parser():
+    p = getattr(_local, "parser", None)
+    if p is None:
+        p = _local.parser = etree.HTMLParser(remove_comments=True, remove_pis=True, remove_blank_text=True, no_network=True)
+    return p
+
+def _parse(html):
+    if not html:
+        return None
+    try:
+        return etree.fromstring(html, _parser())
+    except ValueError:  # str with an XML encoding declaration
+        return etree.fromstring(html.encode("utf-8"), _parser())
+    except etree.XMLSyntaxError:
+        return None
+
+def _text(el, sep: str = " ") -> str:
+    """BeautifulSoup's get_text(sep, strip=True)."""
+    return sep.join(t for t in (s.strip() for s in el.itertext()) if t)
+
+def _classes(el) -> List[str]:
+    return (el.get("class") or "").split()
+
+def _first_desc(el, pred):
+    for d in el.iterdescendants():
+        if isinstance(d.tag, str) and pred(d):
+            return d
+    return None
+
+def _next_tag(el):
+    nxt = el.getnext()
+    while nxt is not None and not isinstance(nxt.tag, str):
+        nxt = nxt.getnext()
+    return nxt
+
+def extract_items_lxml(html: str, base_url: str = "", budget=None) -> List[Dict[str,Any]]:
+    root = _parse(html)
+    if root is None:
+        return []
+    etree.strip_elements(root, "script", "style", "template", with_tail=False)
+    body = root.find("body")
+    if body is None:
+        body = root
+
+    headings = []
+    candidates = []       # (element, matched item classes), document order
+    heading_before = {}   # div/section element -> last heading that starts before it
+    last_heading = None
+    item_classes = set(ITEM_CLASSES)
+    for n, el in enumerate(body.iter()):
+        if n % BUDGET_CHECK_EVERY == 0 and _over(budget):
+            break
+        tag = el.tag
+        if not isinstance(tag, str):
+            continue
+        if SECTION_TAG.search(tag):
+            heading_before[el] = last_heading
+        if tag in HEADINGS:
+            headings.append(el)
+            last_heading = el
+        cls = el.get("class")
+        if cls:
+            matched = item_classes.intersection(cls.split())
+            if matched:
+                candidates.append((el, matched))
+
+    items = []
+    resolved = {}
+    for cls in ITEM_CLASSES:
+        for el, matched in candidates:
+            if cls not in matched:
+                continue
+            if el not in resolved:
+                if _over(budget): break
+                name = _first_desc(el, lambda d: any(NAME_CLASS.search(c) for c in _classes(d)))
+                if name is None: name = _first_desc(el, lambda d: d.tag == "h3")
+                if name is None: name = _first_desc(el, lambda d: d.tag == "h4")
+                item = None
+                if name is not None:
+                    desc = _first_desc(el, lambda d: any(DESC_CLASS.search(c) for c in _classes(d)))
+                    section = None
+                    parent = next((a for a in el.iterancestors() if isinstance(a.tag, str) and SECTION_TAG.search(a.tag)), None)
+                    if parent is not None and heading_before.get(parent) is not None:
+                        section = _text(heading_before[parent], "")
+                    item = {
+                        "section": section or infer_section(_text(name, "")),
+                        "item_name": _text(name),
+                        "description": _text(desc) if desc is not None else "",
+                    }
+                resolved[el] = item
+            if resolved[el]:
+                items.append(dict(resolved[el]))
+
+    if len(items) < 8:
+        for h in headings:
+            if _over(budget): break
+            sec = _text(h, "")
+            nxt = _next_tag(h)
+            scans = 0
+            while nxt is not None and scans < 6:
+                scans += 1
+                if nxt.tag in ("ul","ol"):
+                    for li in nxt:
+                        if li.tag != "li": continue
+                        txt = _text(li)
+                        if len(txt) > 3:
+                            nm = txt.split(" - ")[0][:80]
+                            desc = txt[len(nm):].strip(" -·—:")
+                            items.append({"section": sec, "item_name": nm, "description": desc})
+                elif nxt.tag in ("p","div"):
+                    txt = _text(nxt)
+                    if len(txt) > 6 and len(txt.split()) >= 2:
+                        strong = _first_desc(nxt, lambda d: d.tag in ("strong","b"))
+                        if strong is not None:
+                            nm = _text(strong)
+                            desc = txt.replace(nm, "").strip(" -·—:")
+                        else:
+                            parts = txt.split(" - ", 1)
+                            nm, desc = (parts[0], parts[1]) if len(parts)==2 else (txt[:60], txt[60:])
+                        items.append({"section": sec, "item_name": nm, "description": desc})
+                nxt = _next_tag(nxt)
+
+    return _dedupe(items)
+
+# ----------------- BeautifulSoup engine -----------------
+
+def extract_items_bs4(html: str, base_url: str = "", budget=None) -> List[Dict[str,Any]]:
     soup = BeautifulSoup(html, "html.parser")
 
     # Try semantic menu item containers first
     items = []
     for sel in [".menu-item", ".dish", ".item", ".menu__item", ".c-menu-item"]:
         for el in soup.select(sel):
+            if _over(budget): break
             name = (el.find(class_=re.compile("title|name")) or el.find("h3") or el.find("h4"))
             desc = (el.find(class_=re.compile("desc|description|body")))
             section = None
@@ -31,6 +193,7 @@ def extract_items(html: str, base_url: str = "") -> List[Dict[str,Any]]:
     # Fallback: headings with following lis or ps
     if len(items) < 8:
         for h in soup.find_all(["h2","h3","h4"]):
+            if _over(budget): break
             sec = h.get_text(strip=True)
             nxt = h.find_next_sibling()
             bucket = []
@@ -59,6 +222,9 @@ def extract_items(html: str, base_url: str = "") -> List[Dict[str,Any]]:
                 nxt = nxt.find_next_sibling()
             items.extend(bucket)
 
+    return _dedupe(items)
+
+def _dedupe(items: List[Dict[str,Any]]) -> List[Dict[str,Any]]:
     # Deduplicate by name/section
     seen = set()
     uniq = []
@@ -67,7 +233,6 @@ def extract_items(html: str, base_url: str = "") -> List[Dict[str,Any]]:
         if key in seen: continue
         seen.add(key)
         uniq.append(it)
-
     return uniq
 
 def infer_section(text: str) -> str:
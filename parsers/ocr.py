@@ -0,0 +1,123 @@
+"""
+OCR for scanned (image-only) PDF pages.
+
+Pages are rendered with pypdfium2 (installed with pdfplumber) at a DPI
+chosen from the page size, and read by Tesseract (pytesseract) in a bounded
+process pool. OCR text is cached in the shared cache backend under a hash of
+the rendered pixels, so the same scan is only OCR'd once per host, whichever
+PDF it arrives in. A semaphore bounds the pages queued across all requests;
+when it is full new OCR work is refused instead of piling up.
+
+    python -m parsers.ocr samples/sample_menu.pdf
+"""
+
+import os, sys, time, hashlib, threading, multiprocessing
+from functools import lru_cache
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List
+
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", str(min(2, os.cpu_count() or 1))))  # 0 = run inline
+OCR_MAX_QUEUED = int(os.environ.get("OCR_MAX_QUEUED", "16"))   # pages pending across all requests
+OCR_PAGE_TIMEOUT = float(os.environ.get("OCR_PAGE_TIMEOUT", "30"))
+OCR_QUEUE_WAIT = 2.0        # seconds to wait for a queue slot before refusing
+OCR_CACHE_TTL = 90*24*3600
+OCR_DPI_MAX = 300
+OCR_DPI_MIN = 150
+OCR_MAX_PIXELS = 3500*3500  # tesseract gets slow (and no more accurate) beyond this
+OCR_LANG = os.environ.get("OCR_LANG", "eng")
+
+class OcrBusy(Exception):
+    pass
+
+@lru_cache(maxsize=1)
+def available() -> bool:
+    """True when the Python bindings import and the tesseract binary runs."""
+    try:
+        import pytesseract, pypdfium2  # noqa: F401
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+def adaptive_dpi(width_pt: float, height_pt: float) -> int:
+    """Highest DPI up to OCR_DPI_MAX whose render fits OCR_MAX_PIXELS (never below OCR_DPI_MIN)."""
+    area_in2 = max(1.0, (width_pt / 72.0) * (height_pt / 72.0))
+    dpi = int((OCR_MAX_PIXELS / area_in2) ** 0.5)
+    return max(OCR_DPI_MIN, min(OCR_DPI_MAX, dpi))
+
+_backend = None
+
+def _worker_backend():
+    global _backend
+    if _backend is None:
+        from cache import open_backend
+        _backend = open_backend()
+    return _backend
+
+def ocr_page(path: str, index: int, timeout: float = OCR_PAGE_TIMEOUT) -> List[str]:
+    """Render page `index` of the PDF at `path` and return its OCR text lines (runs in a worker)."""
+    import pypdfium2 as pdfium
+    import pytesseract
+    pdf = pdfium.PdfDocument(path)
+    try:
+        page = pdf[index]
+        dpi = adaptive_dpi(*page.get_size())
+        img = page.render(scale=dpi / 72.0, grayscale=True).to_pil()
+        page.close()
+    finally:
+        pdf.close()
+    key = hashlib.sha256(img.tobytes()).hexdigest() + f":{img.size[0]}x{img.size[1]}:{OCR_LANG}"
+    backend = _worker_backend()
+    cached = backend.get("ocr", key)
+    if cached is not None:
+        return cached
+    text = pytesseract.image_to_string(img, lang=OCR_LANG, timeout=timeout)
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    backend.set("ocr", key, lines, OCR_CACHE_TTL)
+    return lines
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(OCR_MAX_QUEUED)
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def submit(path: str, index: int) -> Future:
+    """Queue OCR of one page; raises OcrBusy when OCR_MAX_QUEUED pages are already pending.
+
+    The future's `deadline` (time.monotonic) is OCR_PAGE_TIMEOUT from now, so
+    time spent queued behind other pages counts towards the page's timeout.
+    """
+    deadline = time.monotonic() + OCR_PAGE_TIMEOUT
+    if not _slots.acquire(timeout=OCR_QUEUE_WAIT):
+        raise OcrBusy("OCR queue is full")
+    if OCR_WORKERS <= 0:
+        fut = Future()
+        try:
+            fut.set_result(ocr_page(path, index))
+        except Exception as e:
+            fut.set_exception(e)
+        finally:
+            _slots.release()
+        fut.deadline = deadline
+        return fut
+    try:
+        fut = _get_pool().submit(ocr_page, path, index)
+    except Exception:
+        _slots.release()
+        raise
+    fut.add_done_callback(lambda _: _slots.release())
+    fut.deadline = deadline
+    return fut
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from parsers.pdf_menu import extract_from_pdf_bytes
+    with open(sys.argv[1] if len(sys.argv) > 1 else "samples/sample_menu.pdf", "rb") as f:
+        for it in extract_from_pdf_bytes(f.read(), use_ocr=True):
+            print(f"[{it['section']}] {it['item_name']} - {it['description']}")
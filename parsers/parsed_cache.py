@@ -0,0 +1,63 @@
+import time, hashlib, threading
+from typing import Any, Callable, Dict, List, Optional
+
+from cache import TTLCache, CacheBackend
+
+class ParsedMenuCache:
+    """Content-addressed cache of extracted menu items.
+
+    Keyed by sha256 of the raw bytes plus the parser kind/version, so the same
+    page or PDF is parsed once no matter which URL, upload or ZIP search it
+    came from. Memory is bounded by TTLCache budgets; with a backend the
+    entries also spill to the shared on-disk store.
+    """
+
+    PARTIAL_TTL = 3600
+
+    def __init__(self, ttl_sec=30*24*3600, max_items=2048, max_bytes=64*1024*1024,
+                 backend: Optional[CacheBackend] = None):
+        self._cache = TTLCache(ttl_sec=ttl_sec, max_items=max_items, max_bytes=max_bytes,
+                               backend=backend, namespace="parsed")
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "partial": 0, "parse_sec": 0.0, "saved_sec": 0.0}
+
+    @staticmethod
+    def key(kind: str, version: str, raw: bytes) -> str:
+        return f"{kind}:{version}:{hashlib.sha256(raw).hexdigest()}"
+
+    def lookup(self, kind: str, version: str, raw: bytes) -> Optional[List[Dict[str, Any]]]:
+        hit = self._cache.get(self.key(kind, version, raw))
+        with self._lock:
+            if hit is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.stats["saved_sec"] += hit["parse_sec"]
+        return hit["items"]
+
+    def store(self, kind: str, version: str, raw: bytes, items: List[Dict[str, Any]], parse_sec: float,
+              partial: bool = False) -> None:
+        """`partial` results (parse budget ran out, OCR refused) are kept for PARTIAL_TTL only, then re-parsed."""
+        self._cache.set(self.key(kind, version, raw), {"items": items, "parse_sec": round(parse_sec, 6)},
+                        ttl=self.PARTIAL_TTL if partial else None)
+        with self._lock:
+            self.stats["parse_sec"] += parse_sec
+            if partial: self.stats["partial"] += 1
+
+    def get_or_parse(self, kind: str, version: str, raw: bytes, parse: Callable[[], List[Dict[str, Any]]],
+                     budget=None):
+        """Cached items, else parse(); pass the Budget parse() uses so partial results are marked."""
+        items = self.lookup(kind, version, raw)
+        if items is not None:
+            return items
+        t0 = time.perf_counter()
+        items = parse()
+        self.store(kind, version, raw, items, time.perf_counter() - t0, partial=bool(budget and budget.partial))
+        return items
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self.stats)
+        out["parse_sec"] = round(out["parse_sec"], 3)
+        out["saved_sec"] = round(out["saved_sec"], 3)
+        return {**out, "cache": self._cache.snapshot()}
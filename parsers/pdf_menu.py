@@ -1,40 +1,178 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
 import io
+import os
 import re
+import time
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 
-def extract_from_pdf_bytes(pdf_bytes: bytes, use_ocr: bool = False) -> List[Dict[str,Any]]:
-    items = []
+from metrics import count_error
+
+PARSER_VERSION = "3"  # bump when extract_from_pdf_bytes output changes (invalidates parsed-menu cache)
+
+PDF_MAX_PAGES = 20
+PDF_MAX_ITEMS = 200
+PDF_POOL_MIN_PAGES = int(os.environ.get("PDF_POOL_MIN_PAGES", "8"))  # smaller PDFs are read in-process
+PDF_POOL_WORKERS = int(os.environ.get("PDF_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = 2
+
+_pool = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    # spawn: the Flask process is multi-threaded, forking it is not safe
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PDF_POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def _page_lines(page) -> List[str]:
+    text = page.extract_text() or ""
+    page.close()  # drop pdfplumber's per-page object cache, keeps memory flat
+    return [ln.strip() for ln in text.splitlines() if ln.strip()]
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[List[str]]:
+    """Process-pool task: text lines of pages [start, stop) of the PDF at `path`."""
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return [_page_lines(p) for p in pdf.pages[start:stop]]
+
+def iter_page_lines(pdf_bytes: bytes, max_pages: int = PDF_MAX_PAGES) -> Iterator[Tuple[int, List[str]]]:
+    """Yield (page_index, lines) in page order.
+
+    Large PDFs are split into small page ranges read in a process pool;
+    results are still yielded in order as soon as each range is done.
+    Closing the generator early cancels ranges that have not started.
+    """
     try:
         import pdfplumber
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            lines = []
-            for page in pdf.pages[:20]:
-                text = page.extract_text() or ""
-                for ln in text.splitlines():
-                    ln = ln.strip()
-                    if ln:
-                        lines.append(ln)
-    except Exception:
-        lines = []
-
-    if not lines and use_ocr:
+        pdf = pdfplumber.open(io.BytesIO(pdf_bytes))
+    except Exception as e:
+        count_error("pdf_open", e)
+        return
+    with pdf:
+        n = min(len(pdf.pages), max_pages)
+        if n < PDF_POOL_MIN_PAGES or PDF_POOL_WORKERS <= 1:
+            for i in range(n):
+                try:
+                    lines = _page_lines(pdf.pages[i])
+                except Exception as e:
+                    count_error("pdf_page", e)
+                    return
+                yield i, lines
+            return
+    # Workers re-open the document from a temp file instead of receiving the bytes per task.
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+        tmp.write(pdf_bytes)
+        tmp.flush()
+        futs = [_get_pool().submit(_extract_page_range, tmp.name, s, min(s + PDF_PAGES_PER_TASK, n))
+                for s in range(0, n, PDF_PAGES_PER_TASK)]
         try:
-            from PIL import Image
-            import pdf2image  # optional if available
-        except Exception:
-            pass
+            page = 0
+            for f in futs:
+                try:
+                    chunk = f.result()
+                except Exception as e:
+                    count_error("pdf_page", e)
+                    return
+                for lines in chunk:
+                    yield page, lines
+                    page += 1
+        finally:
+            for f in futs:
+                f.cancel()
 
+def _with_ocr(pages, pdf_bytes: bytes, budget=None) -> Iterator[Tuple[int, List[str]]]:
+    """Pass (page, lines) through, OCR'ing pages that have no text layer.
+
+    OCR runs in the background while later pages are read; pages are still
+    yielded in order. If OCR is unavailable, busy or fails, the page stays
+    empty and `budget.incomplete` is set so the result is not cached as final.
+    """
+    from parsers import ocr
+    if not ocr.available():
+        yield from pages
+        return
+    tmp = None
+    pending = deque()  # (page, lines or Future)
+    try:
+        for page, lines in pages:
+            if not lines:
+                if tmp is None:
+                    tmp = tempfile.NamedTemporaryFile(suffix=".pdf")
+                    tmp.write(pdf_bytes)
+                    tmp.flush()
+                try:
+                    lines = ocr.submit(tmp.name, page)
+                except ocr.OcrBusy as e:
+                    count_error("ocr_page", e)
+                    if budget is not None: budget.incomplete = True
+                    lines = []
+            pending.append((page, lines))
+            # keep at most a few OCR pages in flight per document
+            while pending and (not isinstance(pending[0][1], Future)
+                               or sum(isinstance(l, Future) for _, l in pending) > max(1, ocr.OCR_WORKERS)):
+                yield _resolved(pending.popleft(), budget)
+        while pending:
+            yield _resolved(pending.popleft(), budget)
+    finally:
+        for _, l in pending:
+            if isinstance(l, Future): l.cancel()
+        if tmp is not None: tmp.close()
+
+def _resolved(entry, budget=None) -> Tuple[int, List[str]]:
+    from parsers import ocr
+    page, lines = entry
+    if isinstance(lines, Future):
+        fut = lines
+        try:
+            # the page's timeout runs from ocr.submit(), not from here
+            lines = fut.result(timeout=max(0.0, getattr(fut, "deadline", time.monotonic() + ocr.OCR_PAGE_TIMEOUT) - time.monotonic()))
+        except Exception as e:
+            fut.cancel()  # still queued: give its worker slot back
+            count_error("ocr_page", e)
+            if budget is not None: budget.incomplete = True
+            lines = []
+    return page, lines
+
+def _is_header(ln: str) -> bool:
     # Grouping: a header is ALL CAPS or Title Case short-ish line
+    return bool((ln.isupper() and len(ln) <= 40) or (re.match(r"^[A-Z][a-z]+(?: [A-Z][a-z]+){0,4}$", ln) and len(ln) <= 50))
+
+def iter_page_items(pdf_bytes: bytes, use_ocr: bool = False, max_items: int = PDF_MAX_ITEMS,
+                    budget=None) -> Iterator[Tuple[int, List[Dict[str,Any]]]]:
+    """Yield (page_index, items found on that page), stopping at max_items.
+
+    The current section carries over from one page to the next, exactly as
+    when all lines are grouped at once. Callers may stop iterating early.
+    With a parsers.budget.Budget, no further pages are read once it is spent.
+    """
     section = ""
-    for ln in lines:
-        is_header = (ln.isupper() and len(ln) <= 40) or (re.match(r"^[A-Z][a-z]+(?: [A-Z][a-z]+){0,4}$", ln) and len(ln) <= 50)
-        if is_header:
-            section = ln.title()
-            continue
-        # Treat as potential item: first sentence up to ' - ' or end
-        if len(ln) >= 6:
-            parts = ln.split(" - ", 1)
-            name = parts[0][:80]
-            desc = parts[1] if len(parts)==2 else ""
-            items.append({"section": section, "item_name": name, "description": desc})
-    return items[:200]
+    total = 0
+    pages = iter_page_lines(pdf_bytes)
+    if use_ocr:
+        pages = _with_ocr(pages, pdf_bytes, budget)
+    for page, lines in pages:
+        items = []
+        for ln in lines:
+            if _is_header(ln):
+                section = ln.title()
+                continue
+            # Treat as potential item: first sentence up to ' - ' or end
+            if len(ln) >= 6:
+                parts = ln.split(" - ", 1)
+                name = parts[0][:80]
+                desc = parts[1] if len(parts)==2 else ""
+                items.append({"section": section, "item_name": name, "description": desc})
+        items = items[:max_items - total]
+        total += len(items)
+        yield page, items
+        if total >= max_items or (budget is not None and budget.over()):
+            return
+
+def extract_from_pdf_bytes(pdf_bytes: bytes, use_ocr: bool = False, budget=None) -> List[Dict[str,Any]]:
+    items = []
+    for _, page_items in iter_page_items(pdf_bytes, use_ocr=use_ocr, budget=budget):
+        items.extend(page_items)
+    return items
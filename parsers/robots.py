@@ -1,19 +1,200 @@
+import os, time, json, sqlite3, threading
+import email.utils
 import urllib.parse as urlparse
-import requests
 import urllib.robotparser as robotparser
 
+import http_client
+from cache import TTLCache
+from metrics import count_error, span
+from scheduler import scheduler, SLOT_WAIT_SEC
+
 UA = "FineDiningCoach/1.0 (contact: demo@example.com)"
 
-def is_allowed(url: str) -> bool:
+ROBOTS_DEFAULT_TTL = 24*3600   # when the server sends no caching headers
+ROBOTS_MIN_TTL = 5*60
+ROBOTS_MAX_TTL = 7*24*3600
+ROBOTS_ERROR_TTL = 10*60       # fetch failures (treated as disallow)
+ROBOTS_CACHE_PATH = os.environ.get("ROBOTS_CACHE_PATH", "")  # optional sqlite file
+ROBOTS_MEM_ITEMS = 4096
+ROBOTS_FETCH_TIMEOUT = 8
+# a fetch may first wait for its scheduler slot (rate limit, Crawl-delay), then try HTTP_RETRIES + 1 times
+ROBOTS_LEADER_WAIT = SLOT_WAIT_SEC + (http_client.HTTP_RETRIES + 1) * ROBOTS_FETCH_TIMEOUT + 5
+
+class _Entry:
+    __slots__ = ("rp", "expires", "ok")
+
+    def __init__(self, rp, expires, ok):
+        self.rp = rp            # RobotFileParser, or None when the fetch failed
+        self.expires = expires  # wall-clock seconds, so persisted entries survive restarts
+        self.ok = ok
+
+def _parser(lines):
+    rp = robotparser.RobotFileParser()
+    rp.parse(lines)
+    return rp
+
+def _delay(v):
     try:
-        parts = urlparse.urlsplit(url)
-        robots_url = f"{parts.scheme}://{parts.netloc}/robots.txt"
-        rp = robotparser.RobotFileParser()
-        r = requests.get(robots_url, headers={"User-Agent": UA}, timeout=8)
-        if r.status_code >= 400:
-            rp.parse([])
-        else:
-            rp.parse(r.text.splitlines())
-        return rp.can_fetch(UA, url)
-    except Exception:
-        return False
+        return float(v) if v else None
+    except (TypeError, ValueError):
+        return None
+
+def _ttl_from_headers(headers) -> int:
+    cc = (headers.get("Cache-Control") or "").lower()
+    ttl = None
+    if "no-store" in cc or "no-cache" in cc:
+        ttl = ROBOTS_MIN_TTL
+    else:
+        for part in cc.split(","):
+            k, _, v = part.strip().partition("=")
+            if k == "max-age" and v.strip().isdigit():
+                ttl = int(v.strip())
+        if ttl is None and headers.get("Expires"):
+            try:
+                ttl = int(email.utils.parsedate_to_datetime(headers["Expires"]).timestamp() - time.time())
+            except Exception:
+                ttl = None
+    if ttl is None:
+        ttl = ROBOTS_DEFAULT_TTL
+    return max(ROBOTS_MIN_TTL, min(ROBOTS_MAX_TTL, ttl))
+
+class RobotsCache:
+    """Per-host (scheme+netloc) cache of parsed robots.txt.
+
+    Lookups for a host that is already being fetched wait for that fetch
+    instead of issuing their own (if it outlasts ROBOTS_LEADER_WAIT anyway,
+    they refuse, as for a failed fetch). Failed fetches are cached (as
+    disallow) for ROBOTS_ERROR_TTL. At most ROBOTS_MEM_ITEMS hosts are kept
+    in memory (least recently used dropped first). With `path` set, raw robots.txt bodies are also kept in
+    a small sqlite table so a restarted process starts warm.
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mem = TTLCache(ttl_sec=ROBOTS_DEFAULT_TTL, max_items=ROBOTS_MEM_ITEMS)
+        self._inflight = {}
+        self.stats = {"hits": 0, "misses": 0, "disk_hits": 0, "fetches": 0, "fetch_errors": 0, "coalesced": 0}
+        if path:
+            with self._db() as db:
+                db.execute("CREATE TABLE IF NOT EXISTS robots (host TEXT PRIMARY KEY, body TEXT, ok INTEGER, expires REAL)")
+
+    def _db(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _load(self, host):
+        if not self.path: return None
+        try:
+            with self._db() as db:
+                row = db.execute("SELECT body, ok, expires FROM robots WHERE host=?", (host,)).fetchone()
+        except sqlite3.Error:
+            return None
+        if not row or row[2] <= time.time(): return None
+        body, ok, expires = row
+        return _Entry(_parser(json.loads(body)) if ok else None, expires, bool(ok))
+
+    def _save(self, host, lines, ent):
+        if not self.path: return
+        try:
+            with self._db() as db:
+                db.execute("INSERT OR REPLACE INTO robots VALUES (?,?,?,?)",
+                           (host, json.dumps(lines), int(ent.ok), ent.expires))
+        except sqlite3.Error:
+            pass
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _fetch(self, host) -> _Entry:
+        self._count("fetches")
+        lines = []
+        try:
+            r = http_client.get(f"{host}/robots.txt", headers={"User-Agent": UA}, timeout=ROBOTS_FETCH_TIMEOUT, max_bytes=512*1024)
+            if r.status_code < 400:
+                lines = r.text.splitlines()
+            ent = _Entry(_parser(lines), time.time() + _ttl_from_headers(r.headers), True)
+        except Exception as e:
+            count_error("robots_fetch", e)
+            self._count("fetch_errors")
+            ent = _Entry(None, time.time() + ROBOTS_ERROR_TTL, False)
+        self._save(host, lines, ent)
+        return ent
+
+    def entry(self, host: str) -> _Entry:
+        with self._lock:
+            ent = self._mem.get(host)
+            if ent and ent.expires > time.time():
+                self.stats["hits"] += 1
+                return ent
+            ev = self._inflight.get(host)
+            leader = ev is None
+            if leader:
+                ev = self._inflight[host] = threading.Event()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            ev.wait(ROBOTS_LEADER_WAIT)
+            with self._lock:
+                ent = self._mem.get(host)
+            return ent or _Entry(None, 0, False)  # robots.txt not read yet: refuse, as for a failed fetch
+        try:
+            ent = self._load(host)
+            if ent:
+                self._count("disk_hits")
+            else:
+                ent = self._fetch(host)
+            if ent.ok:
+                scheduler.set_crawl_delay(urlparse.urlsplit(host).hostname or "", _delay(ent.rp.crawl_delay(UA)))
+            with self._lock:
+                self._mem.set(host, ent, max(1.0, ent.expires - time.time()))
+            return ent
+        finally:
+            with self._lock:
+                self._inflight.pop(host, None)
+            ev.set()
+
+    def is_allowed(self, url: str) -> bool:
+        try:
+            ent = self.entry(host_key(url))
+            return bool(ent.ok and ent.rp.can_fetch(UA, url))
+        except Exception as e:
+            count_error("robots_check", e)
+            return False
+
+    def crawl_delay(self, url: str):
+        """Crawl-delay for our UA in seconds, or None."""
+        try:
+            ent = self.entry(host_key(url))
+            return ent.rp.crawl_delay(UA) if ent.ok else None
+        except Exception:
+            return None
+
+    def site_maps(self, url: str) -> list:
+        """Sitemap URLs listed in the host's robots.txt."""
+        try:
+            ent = self.entry(host_key(url))
+            return (ent.rp.site_maps() or []) if ent.ok else []
+        except Exception:
+            return []
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "hosts": len(self._mem)}
+
+def host_key(url: str) -> str:
+    parts = urlparse.urlsplit(url)
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+
+robots_cache = RobotsCache(ROBOTS_CACHE_PATH)
+
+def is_allowed(url: str) -> bool:
+    with span("robots"):
+        return robots_cache.is_allowed(url)
+
+def crawl_delay(url: str):
+    return robots_cache.crawl_delay(url)
+
+def site_maps(url: str) -> list:
+    return robots_cache.site_maps(url)
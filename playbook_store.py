@@ -0,0 +1,119 @@
+"""
+Chain and cuisine playbooks, loaded once and kept in memory.
+
+The JSON files are re-read only when their mtime changes. Chain names are
+matched on a normalized form so "Applebees", "APPLEBEE'S" and "Applebee's"
+all hit the same playbook. Ranked picks are precomputed at load time for
+the common calorie-target/flag combinations and memoized for the rest.
+"""
+
+import os, re, json, time, threading
+from itertools import product
+from typing import Any, Dict, List, Optional
+
+from cache import TTLCache
+from nutrition_rules import rank_top_k
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+DEFAULT_PICK = {"section": "Playbook", "item_name": "Grilled chicken + veg, starch half portion",
+                "description": "Ask for sauce on side"}
+
+# Contexts precomputed at load time (the UI's defaults and its two toggles).
+COMMON_TARGETS = [400, 500, 600, 700, 800]
+COMMON_FLAGS = [(), ("low_carb",), ("no_fried",), ("low_carb", "no_fried")]
+
+RELOAD_CHECK_SEC = 2.0
+
+def normalize_name(name: str) -> str:
+    """Case-, punctuation- and possessive-insensitive key: "Applebee's" -> "applebees"."""
+    s = (name or "").lower().replace("&", " and ")
+    s = re.sub(r"['’`]", "", s)
+    return re.sub(r"[^a-z0-9]+", " ", s).strip()
+
+def _ctx_key(ctx) -> tuple:
+    return (int(ctx.get("calorie_target", 600)), bool(ctx.get("prioritize_protein", True)),
+            tuple(sorted(set(ctx.get("flags") or []))))
+
+class PlaybookStore:
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.paths = {"chains": os.path.join(data_dir, "chain_playbooks.json"),
+                      "cuisines": os.path.join(data_dir, "cuisine_playbooks.json")}
+        self._lock = threading.Lock()
+        self._mtimes = {}
+        self._checked = 0.0
+        self.chains = {}    # normalized chain name -> items
+        self.cuisines = {}  # cuisine -> items
+        self._picks = TTLCache(ttl_sec=365*24*3600, max_items=8192)
+        self.loads = 0
+
+    def _current_mtimes(self) -> Dict[str, float]:
+        return {k: os.stat(p).st_mtime for k, p in self.paths.items()}
+
+    def _load(self, mtimes) -> None:
+        with open(self.paths["chains"], "r") as f:
+            chains = json.load(f)
+        with open(self.paths["cuisines"], "r") as f:
+            cuisines = json.load(f)
+        self.chains = {normalize_name(k): _as_items(v) for k, v in chains.items()}
+        self.cuisines = {k.strip().lower(): _as_items(v) for k, v in cuisines.items()}
+        self._picks = TTLCache(ttl_sec=365*24*3600, max_items=8192)
+        self._mtimes = mtimes
+        self.loads += 1
+        self._precompute()
+
+    def _precompute(self) -> None:
+        playbooks = [("chain", k) for k in self.chains] + [("cuisine", k) for k in self.cuisines] + [("default", "")]
+        for (kind, key), target, pp, flags in product(playbooks, COMMON_TARGETS, (True, False), COMMON_FLAGS):
+            self._ranked(kind, key, (target, pp, flags))
+
+    def ensure_fresh(self) -> None:
+        """Reload if either file changed (checked at most every RELOAD_CHECK_SEC)."""
+        now = time.monotonic()
+        if self._mtimes and now - self._checked < RELOAD_CHECK_SEC:
+            return
+        with self._lock:
+            self._checked = now
+            try:
+                mtimes = self._current_mtimes()
+            except OSError:
+                return
+            if mtimes != self._mtimes:
+                self._load(mtimes)
+
+    def lookup(self, name: str, cuisines: Optional[List[str]]):
+        """(kind, key) of the playbook to use: chain match first, then first known cuisine."""
+        self.ensure_fresh()
+        n = normalize_name(name)
+        if n in self.chains:
+            return "chain", n
+        for c in cuisines or []:
+            c = c.strip().lower()
+            if c in self.cuisines:
+                return "cuisine", c
+        return "default", ""
+
+    def items(self, kind: str, key: str) -> List[Dict[str, Any]]:
+        if kind == "chain": return self.chains.get(key, [])
+        if kind == "cuisine": return self.cuisines.get(key, [])
+        return [DEFAULT_PICK]
+
+    def _ranked(self, kind, key, ck):
+        cache_key = (kind, key) + ck
+        ranked = self._picks.get(cache_key)
+        if ranked is None:
+            target, pp, flags = ck
+            ranked = rank_top_k(self.items(kind, key), 3, target, pp, list(flags))
+            self._picks.set(cache_key, ranked)
+        return ranked
+
+    def picks(self, name: str, cuisines: Optional[List[str]], ctx) -> List[Dict[str, Any]]:
+        """Top-3 ranked playbook picks for a restaurant under `ctx`."""
+        kind, key = self.lookup(name, cuisines)
+        return [dict(p) for p in self._ranked(kind, key, _ctx_key(ctx))]
+
+def _as_items(picks) -> List[Dict[str, Any]]:
+    return [{"section": p.get("section", "Playbook"), "item_name": p["item_name"],
+             "description": p.get("description", "")} for p in picks] or [DEFAULT_PICK]
+
+playbooks = PlaybookStore()
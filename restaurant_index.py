@@ -0,0 +1,217 @@
+"""
+Local spatial index of restaurants, refreshed tile by tile from Overpass.
+
+The map is cut into a fixed grid of TILE_DEG x TILE_DEG tiles. A radius query
+looks up the tiles covering its bounding box, computes distances for all
+their restaurants at once with numpy, and returns the nearest ones. Tiles
+are shared by every overlapping search and are kept in the shared cache
+backend, so Overpass is only asked for tiles that are missing or older than
+TILE_FRESH_SEC, in bounding-box queries of at most REFRESH_GROUP x
+REFRESH_GROUP tiles (a group whose query hits the element limit is re-queried
+tile by tile). If Overpass is down, stale tiles are served as they are.
+
+Seed the index from an extract (Overpass JSON or GeoJSON points):
+
+    python -m restaurant_index import restaurants.json
+"""
+
+import os, sys, json, math, time, threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from cache import TTLCache, open_backend
+from integrations.osm import BboxTruncated, overpass_bbox, place_from_element
+
+TILE_DEG = 0.1                   # ~7 x 5 miles at US latitudes
+TILE_FRESH_SEC = float(os.environ.get("TILE_FRESH_SEC", str(7*24*3600)))
+TILE_KEEP_SEC = 90*24*3600       # stale tiles are still served when a refresh fails
+TILE_MEM_ITEMS = 4096
+MAX_RADIUS_MI = 15.0             # the UI's maximum; bounds the tiles one search can cover
+REFRESH_GROUP = 3                # tiles per side of one Overpass query (~20 x 15 miles)
+EARTH_RADIUS_MI = 3958.8
+
+def tile_of(lat: float, lon: float):
+    return int(math.floor(lat / TILE_DEG)), int(math.floor(lon / TILE_DEG))
+
+def _tile_key(t) -> str:
+    return f"{t[0]}:{t[1]}"
+
+def haversine_mi(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Distances in miles from one point to arrays of points (degrees)."""
+    p1, p2 = math.radians(lat), np.radians(lats)
+    a = np.sin((p2 - p1) / 2)**2 + math.cos(p1) * np.cos(p2) * np.sin(np.radians(lons - lon) / 2)**2
+    return 2 * EARTH_RADIUS_MI * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+class Tile:
+    __slots__ = ("places", "lats", "lons", "fetched")
+
+    def __init__(self, places: List[Dict[str, Any]], fetched: float):
+        self.places = places
+        self.lats = np.array([p["lat"] for p in places], dtype=np.float64)
+        self.lons = np.array([p["lon"] for p in places], dtype=np.float64)
+        self.fetched = fetched
+
+    def fresh(self, now: float) -> bool:
+        return now - self.fetched < TILE_FRESH_SEC
+
+class RestaurantIndex:
+    def __init__(self, backend=None, fetch=overpass_bbox):
+        self.backend = backend if backend is not None else open_backend()
+        self.fetch = fetch
+        self._tiles = TTLCache(ttl_sec=TILE_KEEP_SEC, max_items=TILE_MEM_ITEMS)
+        self._refresh_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.metrics = {"queries": 0, "tile_hits": 0, "tile_loads": 0, "refreshes": 0, "refreshed_tiles": 0,
+                        "refresh_errors": 0, "truncated": 0, "stale_served": 0}
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.metrics[name] += n
+
+    def _tile(self, t, from_store: bool = False) -> Optional[Tile]:
+        tile = None if from_store else self._tiles.get(t)
+        if tile is not None:
+            self._count("tile_hits")
+            return tile
+        stored = self.backend.get("tile", _tile_key(t))
+        if stored is None:
+            return None
+        tile = Tile(stored["places"], stored["fetched"])
+        self._tiles.set(t, tile)
+        self._count("tile_loads")
+        return tile
+
+    def _put(self, t, places, fetched: float) -> None:
+        self._tiles.set(t, Tile(places, fetched))
+        self.backend.set("tile", _tile_key(t), {"places": places, "fetched": fetched}, TILE_KEEP_SEC)
+
+    def add_places(self, places: List[Dict[str, Any]], fetched: Optional[float] = None) -> int:
+        """Replace the tiles covered by `places` with them (e.g. from an extract); returns tiles written."""
+        by_tile = {}
+        for p in places:
+            by_tile.setdefault(tile_of(p["lat"], p["lon"]), []).append(p)
+        fetched = time.time() if fetched is None else fetched
+        for t, ps in by_tile.items():
+            self._put(t, ps, fetched)
+        return len(by_tile)
+
+    def _refresh(self, tiles) -> None:
+        """One Overpass query for the rectangle spanning `tiles` (one group); every tile in it is rewritten."""
+        i0, i1 = min(t[0] for t in tiles), max(t[0] for t in tiles)
+        j0, j1 = min(t[1] for t in tiles), max(t[1] for t in tiles)
+        by_tile = {(i, j): [] for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)}
+        fetched = time.time()
+        try:
+            places = self.fetch(i0 * TILE_DEG, j0 * TILE_DEG, (i1 + 1) * TILE_DEG, (j1 + 1) * TILE_DEG)
+        except BboxTruncated as e:
+            self._count("truncated")
+            if len(by_tile) > 1:
+                for t in by_tile:
+                    self._refresh([t])
+                return
+            # even one tile is over the limit: keep what came back, but never fresh, so it is retried
+            places, fetched = e.places, 0.0
+        for p in places:
+            t = tile_of(p["lat"], p["lon"])
+            if t in by_tile: by_tile[t].append(p)
+        for t, ps in by_tile.items():
+            self._put(t, ps, fetched)
+        self._count("refreshes")
+        self._count("refreshed_tiles", len(by_tile))
+
+    @staticmethod
+    def _groups(tiles) -> List[list]:
+        # blocks anchored at the stale tiles' corner, so a search covering up to 3x3 tiles is one query
+        if not tiles:
+            return []
+        i0, j0 = min(t[0] for t in tiles), min(t[1] for t in tiles)
+        groups = {}
+        for t in tiles:
+            groups.setdefault(((t[0] - i0) // REFRESH_GROUP, (t[1] - j0) // REFRESH_GROUP), []).append(t)
+        return list(groups.values())
+
+    def _covering(self, lat: float, lon: float, radius_mi: float):
+        dlat = radius_mi / 69.0
+        dlon = radius_mi / max(1e-6, 69.0 * math.cos(math.radians(lat)))
+        (i0, j0), (i1, j1) = tile_of(lat - dlat, lon - dlon), tile_of(lat + dlat, lon + dlon)
+        return [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+
+    def nearby(self, lat: float, lon: float, radius_mi: float = 3.0, limit: int = 25) -> List[Dict[str, Any]]:
+        """Restaurants within radius_mi, nearest first, each with distance_mi.
+
+        Raises the Overpass error only when some tile was never fetched and
+        nothing at all is known for the area.
+        """
+        self._count("queries")
+        radius_mi = min(radius_mi, MAX_RADIUS_MI)
+        covering = self._covering(lat, lon, radius_mi)
+        now = time.time()
+        tiles = {t: self._tile(t) for t in covering}
+        stale = [t for t, tile in tiles.items() if tile is None or not tile.fresh(now)]
+        error = None
+        for group in self._groups(stale):
+            # one refresh at a time: Overpass allows very few concurrent queries per client.
+            # The lock is taken per group so other searches are not held up by a large one.
+            with self._refresh_lock:
+                # another request (or worker process) may have refreshed them meanwhile
+                tiles.update({t: self._tile(t, from_store=True) or tiles[t] for t in group})
+                group = [t for t in group if tiles[t] is None or not tiles[t].fresh(now)]
+                if not group:
+                    continue
+                try:
+                    self._refresh(group)
+                    tiles.update({t: self._tile(t) for t in group})
+                except Exception as e:
+                    self._count("refresh_errors")
+                    error = e
+                    break  # Overpass is failing; do not spend its timeout once per group
+        if error is not None:
+            if all(tile is None for tile in tiles.values()):
+                raise error
+            self._count("stale_served")
+        tiles = [tile for tile in tiles.values() if tile is not None and tile.places]
+        if not tiles:
+            return []
+        lats = np.concatenate([tile.lats for tile in tiles])
+        lons = np.concatenate([tile.lons for tile in tiles])
+        dist = haversine_mi(lat, lon, lats, lons)
+        inside = np.flatnonzero(dist <= radius_mi)
+        nearest = inside[np.argsort(dist[inside], kind="stable")[:limit]]
+        offsets = np.cumsum([0] + [len(tile.places) for tile in tiles])
+        out = []
+        for idx in nearest:
+            k = int(np.searchsorted(offsets, idx, side="right")) - 1
+            out.append({**tiles[k].places[idx - offsets[k]], "distance_mi": float(dist[idx])})
+        return out
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.metrics, "tiles_in_memory": len(self._tiles)}
+
+def _places_from_extract(data) -> List[Dict[str, Any]]:
+    if "elements" in data:  # Overpass JSON
+        return [p for p in map(place_from_element, data["elements"]) if p]
+    places = []
+    for f in data.get("features", []):  # GeoJSON, e.g. from `osmium export`
+        props, geom = f.get("properties") or {}, f.get("geometry") or {}
+        if props.get("amenity", "restaurant") != "restaurant": continue
+        coords = geom.get("coordinates")
+        if geom.get("type") != "Point":
+            ring = coords[0] if geom.get("type") == "Polygon" else None
+            if not ring: continue
+            coords = [sum(c[0] for c in ring) / len(ring), sum(c[1] for c in ring) / len(ring)]
+        p = place_from_element({"tags": props, "lon": coords[0], "lat": coords[1]})
+        if p:
+            p["id"] = str(props.get("@id") or f.get("id") or f"{coords[1]:.6f},{coords[0]:.6f}")
+            places.append(p)
+    return places
+
+restaurant_index = RestaurantIndex()
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "import":
+        sys.exit("usage: python -m restaurant_index import <overpass.json|restaurants.geojson>")
+    with open(sys.argv[2], "r") as f:
+        places = _places_from_extract(json.load(f))
+    print(f"{len(places)} restaurants -> {restaurant_index.add_places(places)} tiles")
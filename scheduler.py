@@ -0,0 +1,208 @@
+"""
+Per-host politeness for all outbound HTTP.
+
+Every request made through http_client takes a slot here first. Each host
+has a token bucket (HOST_RATE requests/s in bursts of up to HOST_BURST,
+slowed further by its robots.txt Crawl-delay) and at most HOST_CONCURRENCY
+requests in flight; all hosts together have at most HTTP_MAX_INFLIGHT.
+When capacity frees up, hosts with waiting requests are served round-robin
+so one busy host cannot starve the rest. A host that keeps timing out trips
+a circuit breaker: it is failed fast for BREAKER_COOLDOWN_SEC, then one
+trial request decides whether it is back. 429/503 Retry-After pauses a host.
+
+Limits are per process.
+"""
+
+import os, time, threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+HTTP_MAX_INFLIGHT = int(os.environ.get("HTTP_MAX_INFLIGHT", "48"))
+HOST_RATE = float(os.environ.get("HOST_RATE", "4"))     # requests per second per host
+HOST_BURST = int(os.environ.get("HOST_BURST", "8"))
+HOST_CONCURRENCY = int(os.environ.get("HOST_CONCURRENCY", "4"))
+SLOT_WAIT_SEC = float(os.environ.get("SLOT_WAIT_SEC", "30"))  # give up waiting for a slot after this
+BREAKER_FAILURES = 5          # consecutive timeouts / connection errors
+BREAKER_COOLDOWN_SEC = 60
+RETRY_AFTER_MAX_SEC = 60
+MAX_TRACKED_HOSTS = 10000
+
+# Hosts with published usage policies.
+HOST_POLICIES = {
+    "nominatim.openstreetmap.org": {"rate": 1.0, "burst": 1, "concurrency": 1},  # max 1 req/s
+    "overpass-api.de": {"rate": 0.5, "burst": 2, "concurrency": 2},              # 2 slots per client
+}
+
+class HostUnavailable(Exception):
+    """The host's circuit breaker is open."""
+
+class SlotTimeout(Exception):
+    """No request slot for the host within SLOT_WAIT_SEC."""
+
+class _Host:
+    __slots__ = ("rate", "burst", "limit", "tokens", "stamp", "inflight", "waiters",
+                 "fails", "open_until", "probing", "not_before", "crawl_delay")
+
+    def __init__(self, rate, burst, limit, now):
+        self.rate, self.burst, self.limit = rate, burst, limit
+        self.tokens, self.stamp = float(burst), now
+        self.inflight = 0
+        self.waiters = deque()
+        self.fails = 0
+        self.open_until = 0.0
+        self.probing = False    # half-open trial request in flight
+        self.not_before = 0.0   # Retry-After pause
+        self.crawl_delay = None
+
+class _Ticket:
+    __slots__ = ("granted",)
+
+    def __init__(self):
+        self.granted = False
+
+class Scheduler:
+    def __init__(self, max_inflight: int = HTTP_MAX_INFLIGHT, rate: float = HOST_RATE, burst: int = HOST_BURST,
+                 concurrency: int = HOST_CONCURRENCY, policies: Optional[Dict[str, dict]] = None):
+        self.max_inflight = max_inflight
+        self.defaults = {"rate": rate, "burst": burst, "concurrency": concurrency}
+        self.policies = HOST_POLICIES if policies is None else policies
+        self._cond = threading.Condition()
+        self._hosts = {}
+        self._ready = OrderedDict()  # hosts with waiters, in round-robin order
+        self.inflight = 0
+        self.stats = {"granted": 0, "waited": 0, "wait_sec": 0.0, "slot_timeouts": 0,
+                      "breaker_rejects": 0, "breaker_trips": 0, "retry_after_pauses": 0}
+
+    def _host(self, name: str) -> _Host:
+        h = self._hosts.get(name)
+        if h is None:
+            if len(self._hosts) >= MAX_TRACKED_HOSTS:
+                self._prune(time.monotonic())
+            p = {**self.defaults, **self.policies.get(name, {})}
+            h = self._hosts[name] = _Host(p["rate"], p["burst"], p["concurrency"], time.monotonic())
+        return h
+
+    def _prune(self, now: float) -> None:
+        # forget idle hosts whose state is back to defaults (caller holds the lock)
+        for n in [n for n, h in self._hosts.items()
+                  if not h.inflight and not h.waiters and not h.fails and h.crawl_delay is None
+                  and now >= h.not_before and h.tokens + (now - h.stamp) * h.rate >= h.burst]:
+            del self._hosts[n]
+
+    def set_crawl_delay(self, name: str, delay: Optional[float]) -> None:
+        """Apply a robots.txt Crawl-delay (seconds between requests) to a host."""
+        with self._cond:
+            h = self._host(name)
+            p = {**self.defaults, **self.policies.get(name, {})}
+            h.crawl_delay = delay
+            if delay and delay > 0:
+                h.rate, h.burst = min(p["rate"], 1.0 / delay), 1
+            else:
+                h.rate, h.burst = p["rate"], p["burst"]
+            h.tokens = min(h.tokens, h.burst)
+
+    def _refill(self, h: _Host, now: float) -> None:
+        h.tokens = min(h.burst, h.tokens + (now - h.stamp) * h.rate)
+        h.stamp = now
+
+    def _dispatch(self, now: float) -> None:
+        """Grant waiting tickets, one per host per pass, while capacity allows. Caller holds the lock."""
+        granted = True
+        while granted and self._ready and self.inflight < self.max_inflight:
+            granted = False
+            for name in list(self._ready):
+                h = self._hosts[name]
+                if not h.waiters:
+                    del self._ready[name]
+                    continue
+                if self.inflight >= self.max_inflight:
+                    break
+                self._refill(h, now)
+                if h.inflight >= h.limit or h.tokens < 1 or now < h.not_before:
+                    continue
+                h.waiters.popleft().granted = True
+                h.tokens -= 1
+                h.inflight += 1
+                self.inflight += 1
+                self.stats["granted"] += 1
+                self._ready.move_to_end(name)
+                granted = True
+        self._cond.notify_all()
+
+    def _next_ready_in(self, h: _Host, now: float) -> float:
+        return max(0.0, (1 - h.tokens) / h.rate if h.tokens < 1 else 0.0, h.not_before - now)
+
+    def acquire(self, name: str, timeout: float = SLOT_WAIT_SEC) -> bool:
+        """Block until a request to host `name` may be sent; pair with release().
+
+        Returns True when this request is a circuit breaker's trial request.
+        """
+        start = time.monotonic()
+        trial = False
+        with self._cond:
+            h = self._host(name)
+            if h.fails >= BREAKER_FAILURES:
+                if start < h.open_until or h.probing:
+                    self.stats["breaker_rejects"] += 1
+                    raise HostUnavailable(f"{name}: circuit open after {h.fails} failures")
+                h.probing = trial = True  # half-open
+            ticket = _Ticket()
+            h.waiters.append(ticket)
+            self._ready.setdefault(name, None)
+            self._dispatch(start)
+            while not ticket.granted:
+                now = time.monotonic()
+                if now - start >= timeout:
+                    h.waiters.remove(ticket)
+                    if trial: h.probing = False
+                    self.stats["slot_timeouts"] += 1
+                    raise SlotTimeout(f"{name}: no request slot within {timeout:.0f}s")
+                self._cond.wait(min(timeout - (now - start), self._next_ready_in(h, now) or 0.5))
+                self._dispatch(time.monotonic())
+            waited = time.monotonic() - start
+            if waited > 0.001:
+                self.stats["waited"] += 1
+                self.stats["wait_sec"] += waited
+        return trial
+
+    def release(self, name: str, failed: bool = False, retry_after: Optional[float] = None, trial: bool = False) -> None:
+        """Return a slot; `failed` for timeouts/connection errors, `retry_after` from 429/503."""
+        with self._cond:
+            h = self._host(name)
+            now = time.monotonic()
+            h.inflight -= 1
+            self.inflight -= 1
+            if failed:
+                h.fails += 1
+                if h.fails == BREAKER_FAILURES or trial:
+                    self.stats["breaker_trips"] += 1
+                if h.fails >= BREAKER_FAILURES:
+                    h.open_until = now + BREAKER_COOLDOWN_SEC
+            else:
+                h.fails = 0
+            if trial: h.probing = False
+            if retry_after:
+                h.not_before = max(h.not_before, now + min(retry_after, RETRY_AFTER_MAX_SEC))
+                self.stats["retry_after_pauses"] += 1
+            self._dispatch(now)
+
+    @contextmanager
+    def slot(self, name: str, timeout: float = SLOT_WAIT_SEC):
+        trial = self.acquire(name, timeout)
+        outcome = {"failed": False, "retry_after": None}
+        try:
+            yield outcome
+        finally:
+            self.release(name, outcome["failed"], outcome["retry_after"], trial)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            busy = {n: {"inflight": h.inflight, "waiting": len(h.waiters), "crawl_delay": h.crawl_delay}
+                    for n, h in self._hosts.items() if h.inflight or h.waiters or h.crawl_delay}
+            open_ = [n for n, h in self._hosts.items() if h.fails >= BREAKER_FAILURES and now < h.open_until]
+            return {**self.stats, "inflight": self.inflight, "hosts": len(self._hosts),
+                    "breakers_open": open_, "busy_hosts": busy}
+
+scheduler = Scheduler()
@@ -7,52 +7,90 @@ function getPP(){ return !!qs('#pp')?.checked; }
 function humanDist(mi){ return `${(+mi).toFixed(2)} mi`; }
 function setStatus(ok){ const s=qs('[data-status]'); if(!s) return; if(ok){ s.setAttribute('data-status','ok'); s.textContent='Ready'; } }
 async function api(path, opts){ const res=await fetch(path, opts); if(!res.ok) throw new Error(`HTTP ${res.status}`); return await res.json(); }
+function setProgress(text){ const s=qs('[data-status]'); if(s) s.textContent=text; }
+function progressText(ev){
+  if(ev.stage==='menus') return `Menus ${ev.done}/${ev.total}…`;
+  if(ev.stage==='pages') return `Page ${ev.page} · ${ev.items_so_far} items…`;
+  return ({geocode:'Locating ZIP…',restaurants:'Finding restaurants…',fetch:'Fetching menu…',parse:'Reading menu…'})[ev.stage]||'Working…';
+}
+const sleep=ms=>new Promise(r=>setTimeout(r,ms));
+async function pollJob(url){
+  for(;;){ const j=await api(url); if(j.status==='done'||j.status==='failed') return j; await sleep(1000); }
+}
+// Submit a background job and resolve with its result; progress events go to onProgress.
+async function runJob(path, opts, onProgress){
+  const res=await fetch(path, opts);
+  const job=await res.json().catch(()=>({}));
+  if(res.status===429) throw new Error('busy');
+  if(!res.ok) throw new Error(job.message||job.error||`HTTP ${res.status}`);
+  const j=await new Promise((resolve,reject)=>{
+    if(!window.EventSource) return pollJob(job.status_url).then(resolve,reject);
+    const es=new EventSource(job.events_url);
+    es.addEventListener('progress',e=>{ try{ onProgress?.(JSON.parse(e.data)); }catch(_){ } });
+    es.addEventListener('done',e=>{ es.close(); resolve(JSON.parse(e.data)); });
+    es.addEventListener('failed',e=>{ es.close(); resolve(JSON.parse(e.data)); });
+    // the browser reconnects (resuming via Last-Event-ID) on its own; if it gives up, poll instead
+    es.onerror=()=>{ if(es.readyState===EventSource.CLOSED) pollJob(job.status_url).then(resolve,reject); };
+  });
+  if(j.status!=='done') throw new Error(j.error?.message||j.error?.error||'failed');
+  return j.result;
+}
+function showResults(data, mount){
+  setStatus(true);
+  renderRestaurants(data.restaurants||[], mount);
+  renderRestaurants(data.restaurants||[], qs('#combinedResults'));
+  window.parent?.postMessage({type:'fdc-height', height: document.body.scrollHeight}, '*');
+}
+function jobErrorToast(err, fallback){ toast(err.message==='busy'?'Server busy, try again in a few seconds.':fallback); console.error(err); }
 
 function renderRestaurants(list, mount){
   mount.innerHTML='';
-  (list||[]).forEach(r=>{
-    const card=document.createElement('div'); card.className='rest-card';
-    const tags=(r.cuisine||[]).map(c=>`<span class='mod'>${c}</span>`).join(' ');
-    card.innerHTML = `
-      <div class="rest-head">
+  (list||[]).forEach((r,i)=>mount.appendChild(restaurantCard(r,i)));
+}
+// Replace the i-th card rendered by renderRestaurants (e.g. playbook picks upgraded to menu picks).
+function patchRestaurant(mount, i, r){
+  const old=mount?.querySelector(`.rest-card[data-index="${i}"]`);
+  if(old) old.replaceWith(restaurantCard(r,i));
+}
+function restaurantCard(r, i){
+  const card=document.createElement('div'); card.className='rest-card'; card.dataset.index=i;
+  const tags=(r.cuisine||[]).map(c=>`<span class='mod'>${c}</span>`).join(' ');
+  card.innerHTML = `
+    <div class="rest-head">
+      <div>
+        <div class="text-lg font-semibold">${r.name||'Restaurant'}</div>
+        <div class="rest-meta">
+          ${r.distance_mi!=null?`<span>${humanDist(r.distance_mi)}</span>`:''}
+          ${tags}
+          ${r.website?`<a class="text-emerald-600 underline" href="${r.website}" target="_blank" rel="noopener">Website</a>`:''}
+          <span class="text-xs px-2 py-1 rounded bg-gray-100 dark:bg-gray-800">${r.source==='menu'?'Parsed from Menu':'Playbook'}</span>
+        </div>
+      </div>
+    </div>`;
+  (r.picks||[]).forEach(p=>{
+    const k1=`<span class="kpi">${p.est_kcal??'—'} kcal</span>`;
+    const k2=`<span class="kpi pro">${p.est_protein_g??'—'} g protein</span>`;
+    const mods=(p.modifiers||[]).map(m=>`<span class="mod">${m}</span>`).join(' ');
+    const ev=p.evidence?`<div class="evidence"><b>Why:</b> ${(p.evidence.signals||[]).join(', ')} · score ${(p.evidence.final_score??'').toFixed?p.evidence.final_score.toFixed(2):p.evidence.final_score}</div>`:'';
+    const id='c'+Math.random().toString(36).slice(2);
+    const pick=document.createElement('div'); pick.className='pick';
+    pick.innerHTML=`
+      <div class="flex items-start justify-between gap-3">
         <div>
-          <div class="text-lg font-semibold">${r.name||'Restaurant'}</div>
-          <div class="rest-meta">
-            ${r.distance_mi!=null?`<span>${humanDist(r.distance_mi)}</span>`:''}
-            ${tags}
-            ${r.website?`<a class="text-emerald-600 underline" href="${r.website}" target="_blank" rel="noopener">Website</a>`:''}
-            <span class="text-xs px-2 py-1 rounded bg-gray-100 dark:bg-gray-800">${r.source==='menu'?'Parsed from Menu':'Playbook'}</span>
-          </div>
+          <h5>${p.item_name||'Recommended pick'}</h5>
+          <div class="text-sm opacity-90">${p.why_it_works||''}</div>
+          <div class="flex items-center gap-2 mt-1">${k1}${k2}<span class="text-xs ml-2 opacity-70">${p.confidence||''}</span></div>
+          <div class="flex flex-wrap gap-2 mt-1">${mods}</div>
+          ${ev}
         </div>
+        <button id="${id}" class="copy-btn shrink-0">Copy Ask</button>
       </div>`;
-    (r.picks||[]).forEach(p=>{
-      const k1=`<span class="kpi">${p.est_kcal??'—'} kcal</span>`;
-      const k2=`<span class="kpi pro">${p.est_protein_g??'—'} g protein</span>`;
-      const mods=(p.modifiers||[]).map(m=>`<span class="mod">${m}</span>`).join(' ');
-      const ev=p.evidence?`<div class="evidence"><b>Why:</b> ${(p.evidence.signals||[]).join(', ')} · score ${(p.evidence.final_score??'').toFixed?p.evidence.final_score.toFixed(2):p.evidence.final_score}</div>`:'';
-      const id='c'+Math.random().toString(36).slice(2);
-      const pick=document.createElement('div'); pick.className='pick';
-      pick.innerHTML=`
-        <div class="flex items-start justify-between gap-3">
-          <div>
-            <h5>${p.item_name||'Recommended pick'}</h5>
-            <div class="text-sm opacity-90">${p.why_it_works||''}</div>
-            <div class="flex items-center gap-2 mt-1">${k1}${k2}<span class="text-xs ml-2 opacity-70">${p.confidence||''}</span></div>
-            <div class="flex flex-wrap gap-2 mt-1">${mods}</div>
-            ${ev}
-          </div>
-          <button id="${id}" class="copy-btn shrink-0">Copy Ask</button>
-        </div>`;
-      card.appendChild(pick);
-      setTimeout(()=>{
-        const b=qs('#'+id);
-        b?.addEventListener('click',async()=>{
-          try{ await navigator.clipboard.writeText(p.server_script||''); toast('Copied ask'); }catch(e){ toast('Copy failed'); }
-        });
-      },0);
+    card.appendChild(pick);
+    qs('#'+id, pick)?.addEventListener('click',async()=>{
+      try{ await navigator.clipboard.writeText(p.server_script||''); toast('Copied ask'); }catch(e){ toast('Copy failed'); }
     });
-    mount.appendChild(card);
   });
+  return card;
 }
 
 qs('#zipSearchBtn')?.addEventListener('click', async (e)=>{
@@ -63,12 +101,15 @@ qs('#zipSearchBtn')?.addEventListener('click', async (e)=>{
   toast('Searching…');
   try{
     const payload={zip, radius_miles:radius, calorie_target:getTarget(), flags:getFlags(), prioritize_protein:getPP()};
-    const data=await api('/nearby-by-zip',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(payload)});
-    setStatus(true);
-    renderRestaurants(data.restaurants||[], qs('#zipResults'));
-    renderRestaurants(data.restaurants||[], qs('#combinedResults'));
-    window.parent?.postMessage({type:'fdc-height', height: document.body.scrollHeight}, '*');
-  }catch(err){ toast('Could not search right now.'); console.error(err); }
+    // cards appear with playbook picks once the restaurants are known, then upgrade in place as menus are parsed
+    const mounts=[qs('#zipResults'), qs('#combinedResults')];
+    const data=await runJob('/jobs/nearby-by-zip',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(payload)}, ev=>{
+      if(ev.stage==='listed') return mounts.forEach(m=>m && renderRestaurants(ev.restaurants, m));
+      if(ev.stage==='menu') return mounts.forEach(m=>patchRestaurant(m, ev.index, ev.restaurant));
+      setProgress(progressText(ev));
+    });
+    showResults(data, qs('#zipResults'));
+  }catch(err){ setStatus(true); jobErrorToast(err, 'Could not search right now.'); }
 });
 
 qs('#analyzeUrlBtn')?.addEventListener('click', async (e)=>{
@@ -78,12 +119,10 @@ qs('#analyzeUrlBtn')?.addEventListener('click', async (e)=>{
   toast('Analyzing URL…');
   try{
     const payload={url, calorie_target:getTarget(), flags:getFlags(), prioritize_protein:getPP()};
-    const data=await api('/analyze-url',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(payload)});
-    setStatus(true);
-    renderRestaurants(data.restaurants||[], qs('#analyzeResults'));
-    renderRestaurants(data.restaurants||[], qs('#combinedResults'));
-    window.parent?.postMessage({type:'fdc-height', height: document.body.scrollHeight}, '*');
-  }catch(err){ toast('Could not analyze that link. Try PDF upload.'); console.error(err); }
+    const data=await runJob('/jobs/analyze-url',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(payload)},
+                            ev=>setProgress(progressText(ev)));
+    showResults(data, qs('#analyzeResults'));
+  }catch(err){ setStatus(true); jobErrorToast(err, 'Could not analyze that link. Try PDF upload.'); }
 });
 
 qs('#analyzePdfBtn')?.addEventListener('click', async (e)=>{
@@ -91,20 +130,21 @@ qs('#analyzePdfBtn')?.addEventListener('click', async (e)=>{
   const file=qs('#menu_pdf')?.files?.[0];
   if(!file) return toast('Choose a PDF first');
   const fd=new FormData();
-  fd.append('pdf', file);
+  fd.append('menu_pdf', file);
   fd.append('use_ocr', qs('#use_ocr')?.checked ? '1':'0');
   fd.append('calorie_target', getTarget());
   fd.append('prioritize_protein', getPP() ? '1':'0');
   getFlags().forEach(f=>fd.append('flags', f));
   toast('Analyzing PDF…');
   try{
-    const res=await fetch('/analyze-pdf',{method:'POST',body:fd});
-    const data=await res.json();
-    setStatus(true);
-    renderRestaurants(data.restaurants||[], qs('#analyzeResults'));
-    renderRestaurants(data.restaurants||[], qs('#combinedResults'));
-    window.parent?.postMessage({type:'fdc-height', height: document.body.scrollHeight}, '*');
-  }catch(err){ toast('PDF analysis failed.'); console.error(err); }
+    const data=await runJob('/jobs/analyze-pdf',{method:'POST',body:fd}, ev=>{
+      setProgress(progressText(ev));
+      // show the picks found so far while later pages are still being read
+      if(ev.picks?.length) renderRestaurants([{name:'Uploaded Menu',source:'menu',picks:ev.picks}], qs('#analyzeResults'));
+    });
+    showResults(data, qs('#analyzeResults'));
+    if(data.ocr_unavailable) toast('OCR is not installed on this server, so scanned pages could not be read.');
+  }catch(err){ setStatus(true); jobErrorToast(err, 'PDF analysis failed.'); }
 });
 
 // Open Food Facts
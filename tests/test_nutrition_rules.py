@@ -0,0 +1,130 @@
+"""Differential test: the one-pass CueMatcher against the per-list _count_hits loop it replaced.
+
+The reference side is pinned to the cue lists and substring loop as they were
+before the matcher, so a change to CUE_CATEGORIES cannot move both sides at once.
+"""
+
+import random
+
+import pytest
+
+import nutrition_rules as nr
+from nutrition_rules import CUE_CATEGORIES, cue_counts, score_item
+
+# The lists the per-list rules used (the last four were inline in score_item).
+BASELINE_CUES = {
+    "protein": ["chicken","turkey","steak","beef","salmon","tuna","shrimp","prawn","tofu","tempeh","egg","eggs","yogurt","greek yogurt","pork loin"],
+    "lean": ["grilled","baked","roasted","seared","steamed","poached","broiled","oven","charbroiled"],
+    "rich": ["fried","battered","tempura","creamy","alfredo","hollandaise","aioli","butter","buttered","smothered","cheesy","cheese sauce"],
+    "starch": ["rice","pasta","bun","tortilla","fries","chips","potato","potatoes","gnocchi","couscous","noodles","bread"],
+    "high_cal_sauce": ["mayo","aioli","ranch","queso","alfredo","cream","butter","cheese sauce"],
+    "low_cal_sauce": ["salsa","tomato sauce","marinara","chimichurri","vinaigrette","salsa verde"],
+    "fried_cooking": ["fried","tempura","battered"],
+    "dairy": ["cheese","cream","alfredo","yogurt"],
+    "pasta": ["pasta"],
+    "fried": ["fried"],
+}
+
+def _baseline_hits(text: str, tokens) -> int:
+    t = text.lower()
+    return sum(1 for w in tokens if w in t)
+
+def test_cue_lists_unchanged():
+    assert {cat: list(words) for cat, words in CUE_CATEGORIES.items()} == BASELINE_CUES
+
+EDGE_CASES = [
+    "",
+    "Grilled Chicken",
+    "GRILLED CHICKEN, BAKED POTATO & BUTTERED RICE",
+    "Eggplant Parm",                       # "egg" inside a longer word
+    "Buttermilk-fried chicken; ranch!",    # "butter", "fried", punctuation around cues
+    "Mac & cheese sauce (cheesy)",         # overlapping "cheese sauce" / "cheesy" / "cheese"
+    "Greek yogurt parfait",                # "greek yogurt" and "yogurt" both listed
+    "Salsa verde / salsa roja",            # "salsa verde" contains "salsa"
+    "Price: $12 — spiced rice",            # "rice" inside "price"
+    "Ice cream (creamy)",                  # "cream" in "ice cream" and "creamy"
+    "Pork-loin   chop\twith\nchimichurri", # hyphen and whitespace instead of the listed space
+    "Shrimp & Prawn tempura / battered",
+    "oven-roasted tofu, tempeh, eggs",
+    "Fried fried FRIED",                   # repeated cue counts once
+    "Queso fundido w/ chips, tortilla",
+    "noodles, gnocchi, couscous, pasta alfredo",
+    "Chargrilled / charbroiled steak",
+    "Mayo-free aioli, vinaigrette",
+    "Spaghetti al pomodoro (tomato sauce) • marinara",
+    "Café crème brûlée",
+]
+
+_vocab = sorted({w for ws in BASELINE_CUES.values() for w in ws})
+_filler = ["with", "house", "side", "of", "and", "the", "special", "fresh", "local", "café", "price", "icecream"]
+
+def _random_texts(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    seps = [" ", ", ", "-", "/", " & ", "; ", "(", ")", "", "\n"]
+    for _ in range(n):
+        words = [rnd.choice(_vocab if rnd.random() < 0.6 else _filler) for _ in range(rnd.randrange(1, 9))]
+        words = [w.upper() if rnd.random() < 0.2 else w.title() if rnd.random() < 0.3 else w for w in words]
+        yield "".join(w + rnd.choice(seps) for w in words)
+
+CORPUS = EDGE_CASES + list(_random_texts(500))
+
+def _reference_counts(text: str):
+    return {cat: _baseline_hits(text, words) for cat, words in BASELINE_CUES.items()}
+
+@pytest.mark.parametrize("text", CORPUS)
+def test_cue_counts_match_reference(text):
+    assert cue_counts(text) == _reference_counts(text)
+
+# Hit counts from the per-list rules for a few of the edge cases; categories not listed are 0.
+EXPECTED_HITS = [
+    ("Eggplant Parm", {"protein": 1}),
+    ("Buttermilk-fried chicken; ranch!", {"protein": 1, "rich": 2, "high_cal_sauce": 2, "fried_cooking": 1, "fried": 1}),
+    ("Mac & cheese sauce (cheesy)", {"rich": 2, "high_cal_sauce": 1, "dairy": 1}),
+    ("Greek yogurt parfait", {"protein": 2, "dairy": 1}),
+    ("Price: $12 — spiced rice", {"starch": 1}),
+    ("Pork-loin   chop\twith\nchimichurri", {"low_cal_sauce": 1}),
+    ("Spaghetti al pomodoro (tomato sauce) • marinara", {"low_cal_sauce": 2}),
+]
+
+@pytest.mark.parametrize("text,hits", EXPECTED_HITS)
+def test_cue_counts_fixed(text, hits):
+    assert cue_counts(text) == {cat: hits.get(cat, 0) for cat in BASELINE_CUES}
+
+FLAG_SETS = [[], ["low_carb"], ["no_fried", "dairy_mindful"], ["gluten_mindful", "low_carb", "no_fried", "dairy_mindful"]]
+
+@pytest.mark.parametrize("i", range(0, len(CORPUS) - 1, 7))
+def test_score_item_matches_reference(i, monkeypatch):
+    name, desc = CORPUS[i], CORPUS[i + 1]
+    section = ["Salads", "Pasta", "Burgers", "", "Seafood"][i % 5]
+    kw = dict(calorie_target=400 + 50 * (i % 9), prioritize_protein=bool(i % 2), flags=FLAG_SETS[i % len(FLAG_SETS)])
+    got = score_item(name, desc, section, **kw)
+    monkeypatch.setattr(nr, "cue_counts", _reference_counts)
+    assert score_item(name, desc, section, **kw) == got
+
+# score_item results from the per-list rules:
+# (name, description, section, calorie_target, prioritize_protein, flags,
+#  est_kcal, est_protein_g, confidence, final_score, modifiers, signals)
+EXPECTED_SCORES = [
+    ("Grilled Chicken Caesar", "romaine, parmesan, croutons, creamy dressing", "Salads", 600, True, [],
+     525, 39, "medium", 0.49, ["sauce on side", "extra vegetables"], ["protein_cues:1", "lean_cooking", "rich_cooking", "section:salads"]),
+    ("Buttermilk Fried Chicken Sandwich", "brioche bun, ranch, fries", "Sandwiches", 700, True, ["no_fried"],
+     875, 29, "high", 0.0, ["sauce on side", "half starch", "ask grilled if possible"], ["protein_cues:1", "rich_cooking", "starches:2", "section:sandwiches"]),
+    ("Shrimp Alfredo", "fettuccine pasta in a cheese sauce with garlic bread", "Pasta", 800, False, ["low_carb", "gluten_mindful", "dairy_mindful"],
+     1100, 24, "high", 0.0, ["sauce on side", "half starch"], ["protein_cues:1", "rich_cooking", "starches:2", "section:pasta"]),
+    ("Seared Salmon", "steamed rice, salsa verde, roasted vegetables", "Seafood", 550, True, ["low_carb"],
+     560, 47, "high", 0.613, ["half starch", "extra vegetables"], ["protein_cues:1", "lean_cooking", "starches:1", "section:seafood"]),
+    ("Eggplant Parm", "marinara, mozzarella, spaghetti", "", 600, True, ["dairy_mindful"],
+     700, 36, "low", 0.593, [], ["protein_cues:1"]),
+    ("Tofu Poke Bowl", "brown rice, edamame, tempura flakes, spicy mayo", "Bowls", 650, False, ["no_fried"],
+     775, 39, "medium", 0.263, ["sauce on side", "half starch"], ["protein_cues:1", "rich_cooking", "starches:1", "section:bowls"]),
+    ("Greek Yogurt Parfait", "granola, honey", "Breakfast", 400, True, [],
+     700, 42, "medium", 0.42, [], ["protein_cues:2", "section:breakfast"]),
+    ("Charbroiled Steak Tacos", "corn tortilla, chimichurri, queso fresco", "Tacos", 500, True, [],
+     250, 28, "high", 0.38, ["sauce on side", "half starch", "extra vegetables"], ["protein_cues:1", "lean_cooking", "starches:1", "section:tacos"]),
+]
+
+@pytest.mark.parametrize("name,desc,section,target,pp,flags,kcal,protein,conf,final,mods,signals", EXPECTED_SCORES)
+def test_score_item_fixed(name, desc, section, target, pp, flags, kcal, protein, conf, final, mods, signals):
+    r = score_item(name, desc, section, target, pp, flags)
+    assert (r.est_kcal, r.est_protein_g, r.confidence, r.evidence["final_score"], r.modifiers, r.evidence["signals"]) == \
+        (kcal, protein, conf, final, mods, signals)
@@ -0,0 +1,224 @@
+"""
+Cache warmer for popular ZIP searches.
+
+Everything slow about a ZIP search (geocode, Overpass tiles, menu URL
+discovery, menu fetch and parse) does not depend on the user's calorie
+target or flags, so it can be done ahead of traffic: warming a ZIP runs the
+same pipeline as /nearby-by-zip up to, but not including, ranking, which
+leaves the shared cache DB holding the restaurant tiles, menu URLs, menu
+bodies and parsed items. A later search only ranks.
+
+Searches are counted per (zip, radius) with a one-week half-life and kept
+in the cache DB. A warm pass takes the given targets (or the most popular
+ones), skips those warmed within WARM_REFRESH_SEC, and goes through the rest
+by popularity x staleness. It is throttled: WARM_CONCURRENCY menus at a
+time, WARM_PAUSE_SEC between ZIPs, and (when running inside the server) it
+waits while live traffic keeps the outbound HTTP scheduler busy.
+
+    python -m warmer 94103 10001:5 --radius 3
+    python -m warmer --file zips.txt
+    python -m warmer --top 50          # most searched
+"""
+
+import os, sys, time, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from metrics import count_error
+
+WARM_REFRESH_SEC = float(os.environ.get("WARM_REFRESH_SEC", str(12*3600)))
+WARM_CONCURRENCY = int(os.environ.get("WARM_CONCURRENCY", "2"))
+WARM_PAUSE_SEC = float(os.environ.get("WARM_PAUSE_SEC", "2"))
+WARM_TOP = int(os.environ.get("WARM_TOP", "50"))
+WARM_INTERVAL_SEC = float(os.environ.get("WARM_INTERVAL_SEC", "0"))  # background passes in the server; 0 = off
+HALF_LIFE_SEC = 7*24*3600
+POPULARITY_FLUSH_SEC = 60
+POPULARITY_MAX_KEYS = 5000
+BUSY_WAIT_MAX_SEC = 60
+KEEP_SEC = 90*24*3600
+
+Target = Tuple[str, float]
+
+def _key(zipc: str, radius: float) -> str:
+    return f"{zipc}:{float(radius)}"
+
+def _target(key: str) -> Target:
+    z, r = key.split(":")
+    return z, float(r)
+
+class Popularity:
+    """Decayed search counts per (zip, radius), buffered in memory and merged into the backend."""
+
+    NS, KEY = "zip_popularity", "scores"
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flushed = time.monotonic()
+
+    def record(self, zipc: str, radius: float) -> None:
+        with self._lock:
+            k = _key(zipc, radius)
+            self._pending[k] = self._pending.get(k, 0) + 1
+            due = time.monotonic() - self._flushed >= POPULARITY_FLUSH_SEC
+        if due:
+            self.flush()
+
+    def _decayed(self, ent, now: float) -> float:
+        return ent["score"] * 0.5 ** ((now - ent["at"]) / HALF_LIFE_SEC)
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed = time.monotonic()
+        if not pending:
+            return
+        now = time.time()
+        scores = self.backend.get(self.NS, self.KEY) or {}
+        for k, n in pending.items():
+            ent = scores.get(k)
+            scores[k] = {"score": (self._decayed(ent, now) if ent else 0.0) + n, "at": now}
+        if len(scores) > POPULARITY_MAX_KEYS:
+            keep = sorted(scores, key=lambda k: self._decayed(scores[k], now), reverse=True)[:POPULARITY_MAX_KEYS]
+            scores = {k: scores[k] for k in keep}
+        self.backend.set(self.NS, self.KEY, scores, KEEP_SEC)
+
+    def scores(self) -> Dict[str, float]:
+        self.flush()
+        now = time.time()
+        return {k: self._decayed(ent, now) for k, ent in (self.backend.get(self.NS, self.KEY) or {}).items()}
+
+class Warmer:
+    """Runs the ctx-independent part of the ZIP pipeline for chosen (zip, radius) targets.
+
+    `restaurants(zip, radius)` returns the restaurant dicts a search would
+    show and `menu_items(website)` resolves, fetches and parses one menu;
+    both are app.py's own pipeline steps. `busy()` says live traffic needs
+    the outbound capacity right now.
+    """
+
+    NS = "zip_warm"
+
+    def __init__(self, backend, restaurants: Callable[[str, float], list], menu_items: Callable[[str], list],
+                 popularity: Popularity, busy: Callable[[], bool] = lambda: False,
+                 concurrency: int = WARM_CONCURRENCY, pause_sec: float = WARM_PAUSE_SEC,
+                 refresh_sec: float = WARM_REFRESH_SEC):
+        self.backend = backend
+        self.restaurants = restaurants
+        self.menu_items = menu_items
+        self.popularity = popularity
+        self.busy = busy
+        self.concurrency = concurrency
+        self.pause_sec = pause_sec
+        self.refresh_sec = refresh_sec
+        self._thread = None
+        self.stats = {"passes": 0, "zips": 0, "menus": 0, "menu_failures": 0, "busy_waits": 0, "last_pass": None}
+
+    def _yield_to_traffic(self) -> None:
+        waited = 0.0
+        while waited < BUSY_WAIT_MAX_SEC and self.busy():
+            if not waited: self.stats["busy_waits"] += 1
+            time.sleep(0.5)
+            waited += 0.5
+
+    def plan(self, targets: Optional[Iterable[Target]] = None, top: int = WARM_TOP, force: bool = False) -> List[Target]:
+        """Targets that are due, most popular and stalest first."""
+        scores = self.popularity.scores()
+        cands = list(dict.fromkeys((z, float(r)) for z, r in targets)) if targets is not None \
+            else [_target(k) for k in sorted(scores, key=scores.get, reverse=True)[:top]]
+        now = time.time()
+        ranked = []
+        for z, r in cands:
+            warmed = self.backend.get(self.NS, _key(z, r))
+            age = now - warmed if warmed else float("inf")
+            if age < self.refresh_sec and not force:
+                continue
+            staleness = min(age / self.refresh_sec, 4.0) if self.refresh_sec else 4.0
+            ranked.append(((1.0 + scores.get(_key(z, r), 0.0)) * staleness, age, (z, r)))
+        ranked.sort(key=lambda t: (t[0], t[1]), reverse=True)
+        return [t for _, _, t in ranked]
+
+    def warm_one(self, zipc: str, radius: float) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        self._yield_to_traffic()
+        sites = list(dict.fromkeys(ent["website"] for ent in self.restaurants(zipc, radius) if ent.get("website")))
+        menus = failures = 0
+
+        def warm_site(site):
+            self._yield_to_traffic()
+            return self.menu_items(site)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrency), thread_name_prefix="warm") as pool:
+            for fut in [pool.submit(warm_site, s) for s in sites]:
+                try:
+                    menus += bool(fut.result())
+                except Exception as e:
+                    count_error("warm_menu", e)
+                    failures += 1
+        self.backend.set(self.NS, _key(zipc, radius), time.time(), KEEP_SEC)
+        self.stats["zips"] += 1
+        self.stats["menus"] += menus
+        self.stats["menu_failures"] += failures
+        return {"zip": zipc, "radius": radius, "websites": len(sites), "menus": menus, "failed": failures,
+                "sec": round(time.perf_counter() - t0, 2)}
+
+    def run(self, targets: Optional[Iterable[Target]] = None, top: int = WARM_TOP, force: bool = False,
+            log: Callable[[dict], None] = lambda res: None) -> List[Dict[str, Any]]:
+        """One warm pass; returns a result dict per ZIP warmed."""
+        results = []
+        for i, (z, r) in enumerate(self.plan(targets, top, force)):
+            if i and self.pause_sec: time.sleep(self.pause_sec)
+            res = self.warm_one(z, r)
+            log(res)
+            results.append(res)
+        self.stats["passes"] += 1
+        self.stats["last_pass"] = round(time.time())
+        return results
+
+    def start_background(self, interval_sec: float = WARM_INTERVAL_SEC) -> None:
+        """Warm the most popular ZIPs every interval_sec in a daemon thread (idempotent per process)."""
+        if interval_sec <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        def loop():
+            while True:
+                time.sleep(interval_sec)
+                try:
+                    self.run()
+                except Exception as e:
+                    count_error("warm_pass", e)
+        self._thread = threading.Thread(target=loop, name="warmer", daemon=True)
+        self._thread.start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "background": self._thread is not None and self._thread.is_alive()}
+
+def _parse_targets(args: List[str], radius: float) -> List[Target]:
+    out = []
+    for a in args:
+        a = a.strip()
+        if not a or a.startswith("#"):
+            continue
+        z, _, r = a.partition(":")
+        if len(z) != 5 or not z.isdigit():
+            raise SystemExit(f"bad ZIP: {a!r}")
+        out.append((z, float(r or radius)))
+    return out
+
+if __name__ == "__main__":
+    import argparse, json
+    ap = argparse.ArgumentParser(prog="python -m warmer", description="Pre-build restaurant lists and parsed menus for ZIPs.")
+    ap.add_argument("zips", nargs="*", help="ZIP or ZIP:RADIUS")
+    ap.add_argument("--file", help="file with one ZIP or ZIP:RADIUS per line")
+    ap.add_argument("--radius", type=float, default=3.0, help="radius for ZIPs given without one (default 3)")
+    ap.add_argument("--top", type=int, default=WARM_TOP, help="without ZIPs: warm this many of the most searched")
+    ap.add_argument("--force", action="store_true", help="warm even if refreshed within WARM_REFRESH_SEC")
+    opts = ap.parse_args()
+    lines = list(opts.zips)
+    if opts.file:
+        with open(opts.file) as f:
+            lines += f.read().splitlines()
+    from app import warmer
+    res = warmer.run(_parse_targets(lines, opts.radius) if lines else None, top=opts.top, force=opts.force,
+                     log=lambda r: print(json.dumps(r), flush=True))
+    print(f"warmed {len(res)} ZIPs", file=sys.stderr)
@@ -0,0 +1,23 @@
+"""
+Production entry point:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing app loads the playbooks, maps the ZIP table and opens the cache
+DB; preload() adds the nutrient store and the parser libraries. With
+gunicorn's preload_app this all happens once in the master, before fork, so
+workers start ready and share the loaded data copy-on-write. Background
+threads (cache warmer) start in each worker with its first request.
+"""
+
+from app import app, nutrients
+
+def preload() -> None:
+    nutrients.load()
+    import lxml.html  # noqa: F401  (parser imports cost ~100 ms each on a cold worker)
+    try:
+        import pdfplumber  # noqa: F401
+    except ImportError:
+        pass
+
+preload()
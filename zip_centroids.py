@@ -0,0 +1,85 @@
+"""
+Bundled US ZIP -> centroid table.
+
+data/zip_centroids.bin holds every ZIP as three sorted parallel arrays
+(zip as uint32, lat/lon as int32 in 1e-4 degrees), memory-mapped at import
+so all worker processes share one copy through the page cache. A lookup is
+a bisect over the mapped ZIP column, a couple of microseconds. Nominatim is
+only needed for ZIPs missing here.
+
+Rebuild from the Census ZCTA gazetteer (tab-separated GEOID, INTPTLAT,
+INTPTLONG) or from the `zipcodes` package's zips.json.bz2:
+
+    python -m zip_centroids build 2023_Gaz_zcta_national.txt
+"""
+
+import os, sys, bz2, csv, json, mmap, array, bisect, struct
+from typing import Dict, Optional
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "zip_centroids.bin")
+MAGIC = b"ZIPC0001"
+HEADER = 16  # magic + uint32 count + padding
+SCALE = 10000
+
+class ZipCentroids:
+    def __init__(self, path: str = DATA_PATH):
+        self.zips = self.lats = self.lons = None
+        try:
+            with open(path, "rb") as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if buf[:8] != MAGIC:
+                return
+            n = struct.unpack_from("<I", buf, 8)[0]
+            cols = [memoryview(buf)[HEADER + 4*n*k:HEADER + 4*n*(k + 1)] for k in range(3)]
+        except (OSError, ValueError):
+            return
+        if sys.byteorder == "little":
+            self.zips, self.lats, self.lons = cols[0].cast("I"), cols[1].cast("i"), cols[2].cast("i")
+        else:  # file is little-endian; big-endian hosts get a swapped copy
+            self.zips, self.lats, self.lons = [array.array(t, bytes(c)) for t, c in zip("Iii", cols)]
+            for a in (self.zips, self.lats, self.lons): a.byteswap()
+
+    def __len__(self):
+        return 0 if self.zips is None else len(self.zips)
+
+    def lookup(self, zipcode: str) -> Optional[Dict[str, float]]:
+        """{"lat", "lon"} for a 5-digit ZIP, or None if unknown."""
+        if self.zips is None or len(zipcode) != 5 or not zipcode.isdigit():
+            return None
+        z = int(zipcode)
+        i = bisect.bisect_left(self.zips, z)
+        if i == len(self.zips) or self.zips[i] != z:
+            return None
+        return {"lat": self.lats[i] / SCALE, "lon": self.lons[i] / SCALE}
+
+def _read_source(path: str) -> Dict[int, tuple]:
+    rows = {}
+    if path.endswith(".json.bz2") or path.endswith(".json"):
+        opener = bz2.open if path.endswith(".bz2") else open
+        with opener(path, "rt") as f:
+            for z in json.load(f):
+                if z.get("lat") and z.get("long") and z.get("active", True):
+                    rows[int(z["zip_code"])] = (float(z["lat"]), float(z["long"]))
+        return rows
+    with open(path, newline="") as f:
+        for rec in csv.DictReader(f, delimiter="\t"):
+            rec = {k.strip(): v.strip() for k, v in rec.items() if k}
+            rows[int(rec["GEOID"])] = (float(rec["INTPTLAT"]), float(rec["INTPTLONG"]))
+    return rows
+
+def build(src: str, dest: str = DATA_PATH) -> int:
+    rows = _read_source(src)
+    zips = sorted(rows)
+    with open(dest, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(zips)) + b"\0" * (HEADER - 12))
+        f.write(struct.pack(f"<{len(zips)}I", *zips))
+        f.write(struct.pack(f"<{len(zips)}i", *(round(rows[z][0] * SCALE) for z in zips)))
+        f.write(struct.pack(f"<{len(zips)}i", *(round(rows[z][1] * SCALE) for z in zips)))
+    return len(zips)
+
+zip_centroids = ZipCentroids()
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "build":
+        sys.exit("usage: python -m zip_centroids build <gazetteer.txt | zips.json.bz2>")
+    print(f"{build(sys.argv[2])} ZIPs -> {DATA_PATH}")